@@ -0,0 +1,53 @@
+import argparse
+import statistics
+import time
+
+from constrained_decoding import is_valid_output, template_sentences
+from export_merged_model import sample_prompts
+from integrate_model_new import load_backend, load_phrase_trie, load_reference_excel, reference_excel_path
+
+
+def run(backend, prompts, num_beams, constrained, max_length=150):
+    trie = load_phrase_trie(backend.tokenizer) if constrained else None
+    outputs, latencies = [], []
+    for prompt in prompts:
+        input_ids = backend.tokenizer(prompt, truncation=True)["input_ids"]
+        start = time.perf_counter()
+        text = backend.generate([input_ids], max_length=max_length, num_beams=num_beams,
+                                prefix_allowed_tokens_fn=trie.prefix_fn() if trie else None)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(text)
+    return outputs, latencies
+
+
+# Unconstrained beam search vs. trie-constrained decoding: latency and share of template-valid outputs
+def compare(beams=5, constrained_beams=(1, 2), prompts=None):
+    prompts = prompts if prompts is not None else sample_prompts()
+    if not prompts:
+        print("No sample prompts found.")
+        return
+
+    sentences = template_sentences(load_reference_excel(reference_excel_path))
+    backend = load_backend()
+    run(backend, prompts[:1], 1, False)  # warm-up
+
+    configs = [(f"beam{beams}", beams, False)]
+    configs += [(f"constrained-{'greedy' if n == 1 else f'beam{n}'}", n, True) for n in constrained_beams]
+
+    baseline_ms = None
+    for name, num_beams, constrained in configs:
+        outputs, latencies = run(backend, prompts, num_beams, constrained)
+        mean_ms = statistics.mean(latencies)
+        baseline_ms = baseline_ms or mean_ms
+        valid = sum(is_valid_output(text, sentences) for text in outputs)
+        print(f"{name:22s} {mean_ms:8.1f} ms mean  {baseline_ms / mean_ms:5.2f}x  "
+              f"valid {valid}/{len(outputs)} ({valid / len(outputs):.0%})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vocabulary-constrained decoding.")
+    parser.add_argument("--beams", type=int, default=5)
+    parser.add_argument("--constrained-beams", type=int, nargs="+", default=[1, 2])
+    args = parser.parse_args()
+
+    compare(args.beams, args.constrained_beams)
@@ -0,0 +1,92 @@
+import argparse
+import difflib
+import io
+import statistics
+import time
+
+import torch
+
+from export_merged_model import sample_prompts
+from model_registry import DEFAULT_ADAPTER, DEFAULT_BASE_MODEL, get_model
+
+
+def model_size_mb(model):
+    # Serialized state_dict size; counts packed int8 weights correctly, unlike numel()
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / (1024 * 1024)
+
+
+def timed_generate(loaded, prompts, max_length=150, num_beams=5):
+    tokenizer, model, device = loaded
+    outputs, latencies = [], []
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+        inputs = {k: v.to(device) for k, v in inputs.items()}
+        start = time.perf_counter()
+        with torch.no_grad():
+            generated = model.generate(**inputs, max_length=max_length, num_beams=num_beams, early_stopping=True)
+        latencies.append((time.perf_counter() - start) * 1000)
+        outputs.append(tokenizer.decode(generated[0], skip_special_tokens=True))
+    return outputs, latencies
+
+
+def summarize(latencies):
+    ordered = sorted(latencies)
+    return {
+        "mean_ms": round(statistics.mean(ordered), 1),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 1),
+    }
+
+
+# Compare int8 against float32 on the sample CSVs: latency, model size and output agreement
+def compare(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, tolerance=0.9, prompts=None):
+    prompts = prompts if prompts is not None else sample_prompts()
+    if not prompts:
+        print("No sample prompts found.")
+        return False
+
+    fp32 = get_model(base_model_path, adapter_path, device="cpu", dtype="float32")
+    int8 = get_model(base_model_path, adapter_path, device="cpu", dtype="int8")
+    if not any(isinstance(m, torch.ao.nn.quantized.dynamic.Linear) for m in int8.model.modules()):
+        print("int8 model could not be built; nothing to compare.")
+        return False
+
+    # Warm-up so one-off allocation cost does not skew the first measurement
+    timed_generate(fp32, prompts[:1])
+    timed_generate(int8, prompts[:1])
+
+    fp32_out, fp32_lat = timed_generate(fp32, prompts)
+    int8_out, int8_lat = timed_generate(int8, prompts)
+
+    fp32_stats, int8_stats = summarize(fp32_lat), summarize(int8_lat)
+    fp32_size, int8_size = model_size_mb(fp32.model), model_size_mb(int8.model)
+
+    similarity = [difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(fp32_out, int8_out)]
+    exact = sum(a == b for a, b in zip(fp32_out, int8_out))
+    mean_similarity = statistics.mean(similarity)
+
+    print(f"Prompts:      {len(prompts)}")
+    print(f"float32:      {fp32_stats['mean_ms']} ms mean, {fp32_stats['p95_ms']} ms p95, {fp32_size:.1f} MB")
+    print(f"int8:         {int8_stats['mean_ms']} ms mean, {int8_stats['p95_ms']} ms p95, {int8_size:.1f} MB")
+    print(f"Speedup:      {fp32_stats['mean_ms'] / int8_stats['mean_ms']:.2f}x")
+    print(f"Size ratio:   {int8_size / fp32_size:.2f}")
+    print(f"Exact match:  {exact}/{len(prompts)}")
+    print(f"Similarity:   {mean_similarity:.3f} (tolerance {tolerance})")
+
+    for prompt, a, b, ratio in zip(prompts, fp32_out, int8_out, similarity):
+        if ratio < tolerance:
+            print(f"  Prompt:  {prompt}\n  float32: {a}\n  int8:    {b}")
+
+    return mean_similarity >= tolerance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark int8 dynamic quantization against float32.")
+    parser.add_argument("--base", default=DEFAULT_BASE_MODEL)
+    parser.add_argument("--adapter", default=DEFAULT_ADAPTER)
+    parser.add_argument("--tolerance", type=float, default=0.9)
+    args = parser.parse_args()
+
+    ok = compare(args.base, args.adapter, args.tolerance)
+    raise SystemExit(0 if ok else 1)
@@ -0,0 +1,50 @@
+import os
+from collections import namedtuple
+
+from cleanup_script import flag_out_of_range
+from file_readers import read_table_chunks
+from execution_plan import get_plan
+from prepare_ml_data import RunningMeans, prepare_features
+from integrate_model_new import plan_recommendations, assemble_by_row
+
+# Rows held in memory at once; peak memory depends on this, not on the file size
+CHUNK_ROWS = int(os.environ.get("PIPELINE_CHUNK_ROWS", 500))
+
+PATIENT_COLUMNS = ['Name', 'Age', 'ReportDate']
+
+# One planned chunk: patient headers by row index plus the plan_recommendations output
+PlannedChunk = namedtuple("PlannedChunk", ["headers", "pending", "answered", "requests"])
+
+
+# `source` is a path or a seekable binary buffer; CSVs are read chunk by chunk,
+# other formats are read whole and sliced (results are still produced per chunk)
+def read_chunks(source, chunksize=CHUNK_ROWS, filename=None):
+    return read_table_chunks(source, chunksize, filename)
+
+
+# First pass: whole-file column means for imputation, and the row count
+def feature_means(source, chunksize=CHUNK_ROWS, filename=None):
+    stats = RunningMeans()
+    for chunk in read_chunks(source, chunksize, filename):
+        stats.update(chunk.drop(columns=[col for col in PATIENT_COLUMNS if col in chunk.columns]))
+    return stats.means(), stats.rows
+
+
+# Second pass: flag, prepare and plan each chunk (every chunk shares the header's cached plan)
+def plan_chunks(source, reference_path, means, chunksize=CHUNK_ROWS, filename=None):
+    plan = None
+    for chunk in read_chunks(source, chunksize, filename):
+        plan = plan or get_plan(chunk.columns.tolist(), reference_path)
+        chunk = flag_out_of_range(chunk, plan.index, plan.category_mapping, plan=plan)
+
+        present = [col for col in PATIENT_COLUMNS if col in chunk.columns]
+        headers = chunk[present].to_dict(orient="index")
+        features, flags = prepare_features(chunk.drop(columns=present), means)
+        yield PlannedChunk(headers, *plan_recommendations(features, flags, plan=plan))
+
+
+# {Name, Age, ReportDate, tests} per patient in file order, once every test is answered
+def patient_results(planned, answered):
+    tests = assemble_by_row(planned.pending, answered)
+    return [{**header, "tests": tests.get(row, [])} for row, header in planned.headers.items()]
+
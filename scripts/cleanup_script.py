@@ -1,83 +1,63 @@
 import pandas as pd
+import numpy as np
 import os
 from map_categories import map_columns_to_categories
 from prepare_ml_data import prepare_data
+from file_readers import read_table
+from reference_index import ReferenceIndex, load_reference_index
+from flag_codes import FLAG_LABELS, NORMAL, LOW, HIGH, INVALID
 base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
 file_path_ref = os.path.join(base_dir, "reference_excel.xlsx")
 
 
-def read_file(filepath):
-    ext = os.path.splitext(filepath)[1].lower()
+# `filepath` may be a path or a binary file-like object (e.g. an upload's spooled buffer).
+# The parser is picked from the file's first bytes (see file_readers); PDF lab reports
+# are parsed into the same one-row-per-report shape as a CSV (see pdf_reports).
+def read_file(filepath, filename=None, dtype=None):
+    return read_table(filepath, filename, dtype)
 
-    # Try to read as Excel
-    try:
-        df = pd.read_excel(filepath, engine='openpyxl')
-        print("File read as Excel.")
-        return df
-    except Exception as e:
-        print(f"Not Excel: {e}")
 
-    # Try to read as CSV
-    try:
-        df = pd.read_csv(filepath)
-        print("File read as CSV.")
+def read_ref_file(filepath):
+    return load_reference_index(filepath).frames()  # Returns dict of DataFrames (Value, Low, High, Unit)
+
+# Adds a categorical `<col>_Flag` column (over FLAG_LABELS) per mapped column: values
+# are coerced to numbers once and compared with low/high arrays for the whole frame.
+# Missing values count as Normal, non-numeric ones as Invalid. When the reference has
+# age/sex specific ranges, each row is checked against the range for its Age (and Sex).
+def flag_out_of_range(df, reference_df_dict, category_mapping, age_col="Age", sex_col="Sex", plan=None):
+    # A cached ExecutionPlan for this header already knows which columns to flag
+    if plan is not None:
+        index, columns, entries = plan.index, plan.flag_columns, plan.flag_entries
+    else:
+        if isinstance(reference_df_dict, ReferenceIndex):
+            index = reference_df_dict
+        else:
+            index = ReferenceIndex.from_frames(reference_df_dict)
+        columns, entries = index.resolve_columns(set(df.columns), category_mapping)
+    if not columns:
         return df
-    except Exception as e:
-        print(f"Not CSV: {e}")
 
-    # Try to read as PDF (returns text instead of DataFrame)
-    try:
-        import pdfplumber
-        with pdfplumber.open(filepath) as pdf:
-            text = ''
-            for page in pdf.pages:
-                text += page.extract_text() + '\n'
-        print("File read as PDF.")
-        return text
-    except Exception as e:
-        print(f"Not PDF: {e}")
-
-    raise ValueError("Unsupported or unreadable file format.")
-
-
-def read_ref_file(filepath):
-    return pd.read_excel(filepath, sheet_name=None)  # Returns dict of DataFrames
-
-def flag_out_of_range(df, reference_df_dict, category_mapping):
-    for category, columns in category_mapping.items():
-        if category not in reference_df_dict:
-            print(f"Category '{category}' not found in reference Excel sheets.")
-            continue
-
-        category_df = reference_df_dict[category].set_index("Value")
-        for col in columns:
-            if col not in df.columns:
-                print(f"Column '{col}' not found in CSV data.")
-                continue
-            if col not in category_df.index:
-                print(f"Column '{col}' not found in reference sheet for category '{category}'.")
-                continue
-
-            try:
-                low = category_df.at[col, "Low"]
-                high = category_df.at[col, "High"]
-
-                def check_range(val):
-                    try:
-                        val = float(val)
-                        if val < low:
-                            return "Low"
-                        elif val > high:
-                            return "High"
-                        else:
-                            return ""
-                    except:
-                        return "Invalid"
-
-                df[f"{col}_Flag"] = df[col].apply(check_range)
-            except Exception as e:
-                print(f"Error processing column '{col}': {e}")
-    return df
+    raw = df[columns]
+    values = raw.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    ages = pd.to_numeric(df[age_col], errors='coerce').to_numpy() if age_col in df.columns else None
+    sexes = df[sex_col].to_numpy(dtype=object) if sex_col in df.columns else None
+    if plan is not None and not plan.demographic:
+        low, high = plan.low, plan.high
+    else:
+        low, high = index.bounds(entries, len(df), ages, sexes)
+
+    codes = np.full(values.shape, NORMAL, dtype=np.int8)
+    codes[values < low] = LOW
+    codes[values > high] = HIGH
+    codes[np.isnan(values) & raw.notna().to_numpy()] = INVALID
+
+    flags = pd.DataFrame(
+        {f"{col}_Flag": pd.Categorical.from_codes(codes[:, j], categories=FLAG_LABELS)
+         for j, col in enumerate(columns)},
+        index=df.index,
+    )
+    df = df.drop(columns=[col for col in flags.columns if col in df.columns])
+    return pd.concat([df, flags], axis=1)
 
 # --- Main Execution ---
 def main():
@@ -0,0 +1,96 @@
+import os
+
+from template_engine import HIGH_TEMPLATE, LOW_TEMPLATE, NORMAL_TEMPLATE
+
+# Restrict decoding to template sentences and drop to this many beams when enabled
+CONSTRAINED_DECODING = os.environ.get("RECOMMENDATION_CONSTRAINED", "0") == "1"
+CONSTRAINED_NUM_BEAMS = int(os.environ.get("RECOMMENDATION_CONSTRAINED_BEAMS", 1))
+
+_END = None
+
+
+def template_sentences(reference_sheets):
+    # Every sentence the model is allowed to produce, built from the reference workbook
+    sentences = []
+    for category, param_dict in reference_sheets.items():
+        sentences.append(NORMAL_TEMPLATE.format(category=category))
+        for param in param_dict:
+            sentences.append(LOW_TEMPLATE.format(param=param))
+            sentences.append(HIGH_TEMPLATE.format(param=param))
+    return sentences
+
+
+def is_valid_output(text, sentences):
+    # True when `text` is one or more template sentences separated by spaces
+    remaining = text.strip()
+    if not remaining:
+        return False
+    ordered = sorted(set(sentences), key=len, reverse=True)
+    while remaining:
+        for sentence in ordered:
+            if remaining.startswith(sentence):
+                remaining = remaining[len(sentence):].lstrip()
+                break
+        else:
+            return False
+    return True
+
+
+class PhraseTrie:
+    """Token-level prefix trie over the template sentences.
+
+    prefix_fn() returns a `prefix_allowed_tokens_fn` for one generate call: given
+    the decoder ids produced so far it returns the ids that keep the output a
+    sequence of whole template sentences, with EOS allowed only between
+    sentences.
+    """
+
+    def __init__(self, tokenizer, sentences):
+        self.eos_id = tokenizer.eos_token_id
+        self.pad_id = tokenizer.pad_token_id
+        self.root = {}
+        for sentence in sentences:
+            node = self.root
+            for token in tokenizer(sentence, add_special_tokens=False)["input_ids"]:
+                node = node.setdefault(token, {})
+            node[_END] = True
+        self.root_tokens = [t for t in self.root if t is not _END]
+
+    def _state(self, ids, states):
+        # Trie node after consuming `ids` (None once the output is finished or
+        # off-template); memoized per prefix so each step only walks one new token
+        key = tuple(ids)
+        if key in states:
+            return states[key]
+        if not ids:
+            node = self.root
+        else:
+            node = self._state(ids[:-1], states)
+            token = ids[-1]
+            if node is None or token == self.eos_id or token == self.pad_id:
+                node = None
+            elif token in node:
+                node = node[token]
+            elif _END in node and token in self.root:
+                node = self.root[token]
+            else:
+                node = None
+        states[key] = node
+        return node
+
+    def allowed_tokens(self, input_ids, states):
+        ids = input_ids.tolist() if hasattr(input_ids, "tolist") else list(input_ids)
+        # The first decoder id is the decoder start token
+        node = self._state(ids[1:], states)
+        if node is None:
+            return [self.pad_id]
+        allowed = [t for t in node if t is not _END]
+        if _END in node:
+            allowed.extend(self.root_tokens)
+            allowed.append(self.eos_id)
+        return allowed
+
+    def prefix_fn(self):
+        # Fresh memo per call, so concurrent generate calls never share state
+        states = {}
+        return lambda batch_id, input_ids: self.allowed_tokens(input_ids, states)
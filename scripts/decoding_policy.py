@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import namedtuple
+
+# Per-deployment latency budget for a single prompt, in milliseconds
+LATENCY_BUDGET_MS = float(os.environ.get("RECOMMENDATION_LATENCY_BUDGET_MS", 1500))
+
+# Token budget: the training targets are one templated sentence per flagged parameter
+# (~20 T5 tokens) or a single "All ... within normal ranges" sentence (~24 tokens)
+TOKENS_PER_FLAG = 20
+TOKENS_ALL_NORMAL = 24
+TOKEN_MARGIN = 8
+MAX_LENGTH = 150
+
+# Starting guess of milliseconds per generated token on CPU, replaced by measurements
+PRIOR_MS_PER_TOKEN = {1: 4.0, 3: 9.0, 5: 14.0}
+MIN_SAMPLES = 5
+
+DecodingPolicy = namedtuple("DecodingPolicy", ["name", "num_beams", "max_length"])
+
+# Used when no flag information is available: the original fixed settings
+DEFAULT_POLICY = DecodingPolicy("beam5", 5, MAX_LENGTH)
+
+_stats = {}
+_lock = threading.Lock()
+
+
+def token_budget(num_flagged):
+    if num_flagged == 0:
+        return TOKENS_ALL_NORMAL + TOKEN_MARGIN
+    return min(MAX_LENGTH, num_flagged * TOKENS_PER_FLAG + TOKEN_MARGIN)
+
+
+def estimated_ms(num_beams, max_length):
+    with _lock:
+        entry = _stats.get(f"beam{num_beams}" if num_beams > 1 else "greedy")
+        if entry and entry["count"] >= MIN_SAMPLES:
+            ms_per_token = entry["total_ms"] / entry["total_tokens"]
+        else:
+            ms_per_token = PRIOR_MS_PER_TOKEN[num_beams]
+    return ms_per_token * max_length
+
+
+def choose_policy(num_flagged, latency_budget_ms=None):
+    # All-normal categories get one short greedy sentence; flagged ones get the
+    # widest beam whose estimated latency still fits the budget
+    if num_flagged is None:
+        return DEFAULT_POLICY
+    budget = LATENCY_BUDGET_MS if latency_budget_ms is None else latency_budget_ms
+    max_length = token_budget(num_flagged)
+
+    if num_flagged == 0:
+        return DecodingPolicy("greedy", 1, max_length)
+
+    for num_beams in (5, 3):
+        if estimated_ms(num_beams, max_length) <= budget:
+            return DecodingPolicy(f"beam{num_beams}", num_beams, max_length)
+    return DecodingPolicy("greedy", 1, max_length)
+
+
+def cap_beams(policy, num_beams):
+    # Same token budget with at most `num_beams` beams, renamed so stats stay per beam count
+    if policy.num_beams <= num_beams:
+        return policy
+    return policy._replace(name="greedy" if num_beams == 1 else f"beam{num_beams}", num_beams=num_beams)
+
+
+def record_latency(policy, elapsed_ms, num_prompts):
+    with _lock:
+        entry = _stats.setdefault(policy.name, {"count": 0, "total_ms": 0.0, "total_tokens": 0, "samples": []})
+        per_prompt = elapsed_ms / num_prompts
+        entry["count"] += num_prompts
+        entry["total_ms"] += elapsed_ms
+        entry["total_tokens"] += policy.max_length * num_prompts
+        entry["samples"].append(per_prompt)
+        del entry["samples"][:-1000]
+
+
+def policy_stats():
+    with _lock:
+        report = {}
+        for name, entry in _stats.items():
+            samples = sorted(entry["samples"])
+            report[name] = {
+                "prompts": entry["count"],
+                "mean_ms": round(entry["total_ms"] / entry["count"], 1),
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 1),
+                "ms_per_token": round(entry["total_ms"] / entry["total_tokens"], 2),
+            }
+        return report
+
+
+def reset_stats():
+    with _lock:
+        _stats.clear()
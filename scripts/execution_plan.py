@@ -0,0 +1,90 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from map_categories import map_columns_to_categories
+from reference_index import load_reference_index
+
+# Compiled plans kept per (header signature, reference workbook, workbook hash)
+PLAN_CACHE_SIZE = int(os.environ.get("PLAN_CACHE_SIZE", 128))
+
+PROMPT_PREFIX = "analyze: "
+PROMPT_SEPARATOR = "; "
+PROMPT_FIELD = "{param}: {val}"
+
+_plans = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+class ExecutionPlan:
+    """Everything about an upload that depends only on its header row.
+
+    Built once per column layout and reference workbook: the column ->
+    category mapping, the columns to flag with their reference entries and
+    general low/high arrays, and the per-category prompt layout (in reference
+    sheet order). The same plan serves flagging and prompt planning.
+    """
+
+    def __init__(self, signature, columns, index):
+        self.signature = signature
+        self.columns = list(columns)
+        self.index = index
+        self.category_mapping = map_columns_to_categories(self.columns)
+
+        self.flag_columns, self.flag_entries = index.resolve_columns(set(self.columns), self.category_mapping)
+        general = [entries[0] for entries in self.flag_entries]
+        self.low = index.low[general]
+        self.high = index.high[general]
+        # Without age/sex specific ranges every row uses low/high as they are
+        self.demographic = any(index.demographic[entries].any() for entries in self.flag_entries)
+
+        sheets = index.sheets()
+        self.prompt_layout = [
+            (category, self.category_mapping[category])
+            for category in sheets if self.category_mapping.get(category)
+        ]
+
+
+def header_signature(columns):
+    return hashlib.sha1("\x1f".join(map(str, columns)).encode("utf-8")).hexdigest()
+
+
+# Cached plan for a header row; a changed workbook (new hash) invalidates every older plan
+def get_plan(columns, reference_path):
+    reference_path = os.path.abspath(reference_path)
+    index = load_reference_index(reference_path)
+    signature = header_signature(columns)
+    key = (signature, reference_path, index.source_hash)
+    with _lock:
+        plan = _plans.get(key)
+        if plan is not None:
+            _plans.move_to_end(key)
+            _stats["hits"] += 1
+            return plan
+        _stats["misses"] += 1
+        for stale in [k for k in _plans if k[1] == reference_path and k[2] != index.source_hash]:
+            del _plans[stale]
+
+    plan = ExecutionPlan(signature, columns, index)
+    with _lock:
+        _plans[key] = plan
+        while len(_plans) > PLAN_CACHE_SIZE:
+            _plans.popitem(last=False)
+    return plan
+
+
+def render_prompt(row_values):
+    return PROMPT_PREFIX + PROMPT_SEPARATOR.join(PROMPT_FIELD.format(param=param, val=val) for param, val in row_values)
+
+
+def plan_cache_stats():
+    with _lock:
+        return {"plans": len(_plans), **_stats}
+
+
+def clear_plans():
+    with _lock:
+        _plans.clear()
+        _stats.update(hits=0, misses=0)
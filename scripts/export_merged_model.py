@@ -0,0 +1,102 @@
+import argparse
+import json
+import os
+
+import pandas as pd
+import torch
+from transformers import T5TokenizerFast, T5ForConditionalGeneration
+from peft import PeftModel
+
+from model_registry import DEFAULT_ADAPTER, DEFAULT_BASE_MODEL, MERGED_MARKER, merged_checkpoint_path
+from recommendation_cache import adapter_version
+
+base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
+SAMPLE_FILES = [
+    os.path.join(base_dir, "sample_report.csv"),
+    os.path.join(base_dir, "test_data.csv"),
+    os.path.join(base_dir, "new_dataset.csv"),
+]
+
+
+def load_unmerged(base_model_path, adapter_path):
+    tokenizer = T5TokenizerFast.from_pretrained(adapter_path)
+    base_model = T5ForConditionalGeneration.from_pretrained(base_model_path)
+    model = PeftModel.from_pretrained(base_model, adapter_path)
+    model.eval()
+    return tokenizer, model
+
+
+# Fold the LoRA weights into the base q/v projections and save a plain T5 checkpoint
+def export_merged_checkpoint(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, output_dir=None):
+    output_dir = output_dir or merged_checkpoint_path(adapter_path)
+    tokenizer, model = load_unmerged(base_model_path, adapter_path)
+
+    merged = model.merge_and_unload()
+    merged.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    # Written last, so loaders never pick up a half-written checkpoint
+    with open(os.path.join(output_dir, MERGED_MARKER), "w") as f:
+        json.dump({
+            "base_model": os.path.abspath(base_model_path),
+            "adapter": os.path.abspath(adapter_path),
+            "adapter_version": adapter_version(adapter_path),
+        }, f, indent=2)
+
+    print(f"Merged checkpoint saved at {output_dir}")
+    return output_dir
+
+
+def sample_prompts(files=SAMPLE_FILES):
+    # Reuse the inference prompt builder so the parity check sees real prompts
+    from integrate_model_new import collect_prompts
+
+    prompts = []
+    for path in files:
+        if not os.path.exists(path):
+            continue
+        df = pd.read_csv(path).apply(pd.to_numeric, errors='coerce')
+        prompts.extend(job.prompt for job in collect_prompts(df))
+    return prompts
+
+
+def generate_all(tokenizer, model, prompts, max_length=150, num_beams=5):
+    outputs = []
+    for prompt in prompts:
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True)
+        with torch.no_grad():
+            generated = model.generate(**inputs, max_length=max_length, num_beams=num_beams, early_stopping=True)
+        outputs.append(tokenizer.decode(generated[0], skip_special_tokens=True))
+    return outputs
+
+
+# Generate with the adapter-wrapped model and the merged checkpoint and compare outputs
+def check_parity(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, merged_path=None, prompts=None):
+    merged_path = merged_path or merged_checkpoint_path(adapter_path)
+    prompts = prompts if prompts is not None else sample_prompts()
+
+    tokenizer, unmerged = load_unmerged(base_model_path, adapter_path)
+    merged = T5ForConditionalGeneration.from_pretrained(merged_path)
+    merged.eval()
+
+    expected = generate_all(tokenizer, unmerged, prompts)
+    actual = generate_all(tokenizer, merged, prompts)
+
+    mismatches = [(p, e, a) for p, e, a in zip(prompts, expected, actual) if e != a]
+    print(f"Parity check: {len(prompts) - len(mismatches)}/{len(prompts)} outputs identical")
+    for prompt, e, a in mismatches:
+        print(f"  Prompt:   {prompt}\n  Adapter:  {e}\n  Merged:   {a}")
+    return not mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the LoRA adapter into T5 and check output parity.")
+    parser.add_argument("--base", default=DEFAULT_BASE_MODEL)
+    parser.add_argument("--adapter", default=DEFAULT_ADAPTER)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--skip-parity", action="store_true")
+    args = parser.parse_args()
+
+    output_dir = export_merged_checkpoint(args.base, args.adapter, args.output)
+    if not args.skip_parity:
+        check_parity(args.base, args.adapter, output_dir)
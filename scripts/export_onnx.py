@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+
+import torch
+from transformers import T5TokenizerFast, T5ForConditionalGeneration
+
+from export_merged_model import load_unmerged
+from inference_backends import ONNX_CONFIG_FILE, onnx_model_path
+from model_registry import DEFAULT_ADAPTER, DEFAULT_BASE_MODEL, find_merged_checkpoint
+
+OPSET = 17
+
+
+def _legacy_cache(past_key_values):
+    # Newer transformers return Cache objects; the ONNX graphs use the flat tuple layout
+    if hasattr(past_key_values, "to_legacy_cache"):
+        return past_key_values.to_legacy_cache()
+    return past_key_values
+
+
+def _as_cache(legacy):
+    try:
+        from transformers.cache_utils import EncoderDecoderCache
+    except ImportError:
+        return legacy
+    return EncoderDecoderCache.from_legacy_cache(legacy)
+
+
+class EncoderWrapper(torch.nn.Module):
+    def __init__(self, model):
+        super().__init__()
+        self.encoder = model.get_encoder()
+
+    def forward(self, input_ids, attention_mask):
+        return self.encoder(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state
+
+
+class DecoderInitWrapper(torch.nn.Module):
+    # First decoding step: returns logits plus self and cross key/values for every layer
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, encoder_hidden_states):
+        out = self.model(
+            decoder_input_ids=decoder_input_ids,
+            attention_mask=encoder_attention_mask,
+            encoder_outputs=(encoder_hidden_states,),
+            use_cache=True,
+            return_dict=True,
+        )
+        present = _legacy_cache(out.past_key_values)
+        return (out.logits,) + tuple(t for layer in present for t in layer)
+
+
+class DecoderWithPastWrapper(torch.nn.Module):
+    # Later steps: one new token in, logits plus updated self-attention key/values out
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+        self.num_layers = model.config.num_decoder_layers
+
+    def forward(self, decoder_input_ids, encoder_attention_mask, encoder_hidden_states, *past):
+        legacy = tuple(tuple(past[4 * i:4 * i + 4]) for i in range(self.num_layers))
+        out = self.model(
+            decoder_input_ids=decoder_input_ids,
+            attention_mask=encoder_attention_mask,
+            encoder_outputs=(encoder_hidden_states,),
+            past_key_values=_as_cache(legacy),
+            use_cache=True,
+            return_dict=True,
+        )
+        present = _legacy_cache(out.past_key_values)
+        return (out.logits,) + tuple(t for layer in present for t in layer[:2])
+
+
+def load_for_export(base_model_path, adapter_path):
+    merged_path = find_merged_checkpoint(adapter_path)
+    if merged_path:
+        return T5TokenizerFast.from_pretrained(merged_path), T5ForConditionalGeneration.from_pretrained(merged_path)
+    tokenizer, model = load_unmerged(base_model_path, adapter_path)
+    return tokenizer, model.merge_and_unload()
+
+
+def export_onnx(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, output_dir=None):
+    output_dir = output_dir or onnx_model_path(adapter_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    tokenizer, model = load_for_export(base_model_path, adapter_path)
+    model.eval()
+    model.config.use_cache = True
+    num_layers = model.config.num_decoder_layers
+
+    sample = tokenizer(["analyze: Hemoglobin: 12.25; Platelets: 160000"], return_tensors="pt")
+    input_ids, attention_mask = sample["input_ids"], sample["attention_mask"]
+    decoder_input_ids = torch.full((1, 1), model.config.decoder_start_token_id, dtype=torch.long)
+
+    with torch.no_grad():
+        hidden = EncoderWrapper(model)(input_ids, attention_mask)
+        init_outputs = DecoderInitWrapper(model)(decoder_input_ids, attention_mask, hidden)
+
+    torch.onnx.export(
+        EncoderWrapper(model), (input_ids, attention_mask),
+        os.path.join(output_dir, "encoder.onnx"),
+        input_names=["input_ids", "attention_mask"],
+        output_names=["encoder_hidden_states"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "source"},
+            "attention_mask": {0: "batch", 1: "source"},
+            "encoder_hidden_states": {0: "batch", 1: "source"},
+        },
+        opset_version=OPSET,
+    )
+
+    present_names, present_axes = [], {}
+    for i in range(num_layers):
+        for kind, axis in (("self", "target"), ("cross", "source")):
+            for part in ("key", "value"):
+                name = f"present_{i}_{kind}_{part}"
+                present_names.append(name)
+                present_axes[name] = {0: "batch", 2: axis}
+
+    common_axes = {
+        "decoder_input_ids": {0: "batch"},
+        "encoder_attention_mask": {0: "batch", 1: "source"},
+        "encoder_hidden_states": {0: "batch", 1: "source"},
+        "logits": {0: "batch"},
+    }
+
+    torch.onnx.export(
+        DecoderInitWrapper(model), (decoder_input_ids, attention_mask, hidden),
+        os.path.join(output_dir, "decoder_init.onnx"),
+        input_names=["decoder_input_ids", "encoder_attention_mask", "encoder_hidden_states"],
+        output_names=["logits"] + present_names,
+        dynamic_axes={**common_axes, **present_axes},
+        opset_version=OPSET,
+    )
+
+    past_names = [name.replace("present_", "past_") for name in present_names]
+    past_axes = {name.replace("present_", "past_"): axes for name, axes in present_axes.items()}
+    self_present_names = [name for name in present_names if "_self_" in name]
+    self_present_axes = {name: present_axes[name] for name in self_present_names}
+
+    torch.onnx.export(
+        DecoderWithPastWrapper(model), (decoder_input_ids, attention_mask, hidden, *init_outputs[1:]),
+        os.path.join(output_dir, "decoder_with_past.onnx"),
+        input_names=["decoder_input_ids", "encoder_attention_mask", "encoder_hidden_states"] + past_names,
+        output_names=["logits"] + self_present_names,
+        dynamic_axes={**common_axes, **past_axes, **self_present_axes},
+        opset_version=OPSET,
+    )
+
+    tokenizer.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, ONNX_CONFIG_FILE), "w") as f:
+        json.dump({
+            "num_layers": num_layers,
+            "pad_token_id": model.config.pad_token_id,
+            "eos_token_id": model.config.eos_token_id,
+            "decoder_start_token_id": model.config.decoder_start_token_id,
+        }, f, indent=2)
+
+    print(f"ONNX graphs saved at {output_dir}")
+    return output_dir
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the fine-tuned T5 encoder and decoder graphs to ONNX.")
+    parser.add_argument("--base", default=DEFAULT_BASE_MODEL)
+    parser.add_argument("--adapter", default=DEFAULT_ADAPTER)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    export_onnx(args.base, args.adapter, args.output)
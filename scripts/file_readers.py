@@ -0,0 +1,139 @@
+import csv
+import time
+from collections import namedtuple
+
+import pandas as pd
+
+from pdf_reports import read_pdf_report
+
+# Bytes inspected to pick a reader
+SNIFF_BYTES = 8192
+CSV_DELIMITERS = ",;\t|"
+
+# matches(head, filename) -> bool; read(source, dtype) -> DataFrame;
+# chunks(source, chunksize, dtype) -> iterator of DataFrames, or None when the format
+# has no streaming reader. `dtype` is the reader's own default, overridable per call.
+Reader = namedtuple("Reader", ["name", "matches", "read", "chunks", "dtype"])
+
+READERS = []
+
+
+def register_reader(name, matches, read, chunks=None, dtype=None, first=False):
+    # Readers are tried in registration order; first=True puts a new reader ahead of the built-ins
+    reader = Reader(name, matches, read, chunks, dtype)
+    READERS[:] = [r for r in READERS if r.name != name]
+    if first:
+        READERS.insert(0, reader)
+    else:
+        READERS.append(reader)
+    return reader
+
+
+def rewind(source):
+    if hasattr(source, "seek"):
+        source.seek(0)
+
+
+def read_head(source, size=SNIFF_BYTES):
+    if hasattr(source, "read"):
+        rewind(source)
+        head = source.read(size)
+        rewind(source)
+        return head
+    with open(source, "rb") as f:
+        return f.read(size)
+
+
+def looks_like_text(head):
+    return bool(head) and b"\x00" not in head
+
+
+def csv_delimiter(head):
+    try:
+        sample = head.decode("utf-8", errors="replace")
+        return csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS).delimiter
+    except csv.Error:
+        return ","
+
+
+# --- Built-in readers ---
+
+def _read_excel(source, dtype=None):
+    rewind(source)
+    return pd.read_excel(source, engine='openpyxl', dtype=dtype)
+
+
+def _read_legacy_excel(source, dtype=None):
+    rewind(source)
+    return pd.read_excel(source, dtype=dtype)
+
+
+def _read_parquet(source, dtype=None):
+    rewind(source)
+    df = pd.read_parquet(source)
+    return df.astype(dtype) if dtype is not None else df
+
+
+def _read_pdf(source, dtype=None):
+    df = read_pdf_report(source)
+    return df.astype(dtype) if dtype is not None else df
+
+
+def _csv_options(source):
+    return {"sep": csv_delimiter(read_head(source))}
+
+
+def _read_csv(source, dtype=None):
+    options = _csv_options(source)
+    rewind(source)
+    return pd.read_csv(source, dtype=dtype, **options)
+
+
+def _csv_chunks(source, chunksize, dtype=None):
+    options = _csv_options(source)
+    rewind(source)
+    return pd.read_csv(source, dtype=dtype, chunksize=chunksize, **options)
+
+
+register_reader("xlsx", lambda head, filename: head.startswith(b"PK\x03\x04"), _read_excel)
+register_reader("xls", lambda head, filename: head.startswith(b"\xd0\xcf\x11\xe0"), _read_legacy_excel)
+register_reader("pdf", lambda head, filename: head.startswith(b"%PDF"), _read_pdf)
+register_reader("parquet", lambda head, filename: head.startswith(b"PAR1"), _read_parquet)
+register_reader("csv", lambda head, filename: looks_like_text(head), _read_csv, chunks=_csv_chunks)
+
+
+def sniff(source, filename=None):
+    head = read_head(source)
+    for reader in READERS:
+        if reader.matches(head, filename):
+            return reader
+    raise ValueError("Unsupported or unreadable file format.")
+
+
+def _label(source, filename):
+    if filename:
+        return filename
+    return source if isinstance(source, str) else "upload"
+
+
+# Parse `source` (path or binary buffer) with the reader its first bytes point to
+def read_table(source, filename=None, dtype=None):
+    reader = sniff(source, filename)
+    start = time.perf_counter()
+    result = reader.read(source, dtype if dtype is not None else reader.dtype)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"Read '{_label(source, filename)}' with the {reader.name} reader in {elapsed_ms:.1f} ms.")
+    return result
+
+
+# DataFrames of at most `chunksize` rows; formats without a streaming reader are read whole and sliced
+def read_table_chunks(source, chunksize, filename=None, dtype=None):
+    reader = sniff(source, filename)
+    if reader.chunks is None:
+        df = read_table(source, filename, dtype)
+        for start in range(0, len(df), chunksize):
+            yield df.iloc[start:start + chunksize].copy()
+        return
+
+    print(f"Reading '{_label(source, filename)}' with the {reader.name} reader in chunks of {chunksize} rows.")
+    yield from reader.chunks(source, chunksize, dtype if dtype is not None else reader.dtype)
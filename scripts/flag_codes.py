@@ -0,0 +1,18 @@
+import numpy as np
+import pandas as pd
+
+# Flag codes shared by flag_out_of_range (categorical _Flag columns over FLAG_LABELS)
+# and prepare_features (int8 code columns). UNKNOWN marks a missing or unrecognised flag.
+FLAG_LABELS = ["Normal", "Low", "High", "Invalid"]
+NORMAL, LOW, HIGH, INVALID = range(len(FLAG_LABELS))
+UNKNOWN = -1
+
+# String flags as older callers produce them ("" was the original normal flag)
+FLAG_CODES = {"": NORMAL, "Normal": NORMAL, "Low": LOW, "High": HIGH, "Invalid": INVALID}
+
+
+def encode_flags(column):
+    # One _Flag column (categorical or strings) -> int8 codes
+    if isinstance(column.dtype, pd.CategoricalDtype) and list(column.cat.categories) == FLAG_LABELS:
+        return column.cat.codes.to_numpy(dtype=np.int8)
+    return column.map(FLAG_CODES).fillna(UNKNOWN).to_numpy(dtype=np.int8)
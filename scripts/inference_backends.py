@@ -0,0 +1,193 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from prompt_encoder import pad_batch
+
+ONNX_CONFIG_FILE = "onnx_config.json"
+
+_backends = {}
+_lock = threading.Lock()
+
+
+def onnx_model_path(adapter_path):
+    return adapter_path.rstrip("/\\") + "_onnx"
+
+
+class InferenceBackend:
+    """Interface behind generate_recommendation.
+
+    A backend owns a tokenizer and turns lists of (unpadded) token-id lists into
+    decoded recommendation strings, in input order. effective_policy() reports
+    the decoding policy and adapter a generate call will actually run, so
+    callers cache and time outputs under those.
+    """
+
+    name = "base"
+
+    @property
+    def tokenizer(self):
+        raise NotImplementedError
+
+    def effective_policy(self, policy, adapter=None):
+        return policy, adapter
+
+    def generate(self, input_ids, max_length=150, num_beams=5, prefix_allowed_tokens_fn=None, adapter=None):
+        raise NotImplementedError
+
+
+class TorchBackend(InferenceBackend):
+    """transformers/PyTorch generation on the model from the shared registry."""
+
+    name = "torch"
+
+    def __init__(self, loader):
+        # loader() returns the registry's (tokenizer, model, device); called lazily
+        self._loader = loader
+
+    @property
+    def tokenizer(self):
+        return self._loader().tokenizer
+
+    def generate(self, input_ids, max_length=150, num_beams=5, prefix_allowed_tokens_fn=None, adapter=None):
+        import torch
+
+        tokenizer, model, device = self._loader()
+        ids, mask = pad_batch(input_ids, tokenizer.pad_token_id)
+        batch = {"input_ids": torch.from_numpy(ids).to(device), "attention_mask": torch.from_numpy(mask).to(device)}
+        kwargs = dict(max_length=max_length, num_beams=num_beams, early_stopping=num_beams > 1,
+                      prefix_allowed_tokens_fn=prefix_allowed_tokens_fn)
+        with torch.no_grad():
+            if adapter is None:
+                outputs = model.generate(**batch, **kwargs)
+            else:
+                from model_registry import active_adapter
+                with active_adapter(model, adapter):
+                    outputs = model.generate(**batch, **kwargs)
+        return tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime (CPU) generation over graphs written by export_onnx.py.
+
+    The encoder runs once per batch. The first decoder step runs the
+    decoder_init graph, which also returns the self- and cross-attention
+    key/values; every later step feeds a single token plus the cached
+    key/values to decoder_with_past. Decoding is greedy and the graphs hold
+    one merged adapter, which effective_policy() reports: beam requests run
+    with num_beams=1 and `adapter` is ignored. prefix_allowed_tokens_fn masks
+    the logits of each step the same way transformers' generate does.
+    """
+
+    name = "onnx"
+
+    def __init__(self, onnx_dir):
+        import onnxruntime as ort
+        from transformers import T5TokenizerFast
+
+        with open(os.path.join(onnx_dir, ONNX_CONFIG_FILE)) as f:
+            self.config = json.load(f)
+        self._tokenizer = T5TokenizerFast.from_pretrained(onnx_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        providers = ["CPUExecutionProvider"]
+        self.encoder = ort.InferenceSession(os.path.join(onnx_dir, "encoder.onnx"), options, providers=providers)
+        self.decoder_init = ort.InferenceSession(os.path.join(onnx_dir, "decoder_init.onnx"), options,
+                                                 providers=providers)
+        self.decoder_with_past = ort.InferenceSession(os.path.join(onnx_dir, "decoder_with_past.onnx"), options,
+                                                      providers=providers)
+        self.num_layers = self.config["num_layers"]
+        # The exporter may drop inputs a graph never reads (e.g. encoder states once cross K/V are cached)
+        self._with_past_inputs = {i.name for i in self.decoder_with_past.get_inputs()}
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer
+
+    def effective_policy(self, policy, adapter=None):
+        if policy.num_beams > 1:
+            suffix = "-constrained" if policy.name.endswith("-constrained") else ""
+            policy = policy._replace(name=f"greedy{suffix}", num_beams=1)
+        return policy, None
+
+    def generate(self, input_ids, max_length=150, num_beams=5, prefix_allowed_tokens_fn=None, adapter=None):
+        pad_id = self.config["pad_token_id"]
+        eos_id = self.config["eos_token_id"]
+        start_id = self.config["decoder_start_token_id"]
+
+        ids, mask = pad_batch(input_ids, pad_id)
+        batch_size = ids.shape[0]
+
+        hidden = self.encoder.run(None, {"input_ids": ids, "attention_mask": mask})[0]
+
+        tokens = np.full((batch_size, 1), start_id, dtype=np.int64)
+        outputs = self.decoder_init.run(None, {
+            "decoder_input_ids": tokens,
+            "encoder_attention_mask": mask,
+            "encoder_hidden_states": hidden,
+        })
+        logits, present = outputs[0], outputs[1:]
+        self_past = [present[4 * i + j] for i in range(self.num_layers) for j in (0, 1)]
+        cross_past = [present[4 * i + j] for i in range(self.num_layers) for j in (2, 3)]
+
+        generated = [tokens]
+        finished = np.zeros(batch_size, dtype=bool)
+        for _ in range(max_length - 1):
+            step_logits = logits[:, -1, :]
+            if prefix_allowed_tokens_fn is not None:
+                sequences = np.concatenate(generated, axis=1)
+                allowed = np.full(step_logits.shape, -np.inf, dtype=step_logits.dtype)
+                for b in range(batch_size):
+                    allowed[b, prefix_allowed_tokens_fn(b, sequences[b])] = 0
+                step_logits = step_logits + allowed
+            next_tokens = step_logits.argmax(axis=-1)
+            next_tokens = np.where(finished, pad_id, next_tokens).astype(np.int64)
+            generated.append(next_tokens[:, None])
+            finished |= next_tokens == eos_id
+            if finished.all():
+                break
+
+            feed = {
+                "decoder_input_ids": next_tokens[:, None],
+                "encoder_attention_mask": mask,
+                "encoder_hidden_states": hidden,
+            }
+            for i in range(self.num_layers):
+                feed[f"past_{i}_self_key"] = self_past[2 * i]
+                feed[f"past_{i}_self_value"] = self_past[2 * i + 1]
+                feed[f"past_{i}_cross_key"] = cross_past[2 * i]
+                feed[f"past_{i}_cross_value"] = cross_past[2 * i + 1]
+            feed = {k: v for k, v in feed.items() if k in self._with_past_inputs}
+            outputs = self.decoder_with_past.run(None, feed)
+            logits, self_past = outputs[0], outputs[1:]
+
+        sequences = np.concatenate(generated, axis=1)
+        return self._tokenizer.batch_decode(sequences, skip_special_tokens=True)
+
+
+def get_backend(name, torch_loader, onnx_dir=None):
+    # One backend instance per name; ONNX falls back to torch when it cannot be loaded
+    with _lock:
+        backend = _backends.get(name)
+        if backend is not None:
+            return backend
+
+        if name == "onnx":
+            try:
+                backend = OnnxBackend(onnx_dir)
+            except Exception as e:
+                print(f"ONNX Runtime backend unavailable ({e}); using torch.")
+        if backend is None:
+            backend = _backends.get("torch") or TorchBackend(torch_loader)
+            _backends["torch"] = backend
+
+        _backends[name] = backend
+        return backend
+
+
+def release_backends():
+    with _lock:
+        _backends.clear()
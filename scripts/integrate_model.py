@@ -1,22 +1,25 @@
 import pandas as pd
-from transformers import T5Tokenizer, T5ForConditionalGeneration, AutoTokenizer, AutoModelForSeq2SeqLM
 import torch
-from peft import PeftModel
 import os
 from map_categories import map_columns_to_categories
+from model_registry import active_adapter, get_model, get_multi_adapter_model
+from lora_adapters import available_adapters
+from decoding_policy import DEFAULT_POLICY, choose_policy
+from flag_codes import FLAG_CODES, LOW, HIGH
 
-# Load fine-tuned model and tokenizer
+# Fine-tuned model and tokenizer (shared with integrate_model_new through the registry)
 base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
 model_path = os.path.join(base_dir, "recommendation_model")
 t5_model_path = os.path.join(base_dir, "t5-small")
-tokenizer = T5Tokenizer.from_pretrained(model_path)
-base_model = T5ForConditionalGeneration.from_pretrained(t5_model_path)
-model = PeftModel.from_pretrained(base_model, model_path)
+adapters_path = os.environ.get("RECOMMENDATION_ADAPTERS_DIR", os.path.join(base_dir, "recommendation_adapters"))
+BATCH_SIZE = int(os.environ.get("RECOMMENDATION_BATCH_SIZE", 16))
 
-model.eval()
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# With per-category adapters this is integrate_model_new's multi-adapter model (one copy
+# of the base weights), generated from with its "default" adapter active
+def load_model():
+    if available_adapters(adapters_path):
+        return get_multi_adapter_model(t5_model_path, model_path, adapters_path)
+    return get_model(t5_model_path, model_path)
 
 # Example function to convert patient row into prompt string
 def format_patient_prompt(row):
@@ -29,37 +32,101 @@ def format_patient_prompt(row):
     return prompt
 
 # Generate recommendation using the fine-tuned T5
-def generate_recommendation(prompt, max_length=150):
+def generate_recommendation(prompt, max_length=150, policy=None):
+    policy = policy or DEFAULT_POLICY._replace(max_length=max_length)
+    tokenizer, model, device = load_model()
     inputs = tokenizer(prompt, return_tensors="pt", truncation=True, padding=True)
     inputs = {k: v.to(device) for k, v in inputs.items()}  # move to device
-    outputs = model.generate(**inputs, max_length=max_length, num_beams=5, early_stopping=True)
+    with active_adapter(model):
+        outputs = model.generate(**inputs, max_length=policy.max_length, num_beams=policy.num_beams,
+                                 early_stopping=policy.num_beams > 1)
     return tokenizer.decode(outputs[0], skip_special_tokens=True)
 
+# Batched variant: group prompts by decoding policy, sort each group into token-length
+# buckets and run one padded generate call per bucket, returning outputs in the
+# original prompt order
+def generate_recommendations_batch(prompts, max_length=150, batch_size=BATCH_SIZE, policies=None):
+    if not prompts:
+        return []
+    if policies is None:
+        policies = [DEFAULT_POLICY._replace(max_length=max_length)] * len(prompts)
+
+    tokenizer, model, device = load_model()
+    encoded = tokenizer(list(prompts), truncation=True)
+    results = [None] * len(prompts)
+    groups = {}
+    for i, policy in enumerate(policies):
+        groups.setdefault(policy, []).append(i)
+
+    for policy, indices in groups.items():
+        order = sorted(indices, key=lambda i: len(encoded["input_ids"][i]))
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            try:
+                batch = tokenizer.pad(
+                    {
+                        "input_ids": [encoded["input_ids"][i] for i in bucket],
+                        "attention_mask": [encoded["attention_mask"][i] for i in bucket],
+                    },
+                    return_tensors="pt",
+                )
+                batch = {k: v.to(device) for k, v in batch.items()}
+                with torch.no_grad(), active_adapter(model):
+                    outputs = model.generate(**batch, max_length=policy.max_length, num_beams=policy.num_beams,
+                                             early_stopping=policy.num_beams > 1)
+                decoded = tokenizer.batch_decode(outputs, skip_special_tokens=True)
+            except Exception as e:
+                decoded = [f"Error generating recommendation: {e}"] * len(bucket)
+
+            for i, text in zip(bucket, decoded):
+                results[i] = text
+
+    return results
+
+# Low/High parameters of one category in a row, from the "<param>_Flag" columns
+# flag_out_of_range adds; None when the row carries no flags for the category
+def count_flagged(row, cols):
+    flags = [row[f"{col}_Flag"] for col in cols if f"{col}_Flag" in row.index]
+    if not flags:
+        return None
+    return sum(1 for flag in flags if FLAG_CODES.get(flag, flag) in (LOW, HIGH))
+
 # Apply on your DataFrame
-def add_ai_recommendations(df, feature_cols):
+def add_ai_recommendations(df, feature_cols, batched=True):
     global df_features
     df_features = df[feature_cols]  # keep features subset handy
     
     # Map the feature columns to categories
     category_columns = map_columns_to_categories(feature_cols)
     
-    # Prepare a list to hold recommendations per category per row
-    category_recommendations = {cat: [] for cat in category_columns}
-    
+    # Build every prompt up front, remembering which category it belongs to
+    prompt_categories = []
+    prompts = []
+    policies = []
     for _, row in df.iterrows():
         for category, cols in category_columns.items():
             # Extract the subset of features relevant to this category
             category_data = row[cols]
             
             # Format prompt based only on category data
-            prompt = format_patient_prompt(category_data)
-            
+            prompt_categories.append(category)
+            prompts.append(format_patient_prompt(category_data))
+            policies.append(choose_policy(count_flagged(row, cols)))
+
+    if batched:
+        recs = generate_recommendations_batch(prompts, policies=policies)
+    else:
+        recs = []
+        for prompt, policy in zip(prompts, policies):
             try:
-                rec = generate_recommendation(prompt)
+                recs.append(generate_recommendation(prompt, policy=policy))
             except Exception as e:
-                rec = f"Error generating recommendation: {e}"
-            
-            category_recommendations[category].append(rec)
+                recs.append(f"Error generating recommendation: {e}")
+
+    # Prepare a list to hold recommendations per category per row
+    category_recommendations = {cat: [] for cat in category_columns}
+    for category, rec in zip(prompt_categories, recs):
+        category_recommendations[category].append(rec)
     
     # Add a new column for each category with its recommendations
     for category, recs in category_recommendations.items():
@@ -1,121 +1,342 @@
+import time
+from collections import namedtuple
 import pandas as pd
-from transformers import T5Tokenizer, T5ForConditionalGeneration
-import torch
-from peft import PeftModel
-from map_categories import map_columns_to_categories
+from decoding_policy import DEFAULT_POLICY, cap_beams, choose_policy, record_latency
+from template_engine import RECOMMENDATION_ENGINE, record_usage, render_category
+from constrained_decoding import CONSTRAINED_DECODING, CONSTRAINED_NUM_BEAMS, PhraseTrie, template_sentences
+from inference_backends import get_backend, onnx_model_path
+from reference_index import load_reference_index
+from execution_plan import get_plan, render_prompt
+from prompt_encoder import prompt_encoder, tokenization_stats
+from flag_codes import LOW, HIGH
+from recommendation_cache import RecommendationCache, adapter_version
+from lora_adapters import adapter_name, available_adapters
 import os
+import threading
 base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
 # Paths
 model_path = os.path.join(base_dir, "recommendation_model")
 t5_model_path = os.path.join(base_dir, "t5-small")
 reference_excel_path = os.path.join(base_dir, "reference_excel.xlsx")
+# Optional per-category LoRA adapters (see fine_tune_per_category); "default" is model_path
+adapters_path = os.environ.get("RECOMMENDATION_ADAPTERS_DIR", os.path.join(base_dir, "recommendation_adapters"))
 
-# Load model and tokenizer
-tokenizer = T5Tokenizer.from_pretrained(model_path)
-base_model = T5ForConditionalGeneration.from_pretrained(t5_model_path)
-model = PeftModel.from_pretrained(base_model, model_path)
-model.eval()
+# Number of prompts sent to model.generate in one padded batch
+BATCH_SIZE = int(os.environ.get("RECOMMENDATION_BATCH_SIZE", 16))
+# "torch" (default) or "onnx" for ONNX Runtime graphs exported by export_onnx.py
+INFERENCE_BACKEND = os.environ.get("RECOMMENDATION_BACKEND", "torch")
+# Specialized per-category adapters are small enough to decode with fewer beams
+CATEGORY_ADAPTER_BEAMS = int(os.environ.get("RECOMMENDATION_CATEGORY_ADAPTER_BEAMS", 3))
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+_category_adapters = None
+
+def load_category_adapters():
+    # {adapter name: path}; always empty on the ONNX backend, whose graphs hold one merged adapter
+    global _category_adapters
+    if _category_adapters is None:
+        _category_adapters = {}
+        if INFERENCE_BACKEND == "torch":
+            _category_adapters = available_adapters(adapters_path)
+    return _category_adapters
+
+def adapter_for(category):
+    # None when only the shared adapter exists; "default" for categories without their own
+    adapters = load_category_adapters()
+    if not adapters:
+        return None
+    name = adapter_name(category)
+    return name if name in adapters else "default"
+
+# Model and tokenizer come from the shared registry and are loaded on first use.
+# The registry is imported lazily so the ONNX backend never pulls in torch.
+def load_model():
+    if load_category_adapters():
+        from model_registry import get_multi_adapter_model
+        return get_multi_adapter_model(t5_model_path, model_path, adapters_path)
+    from model_registry import get_model
+    return get_model(t5_model_path, model_path)
+
+def load_backend():
+    return get_backend(INFERENCE_BACKEND, load_model, onnx_model_path(model_path))
+
+# Cache version: adapter checkpoints, backend and, for torch, the dtype and whether
+# the LoRA is merged (int8 and float32 outputs differ, so they never share entries)
+def cache_version(backend_name):
+    version = f"{adapter_version(model_path)}-{adapter_version(adapters_path)}-{backend_name}"
+    if backend_name == "torch":
+        from model_registry import weights_variant
+        version += "-" + weights_variant(model_path, multi_adapter=bool(load_category_adapters()))
+    return version
+
+# Generated recommendations, keyed by canonical prompt and cache_version; built on first
+# use so importing this module never loads the registry (and torch)
+_recommendation_cache = None
+_cache_lock = threading.Lock()
+
+def load_recommendation_cache():
+    global _recommendation_cache
+    with _cache_lock:
+        if _recommendation_cache is None:
+            # The resolved backend: an unavailable ONNX backend falls back to torch
+            _recommendation_cache = RecommendationCache(version=cache_version(load_backend().name))
+        return _recommendation_cache
+
+# One (row, category) unit of work; num_flagged is None when no flags were supplied
+PromptJob = namedtuple("PromptJob", ["row_index", "category", "row_values", "prompt", "num_flagged"])
+# A job that still needs the model; position indexes into the PromptJob list
+ModelRequest = namedtuple("ModelRequest", ["position", "prompt", "policy", "adapter"])
 
 # Load reference sheet as dictionary of parameter ranges and units
+# ({sheet: {param: (low, high, unit)}}), from the process-wide compiled index
 def load_reference_excel(path):
-    xls = pd.ExcelFile(path)
-    ref_data = {}
+    return load_reference_index(path).sheets()
 
-    for sheet in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet)
-        df.columns = [col.strip() for col in df.columns]
+# Token trie over the template sentences, built once from the reference workbook
+_phrase_trie = None
 
-        if 'Parameter' in df.columns:
-            key_col = 'Parameter'
-        elif 'Value' in df.columns:
-            key_col = 'Value'
-        else:
-            continue
+def load_phrase_trie(tokenizer):
+    global _phrase_trie
+    if _phrase_trie is None:
+        _phrase_trie = PhraseTrie(tokenizer, template_sentences(load_reference_excel(reference_excel_path)))
+    return _phrase_trie
 
-        if 'Unit' not in df.columns:
-            df['Unit'] = ""
+# Constrained outputs can only be template sentences, so fewer beams are needed
+def constrained_policy(policy):
+    return policy._replace(name=f"{policy.name}-constrained", num_beams=min(policy.num_beams, CONSTRAINED_NUM_BEAMS))
 
-        sheet_dict = {}
-        for _, row in df.iterrows():
-            param = row[key_col]
-            low = row.get('Low', None)
-            high = row.get('High', None)
-            unit = row.get('Unit', "")
-            if pd.notna(param):
-                sheet_dict[param] = (low, high, unit)
-        ref_data[sheet] = sheet_dict
+def prefix_fn(backend, policy):
+    if not policy.name.endswith("-constrained"):
+        return None
+    return load_phrase_trie(backend.tokenizer).prefix_fn()
 
-    return ref_data
+# Cache variant: every decoding setting that changes the output, plus the adapter
+def cache_variant(policy, adapter=None):
+    variant = f"{policy.name}|beams={policy.num_beams}|max_length={policy.max_length}"
+    return variant if adapter is None else f"{variant}|{adapter}"
 
 # Generate model recommendation
-def generate_recommendation(prompt, max_length=150):
-    inputs = tokenizer(prompt, return_tensors="pt", truncation=True, padding=True)
-    inputs = {k: v.to(device) for k, v in inputs.items()}
-    outputs = model.generate(**inputs, max_length=max_length, num_beams=5, early_stopping=True)
-    return tokenizer.decode(outputs[0], skip_special_tokens=True)
+def generate_recommendation(prompt, max_length=150, policy=None, constrained=None, adapter=None):
+    policy = policy or DEFAULT_POLICY._replace(max_length=max_length)
+    if CONSTRAINED_DECODING if constrained is None else constrained:
+        policy = constrained_policy(policy)
+    # Cached and timed under what the backend actually runs (ONNX decodes greedily)
+    backend = load_backend()
+    policy, adapter = backend.effective_policy(policy, adapter)
+    recommendation_cache = load_recommendation_cache()
+    variant = cache_variant(policy, adapter)
+    cached = recommendation_cache.get(prompt, variant)
+    if cached is not None:
+        return cached
 
-# Build final structured output
-def build_structured_recommendations(df):
-    reference_sheets = load_reference_excel(reference_excel_path)  # your reference data mapping
-    category_mapping = map_columns_to_categories(df.columns.tolist())  # map categories to params
-    results = []
+    input_ids = prompt_encoder(backend.tokenizer).encode([prompt])[0]
+    start = time.perf_counter()
+    recommendation = backend.generate([input_ids], max_length=policy.max_length, num_beams=policy.num_beams,
+                                      prefix_allowed_tokens_fn=prefix_fn(backend, policy), adapter=adapter)[0]
+    record_latency(policy, (time.perf_counter() - start) * 1000, 1)
+    recommendation_cache.put(prompt, recommendation, variant)
+    return recommendation
 
-    for _, row in df.iterrows():
-        for category, param_dict in reference_sheets.items():
-            values = {}
+def cache_stats():
+    return load_recommendation_cache().stats()
 
-            category_cols = category_mapping.get(category, [])
-            if not category_cols:
-                continue
+def tokenizer_stats():
+    return tokenization_stats()
 
-            prompt_parts = []
-            for param in category_cols:
-                if param in row and pd.notna(row[param]):
-                    val = row[param]
-                    prompt_parts.append(f"{param}: {val}")
+# Generate recommendations for many prompts at once.
+# Prompts are grouped by adapter and decoding policy, so each adapter switch is
+# paid once per group and beam count / token budget are uniform per call. Each
+# group is tokenized once, sorted by token length and cut into buckets of
+# `batch_size` so each padded generate call wastes as little as possible on pad
+# tokens. Outputs are returned in the same order as `prompts`. Cached prompts
+# are answered before tokenization and duplicate prompts are generated once.
+def generate_recommendations_batch(prompts, max_length=150, batch_size=BATCH_SIZE, policies=None, constrained=None,
+                                   adapters=None):
+    if not prompts:
+        return []
+    if policies is None:
+        policies = [DEFAULT_POLICY._replace(max_length=max_length)] * len(prompts)
+    if CONSTRAINED_DECODING if constrained is None else constrained:
+        policies = [constrained_policy(policy) for policy in policies]
+    if adapters is None:
+        adapters = [None] * len(prompts)
 
-            if not prompt_parts:
-                continue
+    # Cached and timed under what the backend actually runs (ONNX decodes greedily)
+    backend = load_backend()
+    recommendation_cache = load_recommendation_cache()
+    results = [None] * len(prompts)
+    groups = {}
+    positions = {}
+    for i, (prompt, policy, adapter) in enumerate(zip(prompts, policies, adapters)):
+        policy, adapter = backend.effective_policy(policy, adapter)
+        variant = cache_variant(policy, adapter)
+        key = recommendation_cache.key(prompt, variant)
+        if key in positions:
+            positions[key].append(i)
+            continue
+        cached = recommendation_cache.get(prompt, variant)
+        if cached is not None:
+            results[i] = cached
+            continue
+        positions[key] = [i]
+        groups.setdefault((adapter, policy), []).append((key, prompt, variant))
+
+    for (adapter, policy), unique_prompts in sorted(groups.items(), key=lambda g: str(g[0][0])):
+        encoded = prompt_encoder(backend.tokenizer).encode([prompt for _, prompt, _ in unique_prompts])
+        order = sorted(range(len(unique_prompts)), key=lambda i: len(encoded[i]))
 
-            prompt = "analyze: " + "; ".join(prompt_parts)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            started = time.perf_counter()
             try:
-                recommendation = generate_recommendation(prompt)
+                decoded = backend.generate([encoded[i] for i in bucket],
+                                           max_length=policy.max_length, num_beams=policy.num_beams,
+                                           prefix_allowed_tokens_fn=prefix_fn(backend, policy), adapter=adapter)
             except Exception as e:
-                recommendation = f"Error generating recommendation: {e}"
-
-            rec_lower = recommendation.lower()
-
-            param_statuses = []
-
-            for param in category_cols:
-                if param in row and pd.notna(row[param]):
-                    val_str = str(row[param])
-                    # Determine param status based on keywords
-                    if "above" in rec_lower or "below" in rec_lower or "high" in rec_lower or "low" in rec_lower:
-                        status = "warning"
-                    else:
-                        status = "normal"
-
-                    values[param] = {
-                        "value": val_str,
-                        "status": status
-                    }
-                    param_statuses.append(status)
-
-            # Determine root status for test based on param statuses
-            if "warning" in param_statuses:
-                status = "warning"
+                decoded = [f"Error generating recommendation: {e}"] * len(bucket)
             else:
-                status = "normal"
+                record_latency(policy, (time.perf_counter() - started) * 1000, len(bucket))
+                for i, text in zip(bucket, decoded):
+                    _, prompt, variant = unique_prompts[i]
+                    recommendation_cache.put(prompt, text, variant)
+
+            for i, text in zip(bucket, decoded):
+                for position in positions[unique_prompts[i][0]]:
+                    results[position] = text
+
+    return results
+
+# Turn a model recommendation into the per-test structure used by the dashboard
+def build_test_result(category, row_values, recommendation):
+    rec_lower = recommendation.lower()
+    values = {}
+    param_statuses = []
+
+    for param, val in row_values:
+        # Determine param status based on keywords
+        if "above" in rec_lower or "below" in rec_lower or "high" in rec_lower or "low" in rec_lower:
+            status = "warning"
+        else:
+            status = "normal"
 
-            results.append({
-                "name": category,
-                "values": values,
-                "recommendation": recommendation,
-                "status": status
-            })
+        values[param] = {
+            "value": str(val),
+            "status": status
+        }
+        param_statuses.append(status)
+
+    # Determine root status for test based on param statuses
+    if "warning" in param_statuses:
+        status = "warning"
+    else:
+        status = "normal"
+
+    return {
+        "name": category,
+        "values": values,
+        "recommendation": recommendation,
+        "status": status
+    }
+
+# Collect every (row, category) prompt of a DataFrame.
+# `flags` holds the "<param>_Flag" int8 code columns from prepare_features for the
+# same rows; when given, each job records how many of its parameters are Low/High.
+def collect_prompts(df, flags=None, plan=None):
+    plan = plan or get_plan(df.columns.tolist(), reference_excel_path)  # cached per header row
+
+    pending = []
+    for idx, row in df.iterrows():
+        for category, category_cols in plan.prompt_layout:
+            row_values = [(param, row[param]) for param in category_cols
+                          if param in row and pd.notna(row[param])]
+            if not row_values:
+                continue
+
+            num_flagged = None
+            if flags is not None:
+                num_flagged = sum(
+                    1 for param, _ in row_values
+                    if f"{param}_Flag" in flags.columns and flags.at[idx, f"{param}_Flag"] in (LOW, HIGH)
+                )
+
+            prompt = render_prompt(row_values)
+            pending.append(PromptJob(idx, category, row_values, prompt, num_flagged))
+
+    return pending
+
+# Answer jobs from the templates where the flags fully explain the result.
+# Returns {job position: recommendation} for the covered jobs.
+def template_recommendations(df, flags, pending, plan=None):
+    category_mapping = (plan or get_plan(df.columns.tolist(), reference_excel_path)).category_mapping
+    answered = {}
+    for category in {job.category for job in pending}:
+        texts, covered = render_category(df, flags, category, category_mapping.get(category, []))
+        jobs = [(i, job) for i, job in enumerate(pending) if job.category == category]
+        hits = 0
+        for i, job in jobs:
+            if covered.at[job.row_index]:
+                answered[i] = texts.at[job.row_index]
+                hits += 1
+        record_usage(category, hits, len(jobs) - hits)
+    return answered
+
+# Work out everything except model generation for a DataFrame.
+# Returns (pending, answered, requests): all jobs, the ones already answered by
+# templates ({job position: recommendation}), and ModelRequest entries for the
+# rest. Callers generate the requests however they like (in-process batch or the
+# backend's micro-batching worker) and hand the results to assemble_recommendations.
+def plan_recommendations(df, flags=None, engine=None, plan=None):
+    engine = engine or RECOMMENDATION_ENGINE
+    # Collect every prompt first so generation can be batched. `plan` is the upload's
+    # header plan when the caller already has it (patient columns never map to a category)
+    plan = plan or get_plan(df.columns.tolist(), reference_excel_path)
+    pending = collect_prompts(df, flags, plan)
+
+    answered = {}
+    if flags is not None and engine == "hybrid":
+        answered = template_recommendations(df, flags, pending, plan)
+
+    requests = []
+    for i, job in enumerate(pending):
+        if i in answered:
+            continue
+        adapter = adapter_for(job.category)
+        policy = choose_policy(job.num_flagged)
+        if adapter not in (None, "default"):
+            policy = cap_beams(policy, CATEGORY_ADAPTER_BEAMS)
+        requests.append(ModelRequest(i, job.prompt, policy, adapter))
+
+    return pending, answered, requests
+
+def assemble_recommendations(pending, answered):
+    results = [
+        build_test_result(job.category, job.row_values, answered[i])
+        for i, job in enumerate(pending)
+    ]
+    return {"tests": results}
+
+# Same as assemble_recommendations, split per patient: {row index: [tests]}
+def assemble_by_row(pending, answered):
+    rows = {}
+    for i, job in enumerate(pending):
+        rows.setdefault(job.row_index, []).append(build_test_result(job.category, job.row_values, answered[i]))
+    return rows
+
+# Build final structured output
+def build_structured_recommendations(df, batched=True, flags=None, engine=None):
+    pending, answered, requests = plan_recommendations(df, flags, engine)
+
+    prompts = [request.prompt for request in requests]
+    policies = [request.policy for request in requests]
+    adapters = [request.adapter for request in requests]
+    if batched:
+        recommendations = generate_recommendations_batch(prompts, policies=policies, adapters=adapters)
+    else:
+        recommendations = []
+        for prompt, policy, adapter in zip(prompts, policies, adapters):
+            try:
+                recommendations.append(generate_recommendation(prompt, policy=policy, adapter=adapter))
+            except Exception as e:
+                recommendations.append(f"Error generating recommendation: {e}")
+    answered.update((request.position, text) for request, text in zip(requests, recommendations))
 
-    return {"tests": results}
\ No newline at end of file
+    return assemble_recommendations(pending, answered)
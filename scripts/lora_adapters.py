@@ -0,0 +1,21 @@
+import os
+import re
+
+
+# Per-category adapter lookup without torch, so planning which adapter a prompt
+# uses never loads the model stack
+def adapter_name(category):
+    # "Lipid Profile" -> "lipid_profile"; used as both directory and PEFT adapter name
+    return re.sub(r"[^a-z0-9]+", "_", category.lower()).strip("_")
+
+
+def available_adapters(adapters_dir):
+    # {adapter name: path} for every trained adapter found under adapters_dir
+    if not adapters_dir or not os.path.isdir(adapters_dir):
+        return {}
+    adapters = {}
+    for name in sorted(os.listdir(adapters_dir)):
+        path = os.path.join(adapters_dir, name)
+        if os.path.isfile(os.path.join(path, "adapter_config.json")):
+            adapters[name] = path
+    return adapters
@@ -1,8 +1,14 @@
+import os
+import re
+from functools import lru_cache
+
 # --- Category Definitions ---
 health_categories = {
     "CBC": {
         "Hemoglobin", "Platelets", "White Blood Cells", "Red Blood Cells", "Hematocrit",
-        "Mean Corpuscular Volume", "Mean Corpuscular Hemoglobin", "Mean Corpuscular Hemoglobin Concentration"
+        "Mean Corpuscular Volume", "Mean Corpuscular Hemoglobin", "Mean Corpuscular Hemoglobin Concentration",
+        "Neutrophils", "Lymphocytes", "Monocytes", "Eosinophils", "Basophils",
+        "Red Cell Distribution Width", "Immature Granulocytes"
     },
     "Lipid Profile": {
         "Total Cholesterol", "LDL Cholesterol", "HDL Cholesterol", "Triglycerides"
@@ -54,6 +60,22 @@ column_aliases = {
     "mchc": "Mean Corpuscular Hemoglobin Concentration",
     "mean corpuscular hemoglobin concentration": "Mean Corpuscular Hemoglobin Concentration",
 
+    "neutrophils": "Neutrophils",
+    "lymphs": "Lymphocytes",
+    "lymphocytes": "Lymphocytes",
+    "monocytes": "Monocytes",
+    "eos": "Eosinophils",
+    "eosinophils": "Eosinophils",
+    "baso": "Basophils",
+    "basos": "Basophils",
+    "basophils": "Basophils",
+
+    "rdw": "Red Cell Distribution Width",
+    "red cell distribution width": "Red Cell Distribution Width",
+
+    "immature granulocytes": "Immature Granulocytes",
+    "immature grans": "Immature Granulocytes",
+
     "cholesterol": "Total Cholesterol",
     "total cholesterol": "Total Cholesterol",
 
@@ -119,6 +141,115 @@ column_aliases = {
 }
 
 
+# --- Lookup Indexes ---
+# Headers that are not an exact alias are matched by shared tokens, then by
+# character-trigram similarity (Dice coefficient) against the aliases
+FUZZY_THRESHOLD = float(os.environ.get("MAP_FUZZY_THRESHOLD", 0.6))
+HEADER_CACHE_SIZE = 4096
+# Header tokens that qualify a parameter without changing it ("WBC Count", "Lymphs (Absolute)").
+# Any other token the matched alias does not cover ("Non-HDL", "Urine Creatinine",
+# "Hemoglobin A1c", "BUN/Creatinine Ratio") names a different test, so the match is rejected.
+NEUTRAL_TOKENS = {"absolute", "abs", "count", "total", "level", "levels", "value", "result", "percent", "pct"}
+
+
+def normalize_header(header):
+    # "HCT (Hematocrit)" -> "hct hematocrit"; "Monocytes(Absolute)" -> "monocytes absolute"
+    return " ".join(re.sub(r"[^0-9a-z]+", " ", str(header).lower()).split())
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# canonical -> category
+canonical_categories = {
+    canonical: category
+    for category, features in health_categories.items()
+    for canonical in features
+}
+
+# normalized alias (and canonical name) -> canonical
+_normalized_aliases = {normalize_header(alias): canonical for alias, canonical in column_aliases.items()}
+for _canonical in canonical_categories:
+    _normalized_aliases.setdefault(normalize_header(_canonical), _canonical)
+
+# canonical -> tokens of all its aliases ("HCT (Hematocrit)" spells one parameter twice)
+_canonical_tokens = {}
+for _alias, _canonical in _normalized_aliases.items():
+    _canonical_tokens.setdefault(_canonical, set()).update(_alias.split())
+
+# token / trigram -> normalized aliases containing it
+_token_index = {}
+_gram_index = {}
+_alias_grams = {}
+for _alias in _normalized_aliases:
+    for _token in _alias.split():
+        _token_index.setdefault(_token, set()).add(_alias)
+    _alias_grams[_alias] = trigrams(_alias)
+    for _gram in _alias_grams[_alias]:
+        _gram_index.setdefault(_gram, set()).add(_alias)
+
+
+def _covers(alias, tokens):
+    # True when every header token is part of the alias's parameter or a neutral qualifier
+    return tokens <= _canonical_tokens[_normalized_aliases[alias]] | NEUTRAL_TOKENS
+
+
+def _token_match(normalized):
+    # Longest alias whose tokens all appear in the header, e.g. "Total WBC count" -> "wbc",
+    # as long as the header has no tokens of its own
+    tokens = set(normalized.split())
+    candidates = set().union(*(_token_index.get(token, ()) for token in tokens))
+    matches = [alias for alias in candidates if set(alias.split()) <= tokens and _covers(alias, tokens)]
+    return max(matches, key=lambda alias: (len(alias.split()), len(alias))) if matches else None
+
+
+def _dice(a, b):
+    a, b = trigrams(a), trigrams(b)
+    return 2 * len(a & b) / (len(a) + len(b))
+
+
+def _aligned(normalized, alias):
+    # Same number of tokens and each one a near spelling of its counterpart, so a typo
+    # matches ("Hemoglobn") but an extra or different word does not ("VLDL Cholesterol")
+    tokens, alias_tokens = normalized.split(), alias.split()
+    return len(tokens) == len(alias_tokens) and all(
+        _dice(a, b) >= FUZZY_THRESHOLD for a, b in zip(tokens, alias_tokens))
+
+
+def _gram_match(normalized):
+    # Aligned alias with the highest trigram Dice score, looking only at aliases sharing a trigram
+    grams = trigrams(normalized)
+    shared = {}
+    for gram in grams:
+        for alias in _gram_index.get(gram, ()):
+            shared[alias] = shared.get(alias, 0) + 1
+    scored = sorted(((2 * count / (len(grams) + len(_alias_grams[alias])), alias) for alias, count in shared.items()),
+                    reverse=True)
+    for score, alias in scored:
+        if score < FUZZY_THRESHOLD:
+            break
+        if _aligned(normalized, alias):
+            return alias
+    return None
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def resolve_header(header):
+    # (canonical, category) for one column header, or None; memoized per header string
+    col_lower = str(header).strip().lower()
+    canonical = column_aliases.get(col_lower)
+    if canonical is None:
+        normalized = normalize_header(header)
+        alias = normalized if normalized in _normalized_aliases else None
+        alias = alias or _token_match(normalized) or _gram_match(normalized)
+        canonical = _normalized_aliases.get(alias) if alias else None
+    if canonical is None or canonical not in canonical_categories:
+        return None
+    return canonical, canonical_categories[canonical]
+
+
 # --- Mapper Function ---
 def map_columns_to_categories(column_names):
     result = {category: [] for category in health_categories}
@@ -126,18 +257,9 @@ def map_columns_to_categories(column_names):
 
     for raw_col in column_names:
         col = raw_col.strip()
-        col_lower = col.lower()
-
-        canonical = column_aliases.get(col_lower)
-        if canonical:
-            matched = False
-            for category, features in health_categories.items():
-                if canonical in features:
-                    result[category].append(col)
-                    matched = True
-                    break
-            if not matched:
-                result["Uncategorized"].append(col)
+        resolved = resolve_header(col)
+        if resolved:
+            result[resolved[1]].append(col)
         else:
             result["Uncategorized"].append(col)
 
@@ -1,9 +1,7 @@
-import pandas as pd
-import random
 import datasets
 import evaluate
 from transformers import (
-    T5Tokenizer,
+    T5TokenizerFast,
     T5ForConditionalGeneration,
     Trainer,
     TrainingArguments,
@@ -15,118 +13,45 @@ from peft import get_peft_model, LoraConfig, TaskType, PeftModel
 import os
 import sys
 import contextlib
+from reference_index import load_reference_index
+from synthetic_data import generate_sheet, load_synthetic_dataset, write_synthetic_shards
+from training_speed import (DYNAMIC_PADDING, PAD_MULTIPLE, CountingCollator, TokensPerSecondCallback,
+                            length_caps)
 
 # --- Step 1: Load ranges from Excel ---
 def load_ranges_from_excel(file_path):
-    xls = pd.ExcelFile(file_path)
-    all_ranges = {}
-    for sheet in xls.sheet_names:
-        df = pd.read_excel(xls, sheet_name=sheet)
-        df.columns = [col.strip() for col in df.columns]
-        if 'Parameter' in df.columns:
-            param_col = 'Parameter'
-        elif 'Value' in df.columns:
-            param_col = 'Value'
-        else:
-            print(f"Sheet '{sheet}' missing 'Parameter' or 'Value' column. Skipping.")
-            continue
-        if 'Unit' not in df.columns:
-            df['Unit'] = ""
-        param_dict = {}
-        for _, row in df.iterrows():
-            param = row[param_col]
-            low = row.get('Low', None)
-            high = row.get('High', None)
-            unit = row.get('Unit', "")
-            if pd.isna(param):
-                continue
-            param_dict[param] = (low, high, unit if pd.notna(unit) else "")
-        all_ranges[sheet] = param_dict
-    return all_ranges
+    # {sheet: {param: (low, high, unit)}} from the compiled, cached reference index
+    return load_reference_index(file_path).sheets()
 
 # --- Step 2: Generate synthetic examples ---
-def generate_synthetic_examples(param_dict, sheet_name, num_examples=50):
-    params = list(param_dict.keys())
-    examples = []
-
-    for example_num in range(num_examples):
-        print(f"\n--- Generating Example {example_num + 1} ---")
-        input_parts = []
-        abnormalities = []
-
-        for param in params:
-            low, high, unit = param_dict[param]
-            print(f"Param: {param} | Low: {low} | High: {high} | Unit: {unit}")
-
-            # Case 1: Low/High range is missing
-            if pd.isna(low) or pd.isna(high):
-                val = round(random.uniform(1, 100), 2)
-                status = 'normal'
-                print(f"  → No range. Generated {val} (assumed normal)")
-            else:
-                # Decide if we generate normal (70%) or abnormal (30%) value
-                if random.random() < 0.7:
-                    # Generate normal value
-                    val = round(random.uniform(low, high), 2)
-                else:
-                    # Generate abnormal value
-                    if random.random() < 0.5:
-                        val = round(low * 0.8, 2)  # below normal
-                    else:
-                        val = round(high * 1.2, 2)  # above normal
-
-                # Determine actual status
-                if val < low:
-                    status = 'low'
-                elif val > high:
-                    status = 'high'
-                else:
-                    status = 'normal'
-
-                print(f"  → Generated value: {val} | Status: {status} | Expected Range: ({low} - {high})")
-
-            input_parts.append(f"{param}: {val} {unit}".strip())
-
-            if status != 'normal':
-                abnormalities.append((param, status))
-
-        # Construct suggestion
-        if not abnormalities:
-            suggestion = f"All {sheet_name} parameters are within normal ranges. Maintain a healthy lifestyle."
-        else:
-            parts = []
-            for p, st in abnormalities:
-                if st == 'low':
-                    parts.append(f"{p} is below normal, consider consulting your healthcare provider.")
-                else:
-                    parts.append(f"{p} is above normal, lifestyle changes or medical advice recommended.")
-            suggestion = " ".join(parts)
-
-        input_text = "; ".join(input_parts)
-        input_text = f"analyze: {input_text}"  # Task prefix for models like T5
-
-        print(f"Final Input: {input_text}")
-        print(f"Suggestion: {suggestion}")
-
-        examples.append((input_text, suggestion))
-
-    return examples
-# --- Step 3: Prepare dataset ---
-def prepare_dataset(file_path, examples_per_sheet=50):
-    all_ranges = load_ranges_from_excel(file_path)
-    dataset = {"input_text": [], "target_text": []}
-
-    for sheet, param_dict in all_ranges.items():
-        examples = generate_synthetic_examples(param_dict, sheet, examples_per_sheet)
-        for inp, tgt in examples:
-            dataset["input_text"].append(inp)
-            dataset["target_text"].append(tgt)
+def generate_synthetic_examples(param_dict, sheet_name, num_examples=50, seed=None):
+    # Values for every parameter are drawn at once; see synthetic_data for the distribution
+    inputs, targets = generate_sheet(param_dict, sheet_name, num_examples, np.random.default_rng(seed))
+    return list(zip(inputs.tolist(), targets.tolist()))
 
-    return dataset
+# --- Step 3: Prepare dataset ---
+# Examples are written as Arrow shards under output_dir by SYNTHETIC_WORKERS processes
+# and returned as a memory-mapped datasets.Dataset
+def prepare_dataset(file_path, examples_per_sheet=50, output_dir="./synthetic_data", seed=42):
+    shard_paths = write_synthetic_shards(file_path, output_dir, examples_per_sheet, seed=seed)
+    return load_synthetic_dataset(shard_paths)
 
 # --- Step 4: Preprocess for T5 ---
-def preprocess_for_t5(tokenizer, dataset, max_len=512):
+# With dynamic padding examples are only truncated, to caps taken from the dataset's
+# token lengths; DataCollatorForSeq2Seq pads each batch to its own longest example
+def preprocess_for_t5(tokenizer, dataset, max_len=512, dynamic_padding=DYNAMIC_PADDING):
+    ds = dataset if isinstance(dataset, datasets.Dataset) else datasets.Dataset.from_dict(dataset)
+    if dynamic_padding:
+        source_len, target_len = length_caps(tokenizer, ds, max_len)
+    else:
+        source_len = target_len = max_len
+
     def preprocess_function(examples):
+        if dynamic_padding:
+            inputs = tokenizer(examples["input_text"], truncation=True, max_length=source_len)
+            inputs["labels"] = tokenizer(examples["target_text"], truncation=True, max_length=target_len)["input_ids"]
+            return inputs
+
         inputs = tokenizer(examples["input_text"], truncation=True, padding="max_length", max_length=max_len)
         targets = tokenizer(examples["target_text"], truncation=True, padding="max_length", max_length=max_len)
 
@@ -139,8 +64,7 @@ def preprocess_for_t5(tokenizer, dataset, max_len=512):
         inputs["labels"] = labels
         return inputs
 
-    ds = datasets.Dataset.from_dict(dataset)
-    tokenized_ds = ds.map(preprocess_function, batched=True)
+    tokenized_ds = ds.map(preprocess_function, batched=True, remove_columns=ds.column_names)
     return tokenized_ds
 
 # --- Step 5: Split dataset ---
@@ -151,7 +75,7 @@ def train_val_split(tokenized_dataset, val_ratio=0.1):
 # --- Step 6: Fine-tune T5 with LoRA PEFT ---
 def fine_tune_peft(train_ds, val_ds, output_dir="./recommendation_model_test_new", epochs=8):
     model_name = "./t5-small"
-    tokenizer = T5Tokenizer.from_pretrained(model_name)
+    tokenizer = T5TokenizerFast.from_pretrained(model_name)
     base_model = T5ForConditionalGeneration.from_pretrained(model_name)
 
     # LoRA config
@@ -168,7 +92,8 @@ def fine_tune_peft(train_ds, val_ds, output_dir="./recommendation_model_test_new
     model.print_trainable_parameters()
 
     # Data collator for seq2seq
-    data_collator = DataCollatorForSeq2Seq(tokenizer, model=model)
+    data_collator = CountingCollator(DataCollatorForSeq2Seq(
+        tokenizer, model=model, pad_to_multiple_of=PAD_MULTIPLE if DYNAMIC_PADDING else None))
 
     training_args = TrainingArguments(
         output_dir=output_dir,
@@ -179,6 +104,7 @@ def fine_tune_peft(train_ds, val_ds, output_dir="./recommendation_model_test_new
         logging_steps=5,
         save_steps=9999999,   # Don't save
         learning_rate=5e-4,
+        group_by_length=DYNAMIC_PADDING,
         seed=42
     )
 
@@ -215,7 +141,8 @@ def fine_tune_peft(train_ds, val_ds, output_dir="./recommendation_model_test_new
         eval_dataset=val_ds,
         tokenizer=tokenizer,
         data_collator=data_collator,
-        compute_metrics=compute_metrics
+        compute_metrics=compute_metrics,
+        callbacks=[TokensPerSecondCallback(data_collator)]
     )
 
     trainer.train()
@@ -253,7 +180,7 @@ if __name__ == "__main__":
         dataset_dict = prepare_dataset(excel_file, examples_per_sheet=50)
 
         # pre-process tokenized model
-        tokenized_dataset = preprocess_for_t5(T5Tokenizer.from_pretrained("./t5-small"), dataset_dict)
+        tokenized_dataset = preprocess_for_t5(T5TokenizerFast.from_pretrained("./t5-small"), dataset_dict)
 
         # split train and val dataset
         train_dataset, val_dataset = train_val_split(tokenized_dataset, val_ratio=0.1)
@@ -0,0 +1,219 @@
+import contextlib
+import gc
+import json
+import os
+import threading
+from collections import namedtuple
+
+import torch
+from transformers import T5TokenizerFast, T5ForConditionalGeneration
+from peft import PeftModel
+from recommendation_cache import adapter_version
+from lora_adapters import available_adapters
+from prompt_encoder import release_encoder
+
+base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
+DEFAULT_BASE_MODEL = os.path.join(base_dir, "t5-small")
+DEFAULT_ADAPTER = os.path.join(base_dir, "recommendation_model")
+# One LoRA adapter per health category, each in a sub-directory named by adapter_name()
+DEFAULT_ADAPTERS_DIR = os.path.join(base_dir, "recommendation_adapters")
+
+# Prefer a merged (adapter folded into base weights) checkpoint when one has been exported
+USE_MERGED = os.environ.get("RECOMMENDATION_USE_MERGED", "1") != "0"
+MERGED_MARKER = "merged_from.json"
+
+# "float32" (default), "float16", "bfloat16", or "int8" for dynamically quantized CPU inference
+INFERENCE_DTYPE = os.environ.get("RECOMMENDATION_DTYPE", "float32")
+
+LoadedModel = namedtuple("LoadedModel", ["tokenizer", "model", "device"])
+
+# One entry per (base model, adapter, device, dtype[, adapters dir]); shared by every module in the process
+_models = {}
+_lock = threading.Lock()
+# set_adapter changes state shared by every user of the multi-adapter model, so an
+# adapter switch and the generate call that depends on it run under this lock
+adapter_lock = threading.Lock()
+
+
+def default_device():
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _key(base_model_path, adapter_path, device, dtype):
+    return (
+        os.path.abspath(base_model_path),
+        os.path.abspath(adapter_path) if adapter_path else None,
+        str(device or default_device()),
+        dtype,
+    )
+
+
+def merged_checkpoint_path(adapter_path):
+    return adapter_path.rstrip("/\\") + "_merged"
+
+
+def find_merged_checkpoint(adapter_path):
+    # The merged checkpoint is only used while it still matches the adapter it was exported from
+    if not USE_MERGED or not adapter_path:
+        return None
+    path = merged_checkpoint_path(adapter_path)
+    marker = os.path.join(path, MERGED_MARKER)
+    if not os.path.isfile(marker):
+        return None
+    with open(marker) as f:
+        info = json.load(f)
+    if info.get("adapter_version") != adapter_version(adapter_path):
+        print(f"Merged checkpoint at {path} is older than {adapter_path}; using the adapter instead.")
+        return None
+    return path
+
+
+def quantize_int8(model):
+    # Dynamic int8 quantization of every nn.Linear; returns None when the build has no quantized engine
+    try:
+        if torch.backends.quantized.engine == "none":
+            raise RuntimeError("no quantized engine available in this torch build")
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    except Exception as e:
+        print(f"int8 quantization unavailable ({e}); falling back to float32.")
+        return None
+
+
+def weights_variant(adapter_path=DEFAULT_ADAPTER, device=None, dtype=None, multi_adapter=False):
+    # "<dtype>-merged" or "<dtype>-lora": the weights _load/_load_multi_adapter end up
+    # generating with, so cached outputs of one never answer for another
+    dtype = dtype or INFERENCE_DTYPE
+    if dtype == "int8" and (multi_adapter or str(device or default_device()) != "cpu"
+                            or torch.backends.quantized.engine == "none"):
+        dtype = "float32"
+    merged = not multi_adapter and (dtype == "int8" or find_merged_checkpoint(adapter_path) is not None)
+    return f"{dtype}-{'merged' if merged else 'lora'}"
+
+
+def _load(base_model_path, adapter_path, device, dtype):
+    # int8 models are quantized from the float32 weights after loading
+    torch_dtype = torch.float32 if dtype == "int8" else getattr(torch, dtype)
+    merged_path = find_merged_checkpoint(adapter_path)
+    if merged_path:
+        print(f"Loading merged model: {merged_path} device={device} dtype={dtype}")
+        tokenizer = T5TokenizerFast.from_pretrained(merged_path)
+        model = T5ForConditionalGeneration.from_pretrained(merged_path, torch_dtype=torch_dtype)
+    else:
+        print(f"Loading model: base={base_model_path} adapter={adapter_path} device={device} dtype={dtype}")
+        tokenizer = T5TokenizerFast.from_pretrained(adapter_path or base_model_path)
+        model = T5ForConditionalGeneration.from_pretrained(base_model_path, torch_dtype=torch_dtype)
+        if adapter_path:
+            model = PeftModel.from_pretrained(model, adapter_path)
+    model.eval()
+
+    if dtype == "int8":
+        # Quantized Linear kernels only exist on CPU
+        if device != "cpu":
+            print(f"int8 inference is CPU-only; keeping float32 on {device}.")
+        else:
+            # Quantize the merged model only: quantizing the LoRA Linears breaks peft's forward
+            if isinstance(model, PeftModel):
+                model = model.merge_and_unload()
+            model = quantize_int8(model) or model
+
+    model.to(device)
+    return LoadedModel(tokenizer, model, torch.device(device))
+
+
+def _load_multi_adapter(base_model_path, adapter_path, adapters_dir, device, dtype):
+    # The shared adapter is loaded as "default"; per-category adapters sit next to it on the same base
+    torch_dtype = torch.float32 if dtype == "int8" else getattr(torch, dtype)
+    adapters = available_adapters(adapters_dir)
+    print(f"Loading model: base={base_model_path} adapters={['default'] + list(adapters)} device={device} dtype={dtype}")
+    tokenizer = T5TokenizerFast.from_pretrained(adapter_path)
+    model = T5ForConditionalGeneration.from_pretrained(base_model_path, torch_dtype=torch_dtype)
+    model = PeftModel.from_pretrained(model, adapter_path, adapter_name="default")
+    for name, path in adapters.items():
+        model.load_adapter(path, adapter_name=name)
+    model.set_adapter("default")
+    model.eval()
+
+    # Adapters stay switchable, so they cannot be merged; int8 needs a merged model
+    if dtype == "int8":
+        print("int8 inference needs a merged model; keeping float32 for the multi-adapter model.")
+
+    model.to(device)
+    return LoadedModel(tokenizer, model, torch.device(device))
+
+
+@contextlib.contextmanager
+def active_adapter(model, name="default"):
+    # `name` active on a multi-adapter model for the duration of the block; a model
+    # with a single (or merged) adapter needs neither the switch nor the lock
+    if not isinstance(model, PeftModel) or len(model.peft_config) < 2:
+        yield model
+        return
+    with adapter_lock:
+        model.set_adapter(name)
+        yield model
+
+
+def get_multi_adapter_model(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER,
+                            adapters_dir=DEFAULT_ADAPTERS_DIR, device=None, dtype=None):
+    # Same caching rules as get_model. Every category adapter sits on one PeftModel over
+    # one copy of the base weights; switch adapters inside active_adapter(model, name)
+    dtype = dtype or INFERENCE_DTYPE
+    key = _key(base_model_path, adapter_path, device, dtype) + (os.path.abspath(adapters_dir),)
+    with _lock:
+        loaded = _models.get(key)
+        if loaded is None:
+            loaded = _load_multi_adapter(key[0], key[1], key[4], key[2], dtype)
+            _models[key] = loaded
+    return loaded
+
+
+def get_model(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, device=None, dtype=None):
+    # Loads lazily on first use; later calls with the same combination get the same objects
+    dtype = dtype or INFERENCE_DTYPE
+    key = _key(base_model_path, adapter_path, device, dtype)
+    with _lock:
+        loaded = _models.get(key)
+        if loaded is None:
+            loaded = _load(key[0], key[1], key[2], dtype)
+            _models[key] = loaded
+    return loaded
+
+
+def release(base_model_path=None, adapter_path=None, device=None, dtype=None):
+    # Drop matching entries (all of them when called without arguments) and free their memory
+    released = []
+    with _lock:
+        for key in list(_models):
+            if base_model_path is not None and key[0] != os.path.abspath(base_model_path):
+                continue
+            if adapter_path is not None and key[1] != os.path.abspath(adapter_path):
+                continue
+            if device is not None and key[2] != str(device):
+                continue
+            if dtype is not None and key[3] != dtype:
+                continue
+            released.append(_models.pop(key))
+
+    # The prompt encoder's fragment cache holds the tokenizer; drop it with the model
+    for loaded in released:
+        release_encoder(loaded.tokenizer)
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def reload(base_model_path=DEFAULT_BASE_MODEL, adapter_path=DEFAULT_ADAPTER, device=None, dtype=None):
+    # Re-read a checkpoint from disk, e.g. after the adapter has been retrained
+    dtype = dtype or INFERENCE_DTYPE
+    key = _key(base_model_path, adapter_path, device, dtype)
+    with _lock:
+        loaded = _models.pop(key, None)
+    if loaded is not None:
+        release_encoder(loaded.tokenizer)
+    gc.collect()
+    return get_model(base_model_path, adapter_path, device, dtype)
+
+
+def loaded_models():
+    with _lock:
+        return list(_models)
@@ -0,0 +1,181 @@
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from map_categories import column_aliases
+
+# Reports with at least PDF_PARALLEL_MIN_PAGES pages are split into page ranges extracted
+# by a shared pool of PDF_WORKERS spawned processes; single-page ones are read in this process
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 2))
+# Parsed reports kept in memory, keyed by the SHA-256 of the file
+PDF_CACHE_SIZE = int(os.environ.get("PDF_CACHE_SIZE", 64))
+
+NUMBER = r"-?\d+(?:\.\d+)?"
+# "Hemoglobin (Hb) 12.5 Low 13.0 - 17.0 g/dL": parameter, value, then flag/range/unit
+RESULT_LINE = re.compile(rf"^(?P<name>[A-Za-z][A-Za-z0-9 ,()%/.\-]*?)\s+(?P<value>{NUMBER})(?:\s+(?P<rest>.*))?$")
+# "150.00 Normal < 200.00 mg/dL": value on its own line, parameter on the line above
+VALUE_LINE = re.compile(rf"^(?P<value>{NUMBER})(?:\s+(?P<rest>.*))?$")
+AGE_LINE = re.compile(r"\bAge\s*:\s*(?P<age>\d+)")
+UNIT = re.compile(r"^[A-Za-z%/µ]+[A-Za-z0-9%/.^µ]*$")
+FILLER_WORDS = {"total", "count", "level", "serum"}
+
+# Worker side: (sha256, open pdfplumber document) of the report this process last read
+_document = None
+_pool = None
+_pool_lock = threading.Lock()
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def canonical_parameter(name):
+    # Lab-report parameter name -> canonical name via column_aliases, or None
+    name = " ".join(name.lower().split())
+    candidates = [name]
+    inner = re.findall(r"\(([^)]*)\)", name)
+    outer = re.sub(r"\([^)]*\)", " ", name)
+    candidates += [i.strip() for i in inner] + [" ".join(outer.split())]
+    candidates += [" ".join(w for w in c.split() if w not in FILLER_WORDS) for c in list(candidates)]
+    for candidate in candidates:
+        if candidate in column_aliases:
+            return column_aliases[candidate]
+    return None
+
+
+def parse_unit(rest):
+    tokens = (rest or "").split()
+    if tokens and UNIT.match(tokens[-1]) and tokens[-1].lower() not in ("low", "high", "normal", "borderline"):
+        return tokens[-1]
+    return ""
+
+
+def parse_lines(lines):
+    # {canonical parameter: (value, unit)} plus the patient's age when printed
+    results = {}
+    age = None
+    previous = ""
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if age is None:
+            match = AGE_LINE.search(line)
+            if match:
+                age = int(match.group("age"))
+
+        match = RESULT_LINE.match(line)
+        name = match.group("name") if match else None
+        if not match or canonical_parameter(name) is None:
+            value_match = VALUE_LINE.match(line)
+            if value_match and canonical_parameter(previous):
+                match, name = value_match, previous
+        if match:
+            param = canonical_parameter(name)
+            if param and param not in results:
+                results[param] = (float(match.group("value")), parse_unit(match.group("rest")))
+        previous = line
+    return results, age
+
+
+def page_ranges(count, workers):
+    # Contiguous [start, stop) page ranges, one per worker (fewer when pages run out)
+    if count <= 0:
+        return []
+    step = math.ceil(count / max(1, min(workers, count)))
+    return [(start, min(start + step, count)) for start in range(0, count, step)]
+
+
+def _range_text(task):
+    # Worker side: text of pages [start, stop) of report `key`. The bytes travel once per
+    # range, and a worker handed several ranges of the same report parses it once.
+    global _document
+    key, data, start, stop = task
+    if _document is None or _document[0] != key:
+        import pdfplumber
+        if _document is not None:
+            _document[1].close()
+        _document = (key, pdfplumber.open(io.BytesIO(data)))
+    pdf = _document[1]
+    return [pdf.pages[i].extract_text() or "" for i in range(start, stop)]
+
+
+def get_pool():
+    # One pool for the whole process, started on first use. It uses spawn, not fork:
+    # the server process holds threads and torch state a forked child must not inherit.
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_pages(data, key=None):
+    # Text of every page, in order
+    import pdfplumber
+    with pdfplumber.open(io.BytesIO(data)) as pdf:
+        count = len(pdf.pages)
+        if count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+            return [page.extract_text() or "" for page in pdf.pages]
+
+    key = key or hashlib.sha256(data).hexdigest()
+    tasks = [(key, data, start, stop) for start, stop in page_ranges(count, PDF_WORKERS)]
+    try:
+        return [text for texts in get_pool().map(_range_text, tasks) for text in texts]
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); the next report starts a fresh pool
+        shutdown_pool()
+        raise
+
+
+def report_frame(results, age=None):
+    # Same shape as a CSV upload: one row per report, one column per parameter
+    row = {param: value for param, (value, _) in results.items()}
+    if age is not None:
+        row = {"Age": age, **row}
+    df = pd.DataFrame([row])
+    df.attrs["units"] = {param: unit for param, (_, unit) in results.items()}
+    return df
+
+
+def read_pdf_report(source):
+    if hasattr(source, "read"):
+        source.seek(0)
+        data = source.read()
+    else:
+        with open(source, "rb") as f:
+            data = f.read()
+
+    key = hashlib.sha256(data).hexdigest()
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key].copy()
+
+    lines = [line for text in extract_pages(data, key) for line in text.splitlines()]
+    results, age = parse_lines(lines)
+    if not results:
+        raise ValueError("No lab results could be read from the PDF.")
+    df = report_frame(results, age)
+
+    with _cache_lock:
+        _cache[key] = df
+        while len(_cache) > PDF_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return df.copy()
@@ -1,28 +1,96 @@
+import contextlib
+import os
+import tracemalloc
+
+import numpy as np
 import pandas as pd
-from integrate_model import add_ai_recommendations
+
+from flag_codes import encode_flags
 from integrate_model_new import build_structured_recommendations
 
-def prepare_data(df):
-    # Map flag strings to numbers
-    flag_map = {"Low": -1, "High": 1, "": 0, "Normal": 0, "Invalid": None}
+# Per-column sums and counts accumulated chunk by chunk, so mean imputation
+# can use whole-file means without holding the whole file in memory
+class RunningMeans:
+    def __init__(self):
+        self.sums = pd.Series(dtype=float)
+        self.counts = pd.Series(dtype=float)
+        self.rows = 0
+
+    def update(self, df):
+        numeric = df.apply(pd.to_numeric, errors='coerce')
+        self.sums = self.sums.add(numeric.sum(), fill_value=0)
+        self.counts = self.counts.add(numeric.count(), fill_value=0)
+        self.rows += len(df)
+
+    def means(self):
+        return self.sums / self.counts.where(self.counts > 0)
+
+# Print tracemalloc peak memory for each prepare_features stage (slows it down)
+PROFILE_MEMORY = os.environ.get("PREPROCESS_PROFILE_MEMORY", "0") == "1"
+
+_memory_report = {}
 
-    for col in df.columns:
-        if col.endswith("_Flag"):
-            df[col + "_Num"] = df[col].map(flag_map)
+def memory_report():
+    # Peak bytes per stage of the last profiled prepare_features call
+    return dict(_memory_report)
 
-    # Count abnormalities
-    flag_num_cols = [col for col in df.columns if col.endswith("_Flag_Num")]
+@contextlib.contextmanager
+def memory_stage(name):
+    if not PROFILE_MEMORY:
+        yield
+        return
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    yield
+    _, peak = tracemalloc.get_traced_memory()
+    _memory_report[name] = peak - start
+    print(f"prepare_features {name}: peak {(peak - start) / 1024:.1f} KiB")
+
+# Numeric features (flags removed, coerced, mean-imputed) plus the flags as int8 codes
+# (see flag_codes), in one columnar pass: flag columns are encoded, every other column
+# is coerced straight into one float64 array that is imputed in place and wrapped
+# without copying. `means` overrides the per-DataFrame means, e.g. whole-file means
+# when df is one chunk.
+def prepare_features(df, means=None):
     flag_cols = [col for col in df.columns if col.endswith("_Flag")]
-    df_features = df.drop(columns=flag_num_cols)
-    df_features = df_features.drop(columns=flag_cols)
-    df_features = df_features.apply(pd.to_numeric, errors='coerce')
+    feature_cols = [col for col in df.columns if not col.endswith("_Flag")]
+
+    with memory_stage("flags"):
+        flags = pd.DataFrame({col: encode_flags(df[col]) for col in flag_cols}, index=df.index)
+
+    with memory_stage("coerce"):
+        values = np.empty((len(df), len(feature_cols)), dtype=np.float64, order="F")
+        for j, col in enumerate(feature_cols):
+            column = df[col]
+            if not pd.api.types.is_numeric_dtype(column.dtype):
+                column = pd.to_numeric(column, errors='coerce')
+            values[:, j] = column.to_numpy(dtype=np.float64, na_value=np.nan)
 
     # Fill missing numeric values with mean
-    df_features.fillna(df_features.mean(), inplace=True)
+    with memory_stage("impute"):
+        if means is None:
+            fill = np.full(len(feature_cols), np.nan)
+            counts = (~np.isnan(values)).sum(axis=0)
+            np.divide(np.nansum(values, axis=0), counts, out=fill, where=counts > 0)
+        else:
+            fill = pd.Series(means, dtype=float).reindex(feature_cols).to_numpy()
+        missing = np.isnan(values)
+        if missing.any():
+            values[missing] = np.broadcast_to(fill, values.shape)[missing]
+
+    with memory_stage("assemble"):
+        df_features = pd.DataFrame(values, index=df.index, columns=feature_cols, copy=False)
+    return df_features, flags
+
+def prepare_data(df, means=None):
+    df_features, flags = prepare_features(df, means)
     X = df_features
     feature_cols = df_features.columns.tolist()
     # ai_df = add_ai_recommendations(df_features, feature_cols)
-    ai_df = build_structured_recommendations(df_features)
+    # Flags drive the per-prompt decoding policy (greedy for all-normal categories)
+    ai_df = build_structured_recommendations(df_features, flags=flags)
     
     # ai_df.to_csv("output.csv", index=False)
     return ai_df
\ No newline at end of file
@@ -0,0 +1,190 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from execution_plan import PROMPT_PREFIX, PROMPT_SEPARATOR
+
+# Value words ("12.25;") kept tokenized; parameter fragments are few and always kept
+VALUE_CACHE_SIZE = 65536
+SELF_CHECK_PROMPT = PROMPT_PREFIX + "White Blood Cells: 7695.25; HCT (Hematocrit): 43.35; Glucose: 99"
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+class PromptEncoder:
+    """Token ids for "analyze: <param>: <val>; ..." prompts without re-tokenizing fixed text.
+
+    T5's tokenizer splits on whitespace before applying SentencePiece, so a
+    prompt's ids are the concatenation of the ids of its whitespace-delimited
+    pieces. Fixed fragments ("analyze: White Blood Cells:", "HCT (Hematocrit):")
+    are tokenized once and cached per category layout; only value words are
+    tokenized per batch, in one fast-tokenizer call. If the tokenizer does not
+    have that property (checked once at start-up), whole prompts are tokenized.
+    """
+
+    def __init__(self, tokenizer, max_length=None):
+        self.tokenizer = tokenizer
+        self.max_length = max_length or min(tokenizer.model_max_length, 512)
+        self.eos_id = tokenizer.eos_token_id
+        self.pad_id = tokenizer.pad_token_id
+        self._fragments = {}
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "prompts": 0, "total_ms": 0.0, "last_ms": 0.0}
+        self.exact = self._self_check()
+        if not self.exact:
+            print("Prompt fragments do not tokenize independently; encoding whole prompts.")
+
+    def _tokenize(self, texts):
+        return self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+
+    def _tokenize_whole(self, prompts):
+        # Whole prompts, truncated at the same max_length the fragment path uses
+        return self.tokenizer(list(prompts), truncation=True, max_length=self.max_length)["input_ids"]
+
+    def _self_check(self):
+        try:
+            expected = self._tokenize_whole([SELF_CHECK_PROMPT])[0]
+            return self._encode_uncached([SELF_CHECK_PROMPT])[0] == expected
+        except Exception as e:
+            print(f"Prompt encoder self-check failed: {e}")
+            return False
+
+    @staticmethod
+    def split(prompt):
+        # (fixed fragments, value words): fixed[i] precedes values[i]; None when the
+        # prompt is not in the "analyze: <param>: <val>; ..." layout
+        if not prompt.startswith(PROMPT_PREFIX):
+            return None
+        fixed, values = [], []
+        fields = prompt[len(PROMPT_PREFIX):].split(PROMPT_SEPARATOR)
+        for i, field in enumerate(fields):
+            param, sep, val = field.rpartition(": ")
+            if not sep or not param or not val or val != val.strip():
+                return None
+            fixed.append((PROMPT_PREFIX if i == 0 else "") + param + ":")
+            values.append(val + (PROMPT_SEPARATOR.strip() if i < len(fields) - 1 else ""))
+        return fixed, values
+
+    def _encode_uncached(self, prompts):
+        # Fragment-wise encoding without touching the caches (used by the self-check)
+        encoded = []
+        for prompt in prompts:
+            fixed, values = self.split(prompt)
+            ids = []
+            for fragment_ids, value_ids in zip(self._tokenize(fixed), self._tokenize(values)):
+                ids += fragment_ids + value_ids
+            encoded.append(self._finish(ids))
+        return encoded
+
+    def _finish(self, ids):
+        # Same truncation as tokenizer(..., truncation=True): keep room for EOS
+        return ids[:self.max_length - 1] + [self.eos_id]
+
+    def encode(self, prompts):
+        # Unpadded input ids for each prompt, in order
+        start = time.perf_counter()
+        if self.exact:
+            encoded = self._encode_fragments(prompts)
+        else:
+            encoded = self._tokenize_whole(prompts)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["prompts"] += len(prompts)
+            self.stats["total_ms"] += elapsed_ms
+            self.stats["last_ms"] = elapsed_ms
+        return encoded
+
+    def _encode_fragments(self, prompts):
+        layouts = [self.split(prompt) for prompt in prompts]
+        fixed = {f for layout in layouts if layout for f in layout[0]}
+        values = {v for layout in layouts if layout for v in layout[1]}
+        with self._lock:
+            missing_fixed = sorted(f for f in fixed if f not in self._fragments)
+            missing_values = sorted(v for v in values if v not in self._values)
+        # Tokenized outside the lock; the batch's own ids are kept here so a concurrent
+        # eviction from the shared cache cannot remove them before they are used
+        fixed_ids = dict(zip(missing_fixed, self._tokenize(missing_fixed))) if missing_fixed else {}
+        value_ids = dict(zip(missing_values, self._tokenize(missing_values))) if missing_values else {}
+
+        with self._lock:
+            self._fragments.update(fixed_ids)
+            for value in values:
+                ids = value_ids.get(value)
+                if ids is None:
+                    ids = self._values.get(value)
+                    if ids is None:
+                        # Evicted by another batch since the membership check
+                        ids = self._tokenize([value])[0]
+                    value_ids[value] = ids
+                self._values[value] = ids
+                self._values.move_to_end(value)
+            while len(self._values) > VALUE_CACHE_SIZE:
+                self._values.popitem(last=False)
+            fragments = {f: self._fragments[f] for f in fixed}
+
+        encoded, fallback = [], []
+        for i, layout in enumerate(layouts):
+            if layout is None:
+                encoded.append(None)
+                fallback.append(i)
+                continue
+            ids = []
+            for fragment, value in zip(*layout):
+                ids += fragments[fragment]
+                ids += value_ids[value]
+            encoded.append(self._finish(ids))
+
+        if fallback:
+            whole = self._tokenize_whole([prompts[i] for i in fallback])
+            for i, ids in zip(fallback, whole):
+                encoded[i] = ids
+        return encoded
+
+
+def pad_batch(input_ids, pad_id):
+    # Right-padded (input_ids, attention_mask) int64 arrays for a list of id lists
+    lengths = np.fromiter((len(ids) for ids in input_ids), dtype=np.int64, count=len(input_ids))
+    width = int(lengths.max()) if len(input_ids) else 0
+    ids = np.full((len(input_ids), width), pad_id, dtype=np.int64)
+    mask = (np.arange(width) < lengths[:, None]).astype(np.int64)
+    for row, seq in enumerate(input_ids):
+        ids[row, :len(seq)] = seq
+    return ids, mask
+
+
+def prompt_encoder(tokenizer):
+    # One encoder (and fragment cache) per tokenizer instance
+    with _encoders_lock:
+        encoder = _encoders.get(id(tokenizer))
+        if encoder is None or encoder.tokenizer is not tokenizer:
+            encoder = PromptEncoder(tokenizer)
+            _encoders[id(tokenizer)] = encoder
+        return encoder
+
+
+def release_encoder(tokenizer=None):
+    # Forget the encoder (and its fragment cache) of `tokenizer`, or every encoder, so a
+    # released model's tokenizer is not kept alive here
+    with _encoders_lock:
+        if tokenizer is None:
+            _encoders.clear()
+            return
+        encoder = _encoders.get(id(tokenizer))
+        if encoder is not None and encoder.tokenizer is tokenizer:
+            del _encoders[id(tokenizer)]
+
+
+def tokenization_stats():
+    with _encoders_lock:
+        encoders = list(_encoders.values())
+    report = {"batches": 0, "prompts": 0, "total_ms": 0.0}
+    for encoder in encoders:
+        for key in report:
+            report[key] += encoder.stats[key]
+    report["mean_batch_ms"] = round(report["total_ms"] / report["batches"], 2) if report["batches"] else 0.0
+    return report
@@ -0,0 +1,167 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# --- Cache configuration (overridable through environment variables) ---
+# Size of the in-process tier, in bytes of cached recommendation text
+CACHE_MAX_BYTES = int(os.environ.get("RECOMMENDATION_CACHE_MAX_BYTES", 8 * 1024 * 1024))
+# sqlite file for the persistent tier; leave empty to keep the cache in memory only
+CACHE_DB_PATH = os.environ.get("RECOMMENDATION_CACHE_DB", "")
+# "sorted" makes "A: 1; B: 2" and "B: 2; A: 1" share a key, "input" keeps prompt order
+CACHE_PARAM_ORDER = os.environ.get("RECOMMENDATION_CACHE_PARAM_ORDER", "sorted")
+# Numeric values are rounded to this many decimals before keying. Unset (the default)
+# keys exact values: rounding can merge values on either side of a reference bound.
+CACHE_VALUE_DECIMALS = os.environ.get("RECOMMENDATION_CACHE_DECIMALS")
+CACHE_VALUE_DECIMALS = int(CACHE_VALUE_DECIMALS) if CACHE_VALUE_DECIMALS else None
+
+PROMPT_PREFIX = "analyze: "
+
+
+def _canonical_value(value, decimals):
+    # "12.250" -> "12.25", "12.0" -> "12"; with decimals=2 "56.2201 %" -> "56.22 %".
+    # Non-numeric values are kept as-is
+    number, _, unit = value.strip().partition(" ")
+    try:
+        if decimals is None:
+            number = repr(float(number))
+            number = number[:-2] if number.endswith(".0") else number
+        else:
+            number = f"{round(float(number), decimals):.{decimals}f}".rstrip("0").rstrip(".")
+    except ValueError:
+        return value.strip()
+    return f"{number} {unit.strip()}".strip()
+
+
+def canonical_prompt(prompt, param_order=None, decimals=None):
+    param_order = param_order or CACHE_PARAM_ORDER
+    decimals = decimals if decimals is not None else CACHE_VALUE_DECIMALS
+
+    body = prompt.strip()
+    if body.startswith(PROMPT_PREFIX.strip()):
+        body = body[len(PROMPT_PREFIX.strip()):].strip()
+
+    parts = []
+    for part in body.split(";"):
+        if not part.strip():
+            continue
+        name, sep, value = part.rpartition(":")
+        if not sep:
+            parts.append(part.strip())
+            continue
+        parts.append(f"{name.strip()}: {_canonical_value(value, decimals)}")
+
+    if param_order == "sorted":
+        parts.sort()
+    return PROMPT_PREFIX + "; ".join(parts)
+
+
+def adapter_version(adapter_dir):
+    # Fingerprint of the checkpoint files, so retraining the adapter invalidates old entries
+    # (sub-directories included, so a directory of per-category adapters works too)
+    digest = hashlib.sha1()
+    if os.path.isdir(adapter_dir):
+        for root, dirs, files in os.walk(adapter_dir):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.endswith((".json", ".safetensors", ".bin")):
+                    continue
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                rel = os.path.relpath(path, adapter_dir)
+                digest.update(f"{rel}:{stat.st_size}:{int(stat.st_mtime)}".encode())
+    return digest.hexdigest()[:16]
+
+
+class RecommendationCache:
+    """Two-tier cache for generated recommendations.
+
+    The first tier is an in-process LRU bounded by the size of the cached text.
+    The second, optional tier is a sqlite table that survives restarts; entries
+    found there are promoted back into the LRU.
+    """
+
+    def __init__(self, version, max_bytes=CACHE_MAX_BYTES, db_path=CACHE_DB_PATH,
+                 param_order=None, decimals=None):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.param_order = param_order
+        self.decimals = decimals
+        self._lru = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS recommendations (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def key(self, prompt, variant=""):
+        # `variant` separates outputs of the same prompt under different decoding settings
+        canonical = canonical_prompt(prompt, self.param_order, self.decimals)
+        return hashlib.sha1(f"{self.version}\n{variant}\n{canonical}".encode()).hexdigest()
+
+    def _remember(self, key, value):
+        if key in self._lru:
+            self._size -= len(self._lru.pop(key))
+        self._lru[key] = value
+        self._size += len(value)
+        while self._size > self.max_bytes and len(self._lru) > 1:
+            _, evicted = self._lru.popitem(last=False)
+            self._size -= len(evicted)
+
+    def get(self, prompt, variant=""):
+        key = self.key(prompt, variant)
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value FROM recommendations WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, prompt, value, variant=""):
+        key = self.key(prompt, variant)
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO recommendations (key, value) VALUES (?, ?)", (key, value))
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+            self._size = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM recommendations")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._lru),
+                "bytes": self._size,
+                "version": self.version,
+            }
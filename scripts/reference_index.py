@@ -0,0 +1,268 @@
+import hashlib
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from map_categories import column_aliases
+
+# Compiled index saved next to the workbook unless REFERENCE_INDEX_CACHE_DIR is set
+REFERENCE_INDEX_CACHE_DIR = os.environ.get("REFERENCE_INDEX_CACHE_DIR")
+INDEX_FORMAT = 2
+
+# Optional sheet columns for demographic ranges: a parameter may have several rows,
+# each applying to ages in [Age Min, Age Max) and, when Sex is set, one sex only
+AGE_MIN_COLUMN = "Age Min"
+AGE_MAX_COLUMN = "Age Max"
+SEX_COLUMN = "Sex"
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def canonical_key(name):
+    # Lowercase canonical parameter name, so "Cholesterol" and "Total Cholesterol" share a key
+    name = " ".join(str(name).split()).lower()
+    return column_aliases.get(name, name).lower()
+
+
+def sex_key(value):
+    # "M"/"Male"/"male" -> "m"; missing -> "" (any sex)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    return str(value).strip()[:1].lower()
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ReferenceIndex:
+    """Every reference range in the workbook as parallel arrays.
+
+    Entry i is parameter `params[i]` of sheet `categories[i]` with bounds
+    `low[i]`/`high[i]` (NaN when missing) and unit `units[i]`, applying to ages
+    in [age_min[i], age_max[i]) and sex `sexes[i]` ("" for any). Lookups go
+    through (category, parameter) and canonical parameter names.
+    """
+
+    def __init__(self, params, categories, low, high, units, source_hash="",
+                 age_min=None, age_max=None, sexes=None):
+        self.params = np.asarray(params, dtype=str)
+        self.categories = np.asarray(categories, dtype=str)
+        self.low = np.asarray(low, dtype=np.float64)
+        self.high = np.asarray(high, dtype=np.float64)
+        self.units = np.asarray(units, dtype=str)
+        n = len(self.params)
+        self.age_min = np.full(n, -np.inf) if age_min is None else np.asarray(age_min, dtype=np.float64)
+        self.age_max = np.full(n, np.inf) if age_max is None else np.asarray(age_max, dtype=np.float64)
+        self.sexes = np.full(n, "") if sexes is None else np.asarray(sexes, dtype=str)
+        self.source_hash = source_hash
+        self.demographic = (self.age_min > -np.inf) | (self.age_max < np.inf) | (self.sexes != "")
+
+        # (category, parameter) -> entries, general range first
+        self.by_param = {}
+        self.by_canonical = {}
+        for i, (category, param) in enumerate(zip(self.categories.tolist(), self.params.tolist())):
+            self.by_param.setdefault((category, param), []).append(i)
+            self.by_canonical.setdefault(canonical_key(param), []).append(i)
+        for entries in self.by_param.values():
+            entries.sort(key=lambda i: (bool(self.demographic[i]), self.sexes[i] != ""))
+        self.category_names = set(self.categories.tolist())
+        self._sheets = None
+        self._frames = None
+
+    def __len__(self):
+        return len(self.params)
+
+    @classmethod
+    def from_workbook(cls, path, source_hash=""):
+        return cls.from_frames(pd.read_excel(path, sheet_name=None), source_hash)
+
+    @classmethod
+    def from_frames(cls, sheets, source_hash=""):
+        # {sheet: DataFrame} as pd.read_excel(sheet_name=None) / read_ref_file return it
+        params, categories, low, high, units = [], [], [], [], []
+        age_min, age_max, sexes = [], [], []
+        for sheet, df in sheets.items():
+            df = df.copy()
+            df.columns = [str(col).strip() for col in df.columns]
+            if 'Parameter' in df.columns:
+                key_col = 'Parameter'
+            elif 'Value' in df.columns:
+                key_col = 'Value'
+            else:
+                print(f"Sheet '{sheet}' missing 'Parameter' or 'Value' column. Skipping.")
+                continue
+            df = df[df[key_col].notna()]
+            params += df[key_col].astype(str).str.strip().tolist()
+            categories += [sheet] * len(df)
+            for col, target in (('Low', low), ('High', high)):
+                values = pd.to_numeric(df[col], errors='coerce') if col in df.columns else pd.Series(np.nan, index=df.index)
+                target += values.astype(float).tolist()
+            unit = df['Unit'] if 'Unit' in df.columns else pd.Series("", index=df.index)
+            units += unit.fillna("").astype(str).tolist()
+            for col, target, default in ((AGE_MIN_COLUMN, age_min, -np.inf), (AGE_MAX_COLUMN, age_max, np.inf)):
+                values = pd.to_numeric(df[col], errors='coerce') if col in df.columns else pd.Series(np.nan, index=df.index)
+                target += values.fillna(default).astype(float).tolist()
+            sexes += [sex_key(v) for v in df[SEX_COLUMN]] if SEX_COLUMN in df.columns else [""] * len(df)
+        return cls(params, categories, low, high, units, source_hash, age_min, age_max, sexes)
+
+    @classmethod
+    def load(cls, cache_path):
+        with np.load(cache_path, allow_pickle=False) as data:
+            if int(data["format"]) != INDEX_FORMAT:
+                raise ValueError("Unsupported reference index format")
+            return cls(data["params"], data["categories"], data["low"], data["high"], data["units"],
+                       str(data["source_hash"]), data["age_min"], data["age_max"], data["sexes"])
+
+    def save(self, cache_path):
+        partial = f"{cache_path}.{os.getpid()}.part.npz"
+        np.savez(partial, format=INDEX_FORMAT, params=self.params, categories=self.categories,
+                 low=self.low, high=self.high, units=self.units, source_hash=self.source_hash,
+                 age_min=self.age_min, age_max=self.age_max, sexes=self.sexes)
+        os.replace(partial, cache_path)
+
+    def entries(self, category, column):
+        # Entries for `column` in `category` (general range first): exact parameter
+        # name first, then any parameter sharing the column's canonical name
+        entries = self.by_param.get((category, column))
+        if entries is not None:
+            return entries
+        for i in self.by_canonical.get(canonical_key(column), []):
+            if self.categories[i] == category:
+                return self.by_param[(category, str(self.params[i]))]
+        return []
+
+    def resolve_columns(self, columns, category_mapping):
+        # ([column], [entries]) for every mapped column of `columns` with a reference range
+        resolved, entries = [], []
+        for category, category_cols in category_mapping.items():
+            if category not in self.category_names:
+                print(f"Category '{category}' not found in reference Excel sheets.")
+                continue
+            for col in category_cols:
+                if col not in columns:
+                    print(f"Column '{col}' not found in CSV data.")
+                    continue
+                col_entries = self.entries(category, col)
+                if not col_entries:
+                    print(f"Column '{col}' not found in reference sheet for category '{category}'.")
+                    continue
+                if col not in resolved:
+                    resolved.append(col)
+                    entries.append(col_entries)
+        return resolved, entries
+
+    def find(self, category, column):
+        entries = self.entries(category, column)
+        return entries[0] if entries else None
+
+    def bounds(self, entries, num_rows, ages=None, sexes=None):
+        # (num_rows, len(entries)) low/high arrays: column j uses the general range of
+        # entries[j], overridden per row by demographic ranges matching that row's age/sex
+        # A parameter with only age/sex specific rows has no default: NaN until a row matches
+        general = [e[0] for e in entries]
+        has_general = ~self.demographic[general]
+        low = np.tile(np.where(has_general, self.low[general], np.nan), (num_rows, 1))
+        high = np.tile(np.where(has_general, self.high[general], np.nan), (num_rows, 1))
+        if ages is None and sexes is None:
+            return low, high
+
+        ages = np.full(num_rows, np.nan) if ages is None else np.asarray(ages, dtype=np.float64)
+        sexes = np.full(num_rows, "") if sexes is None else np.asarray([sex_key(v) for v in sexes], dtype=str)
+        with np.errstate(invalid='ignore'):
+            for j, column_entries in enumerate(entries):
+                # Sorted general -> age-only -> age+sex, so the most specific match wins
+                for i in column_entries:
+                    if not self.demographic[i]:
+                        continue
+                    # Unbounded ends are not tested, so sex-only rows apply without an age
+                    match = np.ones(num_rows, dtype=bool)
+                    if self.age_min[i] > -np.inf:
+                        match &= ages >= self.age_min[i]
+                    if self.age_max[i] < np.inf:
+                        match &= ages < self.age_max[i]
+                    if self.sexes[i]:
+                        match &= sexes == self.sexes[i]
+                    low[match, j] = self.low[i]
+                    high[match, j] = self.high[i]
+        return low, high
+
+    def lookup(self, column):
+        # (low, high, unit, category) for every entry sharing the column's canonical name
+        return [(float(self.low[i]), float(self.high[i]), str(self.units[i]), str(self.categories[i]))
+                for i in self.by_canonical.get(canonical_key(column), [])]
+
+    def sheets(self):
+        # {category: {parameter: (low, high, unit)}}, the shape load_reference_excel always returned
+        if self._sheets is None:
+            sheets = {}
+            for (category, param), entries in self.by_param.items():
+                i = entries[0]
+                sheets.setdefault(category, {})[param] = (float(self.low[i]), float(self.high[i]), str(self.units[i]))
+            self._sheets = sheets
+        return self._sheets
+
+    def frames(self):
+        # {category: DataFrame(Value, Low, High, Unit)}, the shape read_ref_file always returned
+        if self._frames is None:
+            frames = {}
+            for category in dict.fromkeys(self.categories.tolist()):
+                mask = self.categories == category
+                frame = pd.DataFrame({
+                    "Value": self.params[mask], "Low": self.low[mask],
+                    "High": self.high[mask], "Unit": self.units[mask],
+                })
+                if self.demographic[mask].any():
+                    frame[AGE_MIN_COLUMN] = np.where(np.isinf(self.age_min[mask]), np.nan, self.age_min[mask])
+                    frame[AGE_MAX_COLUMN] = np.where(np.isinf(self.age_max[mask]), np.nan, self.age_max[mask])
+                    frame[SEX_COLUMN] = self.sexes[mask]
+                frames[category] = frame
+            self._frames = frames
+        return self._frames
+
+
+def cache_path_for(path):
+    directory = REFERENCE_INDEX_CACHE_DIR or os.path.dirname(os.path.abspath(path))
+    return os.path.join(directory, os.path.basename(path) + ".index.npz")
+
+
+def _build(path):
+    source_hash = file_hash(path)
+    cache_path = cache_path_for(path)
+    if os.path.exists(cache_path):
+        try:
+            index = ReferenceIndex.load(cache_path)
+            if index.source_hash == source_hash:
+                return index
+        except Exception as e:
+            print(f"Ignoring unreadable reference index cache '{cache_path}': {e}")
+
+    index = ReferenceIndex.from_workbook(path, source_hash)
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        index.save(cache_path)
+    except OSError as e:
+        print(f"Could not write reference index cache '{cache_path}': {e}")
+    return index
+
+
+# Loaded once per process and workbook; rebuilt only when the workbook's mtime/size
+# changes and its content hash no longer matches the cached index
+def load_reference_index(path):
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        entry = _indexes.get(path)
+        if entry is not None and entry[0] == signature:
+            return entry[1]
+        index = _build(path)
+        _indexes[path] = (signature, index)
+        return index
@@ -0,0 +1,154 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from execution_plan import PROMPT_PREFIX, PROMPT_SEPARATOR
+from reference_index import load_reference_index
+from template_engine import HIGH_TEMPLATE, LOW_TEMPLATE, NORMAL_TEMPLATE
+
+# Processes generating shards; 1 generates in this process
+SYNTHETIC_WORKERS = int(os.environ.get("SYNTHETIC_WORKERS", os.cpu_count() or 1))
+# Examples per on-disk shard (one task per shard) and per record batch inside a shard
+SYNTHETIC_SHARD_ROWS = int(os.environ.get("SYNTHETIC_SHARD_ROWS", 200000))
+SYNTHETIC_BATCH_ROWS = int(os.environ.get("SYNTHETIC_BATCH_ROWS", 20000))
+
+# Share of in-range values; the rest is split evenly between low*0.8 and high*1.2
+NORMAL_SHARE = 0.7
+
+NORMAL, LOW, HIGH = 0, 1, 2
+# NumPy 2's variable-width string dtype; NumPy 1.x builds the same strings in object arrays
+STRING = np.dtypes.StringDType() if hasattr(np.dtypes, "StringDType") else object
+
+
+def sheet_arrays(param_dict):
+    # {param: (low, high, unit)} -> (params, low, high, units) arrays in sheet order
+    params = list(param_dict)
+    low = np.array([param_dict[p][0] for p in params], dtype=np.float64)
+    high = np.array([param_dict[p][1] for p in params], dtype=np.float64)
+    units = [str(param_dict[p][2] or "").strip() for p in params]
+    return params, low, high, units
+
+
+def draw_values(low, high, num_examples, rng):
+    # (values, status, whole) arrays of shape (num_examples, num_params): values rounded to
+    # 2 places, status from the draw (as in generate_synthetic_examples: a missing bound
+    # is always Normal, a value drawn at low*0.8 is Low even when low is 0), and whole
+    # marking values drawn as integers
+    shape = (num_examples, len(low))
+    missing = np.isnan(low) | np.isnan(high)
+    normal = rng.random(shape) < NORMAL_SHARE
+    below = rng.random(shape) < 0.5
+
+    in_range = low + rng.random(shape) * (high - low)
+    values = np.where(normal, in_range, np.where(below, low * 0.8, high * 1.2))
+    # No range: 70% whole numbers in [1, 100], otherwise uniform in [1, 100)
+    free = np.where(normal, rng.integers(1, 101, shape), 1 + rng.random(shape) * 99)
+    values = np.round(np.where(missing, free, values), 2)
+
+    status = np.full(shape, NORMAL, dtype=np.int8)
+    abnormal = ~normal & ~missing
+    status[abnormal & below] = LOW
+    status[abnormal & ~below] = HIGH
+    whole = missing & normal
+    return values, status, whole
+
+
+def as_text(array):
+    # str() of every number, as a STRING array
+    if STRING is object:
+        return np.array([str(x) for x in array.tolist()], dtype=object)
+    return array.astype(STRING)
+
+
+def render_examples(params, units, sheet_name, values, status, whole):
+    # (input_text, target_text) string arrays for every row, built column by column
+    # (`+` is elementwise concatenation for both StringDType and object arrays)
+    inputs = np.full(len(values), PROMPT_PREFIX, dtype=STRING)
+    targets = np.full(len(values), "", dtype=STRING)
+    for j, (param, unit) in enumerate(zip(params, units)):
+        rendered = as_text(values[:, j])
+        if whole[:, j].any():
+            rendered[whole[:, j]] = as_text(values[whole[:, j], j].astype(np.int64))
+        if j:
+            inputs = inputs + PROMPT_SEPARATOR
+        inputs = inputs + f"{param}: " + rendered
+        if unit:
+            inputs = inputs + f" {unit}"
+
+        # Indexed by status code: nothing for normal values, one sentence per abnormal one
+        sentences = np.array(["", LOW_TEMPLATE.format(param=param) + " ", HIGH_TEMPLATE.format(param=param) + " "],
+                             dtype=STRING)
+        targets = targets + sentences[status[:, j]]
+
+    if STRING is object:
+        targets = np.array([text.rstrip() for text in targets.tolist()], dtype=object)
+    else:
+        targets = np.strings.rstrip(targets)
+    targets[targets == ""] = NORMAL_TEMPLATE.format(category=sheet_name)
+    return inputs, targets
+
+
+def generate_sheet(param_dict, sheet_name, num_examples, rng):
+    # Vectorized (input_text, target_text) arrays for one sheet
+    params, low, high, units = sheet_arrays(param_dict)
+    values, status, whole = draw_values(low, high, num_examples, rng)
+    return render_examples(params, units, sheet_name, values, status, whole)
+
+
+def shard_seed(seed, sheet_number, shard_number):
+    # Same examples for a (seed, sheet, shard) whatever the worker count
+    return np.random.default_rng([seed, sheet_number, shard_number])
+
+
+def _write_shard(task):
+    import pyarrow as pa
+
+    path, param_dict, sheet_name, num_examples, seed, sheet_number, shard_number = task
+    rng = shard_seed(seed, sheet_number, shard_number)
+    schema = pa.schema([("input_text", pa.string()), ("target_text", pa.string())])
+    partial = f"{path}.part"
+    with pa.OSFile(partial, "wb") as sink, pa.ipc.new_stream(sink, schema) as writer:
+        for start in range(0, num_examples, SYNTHETIC_BATCH_ROWS):
+            inputs, targets = generate_sheet(param_dict, sheet_name, min(SYNTHETIC_BATCH_ROWS, num_examples - start), rng)
+            writer.write_batch(pa.record_batch([pa.array(inputs.tolist(), pa.string()),
+                                                pa.array(targets.tolist(), pa.string())], schema=schema))
+    os.replace(partial, path)
+    return path, num_examples
+
+
+# Write examples_per_sheet examples for every sheet (or `sheets`) as Arrow stream shards
+# in output_dir, generated by `workers` processes. Returns the shard paths in order.
+def write_synthetic_shards(file_path, output_dir, examples_per_sheet=50, sheets=None, seed=42,
+                           workers=SYNTHETIC_WORKERS, shard_rows=SYNTHETIC_SHARD_ROWS):
+    all_ranges = load_reference_index(file_path).sheets()
+    os.makedirs(output_dir, exist_ok=True)
+    for name in os.listdir(output_dir):
+        if name.endswith(".arrow"):
+            os.remove(os.path.join(output_dir, name))
+
+    tasks = []
+    for sheet_number, (sheet, param_dict) in enumerate(all_ranges.items()):
+        if sheets is not None and sheet not in sheets:
+            continue
+        for shard_number, start in enumerate(range(0, examples_per_sheet, shard_rows)):
+            path = os.path.join(output_dir, f"{sheet_number:03d}-{shard_number:05d}.arrow")
+            tasks.append((path, param_dict, sheet, min(shard_rows, examples_per_sheet - start), seed,
+                          sheet_number, shard_number))
+
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_write_shard(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_write_shard, tasks))
+    print(f"Wrote {sum(n for _, n in results)} synthetic examples in {len(results)} shards to {output_dir}")
+    return [path for path, _ in results]
+
+
+# Memory-mapped datasets.Dataset over the shards (nothing is loaded into Python lists)
+def load_synthetic_dataset(shard_paths):
+    import datasets
+
+    if not shard_paths:
+        return datasets.Dataset.from_dict({"input_text": [], "target_text": []})
+    return datasets.concatenate_datasets([datasets.Dataset.from_file(path) for path in shard_paths])
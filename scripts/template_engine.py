@@ -0,0 +1,76 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from flag_codes import NORMAL, LOW, HIGH
+
+# "model" (default) always calls the fine-tuned model; "hybrid" is opt-in and answers
+# flag-explainable categories from templates, calling the model only for the rest
+RECOMMENDATION_ENGINE = os.environ.get("RECOMMENDATION_ENGINE", "model")
+
+# Same sentences the fine-tuning targets are built from (generate_synthetic_examples)
+LOW_TEMPLATE = "{param} is below normal, consider consulting your healthcare provider."
+HIGH_TEMPLATE = "{param} is above normal, lifestyle changes or medical advice recommended."
+NORMAL_TEMPLATE = "All {category} parameters are within normal ranges. Maintain a healthy lifestyle."
+
+# Flag codes the templates can explain; Invalid/unknown or a missing flag column needs the model
+EXPLAINABLE_FLAGS = [NORMAL, LOW, HIGH]
+
+_usage = {}
+_lock = threading.Lock()
+
+
+def render_category(df, flags, category, columns):
+    """Template recommendations for one category over every row at once.
+
+    Returns (texts, covered): two Series aligned with df.index. A row is covered
+    when every parameter with a value has an explainable flag.
+    """
+    present = [col for col in columns if col in df.columns]
+    texts = pd.Series("", index=df.index, dtype=object)
+    covered = pd.Series(True, index=df.index)
+
+    for col in present:
+        has_value = df[col].notna().to_numpy()
+        flag_col = f"{col}_Flag"
+        if flag_col not in flags.columns:
+            covered &= ~has_value
+            continue
+
+        flag = flags[flag_col].to_numpy()
+        covered &= ~has_value | np.isin(flag, EXPLAINABLE_FLAGS)
+        sentence = np.where(flag == LOW, LOW_TEMPLATE.format(param=col) + " ",
+                            np.where(flag == HIGH, HIGH_TEMPLATE.format(param=col) + " ", ""))
+        texts += np.where(has_value, sentence, "")
+
+    texts = texts.str.rstrip()
+    texts = texts.where(texts != "", NORMAL_TEMPLATE.format(category=category))
+    return texts, covered
+
+
+def record_usage(category, template_count, model_count):
+    with _lock:
+        entry = _usage.setdefault(category, {"template": 0, "model": 0})
+        entry["template"] += template_count
+        entry["model"] += model_count
+
+
+def hit_rate_report():
+    # Per category: how many recommendations came from templates vs. the model
+    with _lock:
+        report = {}
+        for category, entry in _usage.items():
+            total = entry["template"] + entry["model"]
+            report[category] = {
+                "template": entry["template"],
+                "model": entry["model"],
+                "template_hit_rate": round(entry["template"] / total, 4) if total else 0.0,
+            }
+        return report
+
+
+def reset_usage():
+    with _lock:
+        _usage.clear()
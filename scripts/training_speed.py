@@ -0,0 +1,85 @@
+import math
+import os
+import time
+
+import numpy as np
+from transformers import TrainerCallback
+
+# "0" restores the old fixed padding to max_length (no length grouping), to compare tokens/sec
+DYNAMIC_PADDING = os.environ.get("TRAIN_DYNAMIC_PADDING", "1") != "0"
+# Source/target caps are the longest tokenized example in a random sample of this many rows
+LENGTH_SAMPLE_ROWS = int(os.environ.get("TRAIN_LENGTH_SAMPLE_ROWS", 20000))
+# Batches are padded to a multiple of 8 so tensor cores get aligned shapes
+PAD_MULTIPLE = 8
+
+
+def round_up(length, multiple=PAD_MULTIPLE):
+    return int(math.ceil(length / multiple) * multiple)
+
+
+# (source_max, target_max): the longest tokenized example in a random sample of up to
+# LENGTH_SAMPLE_ROWS rows (shards are ordered by sheet, so a head sample would see one
+# sheet only), rounded up to PAD_MULTIPLE and never above max_len. Dynamic padding
+# already avoids the cost of long caps, so labels are never cut short to save padding.
+def length_caps(tokenizer, dataset, max_len=512, seed=42):
+    if len(dataset) > LENGTH_SAMPLE_ROWS:
+        dataset = dataset.shuffle(seed=seed).select(range(LENGTH_SAMPLE_ROWS))
+    caps = []
+    for column in ("input_text", "target_text"):
+        lengths = np.array([len(ids) for ids in tokenizer(dataset[column])["input_ids"]])
+        cap = min(round_up(lengths.max()), max_len) if len(lengths) else max_len
+        print(f"{column} tokens: mean {lengths.mean() if len(lengths) else 0:.1f}, "
+              f"max {lengths.max() if len(lengths) else 0}, cap {cap}")
+        caps.append(cap)
+    return tuple(caps)
+
+
+class CountingCollator:
+    """Wraps a data collator and counts real and padded input tokens per batch."""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self.tokens = 0
+        self.padded_tokens = 0
+
+    def __call__(self, features):
+        batch = self.collator(features)
+        self.tokens += int(batch["attention_mask"].sum())
+        self.padded_tokens += int(batch["input_ids"].numel())
+        return batch
+
+
+class TokensPerSecondCallback(TrainerCallback):
+    """Adds tokens/sec and the padding share since the last log to the Trainer logs."""
+
+    def __init__(self, collator):
+        self.collator = collator
+        self._start = None
+        self._tokens = 0
+        self._padded = 0
+
+    def _reset(self):
+        self._start = time.perf_counter()
+        self._tokens = self.collator.tokens
+        self._padded = self.collator.padded_tokens
+
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._reset()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Evaluation batches go through the same collator; leave them out of the next window
+        self._reset()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs is None or self._start is None or "loss" not in logs:
+            return
+        elapsed = time.perf_counter() - self._start
+        tokens = self.collator.tokens - self._tokens
+        padded = self.collator.padded_tokens - self._padded
+        if elapsed > 0 and padded:
+            logs["tokens_per_sec"] = round(tokens / elapsed, 1)
+            logs["padded_tokens_per_sec"] = round(padded / elapsed, 1)
+            logs["padding_share"] = round(1 - tokens / padded, 4)
+            print(f"step {state.global_step}: {logs['tokens_per_sec']} tokens/sec, "
+                  f"{logs['padding_share']:.1%} padding (dynamic padding {'on' if DYNAMIC_PADDING else 'off'})")
+        self._reset()
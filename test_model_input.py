@@ -1,7 +1,10 @@
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+from transformers import T5TokenizerFast, T5ForConditionalGeneration
 from peft import PeftModel
+import sys
+sys.path.append("./scripts")
+from decoding_policy import choose_policy
 
-tokenizer = T5Tokenizer.from_pretrained("./recommendation_model")
+tokenizer = T5TokenizerFast.from_pretrained("./recommendation_model")
 base_model = T5ForConditionalGeneration.from_pretrained("t5-small")
 model = PeftModel.from_pretrained(base_model, "./recommendation_model")
 
@@ -13,13 +16,17 @@ tokens = tokenizer.tokenize(input_text)
 # Tokenize with a large enough max_length
 inputs = tokenizer(input_text, return_tensors="pt", truncation=True, padding="max_length", max_length=512)
 
-# Generate with controlled output length
+# Beams and output length from the same decoding policy the backend uses. Flags are
+# unknown here, so this is the backend's default (5 beams, max_length 150), not the
+# 4 beams / 100 new tokens this script used before
+policy = choose_policy(None)
+print(f"Decoding policy: {policy.name}, {policy.num_beams} beams, max_length {policy.max_length}")
 outputs = model.generate(
     input_ids=inputs["input_ids"],
     attention_mask=inputs["attention_mask"],
-    max_new_tokens=100,           # Adjust to allow full-length suggestion
-    num_beams=4,                  # Beam search for better quality
-    early_stopping=True
+    max_length=policy.max_length,
+    num_beams=policy.num_beams,
+    early_stopping=policy.num_beams > 1
 )
 
 print(tokenizer.decode(outputs[0], skip_special_tokens=True))
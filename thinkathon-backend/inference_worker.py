@@ -0,0 +1,133 @@
+"""Cross-request micro-batching for model generation"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from integrate_model_new import generate_recommendations_batch
+
+# A batch is flushed once it holds MAX_BATCH_SIZE prompts or its oldest prompt has waited MAX_WAIT_MS
+MAX_BATCH_SIZE = int(os.environ.get("INFERENCE_MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 25))
+# Longest a background job thread waits for one chunk of texts before giving up
+JOB_WAIT_SECONDS = float(os.environ.get("INFERENCE_JOB_WAIT_SECONDS", 600))
+
+
+class InferenceWorker:
+    """Collects ModelRequests from concurrent uploads into shared generate batches.
+
+    Requests are queued on the event loop; a single background task drains the
+    queue into batches and runs generate_recommendations_batch on a dedicated
+    thread, so the event loop never blocks on the model.
+    """
+
+    def __init__(self, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = None
+        self._task = None
+        self._loop = None
+        # Requests taken off the queue and not yet answered (being batched or generating)
+        self._pending = []
+        self._stopping = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if not self.running:
+            self.queue = asyncio.Queue()
+            self._pending = []
+            self._stopping = False
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Fail everything not answered yet: the in-flight batch and the queue alike
+        pending, self._pending = self._pending, []
+        while self.queue is not None and not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(RuntimeError("Inference worker stopped"))
+
+    def submit(self, request):
+        # Returns a future resolved with the recommendation text for one ModelRequest
+        if not self.running:
+            raise RuntimeError("Inference worker is not running")
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((request, future))
+        return future
+
+    async def generate(self, requests):
+        # Recommendation texts for a list of ModelRequests, in order
+        if self._stopping:
+            raise RuntimeError("Inference worker stopped")
+        await self.start()
+        return await asyncio.gather(*(self.submit(request) for request in requests))
+
+    def generate_threadsafe(self, requests, timeout=JOB_WAIT_SECONDS):
+        # Same as generate, for threads outside the event loop (background upload jobs);
+        # blocks the calling thread until the texts are ready, the worker stops or `timeout`
+        if self._stopping or not self.running:
+            raise RuntimeError("Inference worker is not running")
+        future = asyncio.run_coroutine_threadsafe(self.generate(requests), self._loop)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise RuntimeError(f"No recommendations after {timeout:.0f}s") from None
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = self._pending = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._next_batch()
+            # Requests whose caller went away (e.g. a cancelled stream) are not generated
+            batch = self._pending = [(request, future) for request, future in batch if not future.done()]
+            if not batch:
+                continue
+            requests = [request for request, _ in batch]
+            try:
+                texts = await loop.run_in_executor(
+                    self._executor,
+                    lambda: generate_recommendations_batch(
+                        [r.prompt for r in requests],
+                        policies=[r.policy for r in requests],
+                        adapters=[r.adapter for r in requests],
+                    ),
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+            self._pending = []
+
+
+inference_worker = InferenceWorker()
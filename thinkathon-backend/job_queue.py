@@ -0,0 +1,171 @@
+"""In-process background jobs for large report uploads"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from chunked_pipeline import feature_means, plan_chunks
+from integrate_model_new import build_test_result
+from inference_worker import inference_worker
+
+# At most UPLOAD_JOB_WORKERS uploads are processed at once; the rest wait in the queue
+UPLOAD_JOB_WORKERS = int(os.environ.get("UPLOAD_JOB_WORKERS", 2))
+# Prompts generated between progress updates / cancellation checks
+UPLOAD_JOB_CHUNK = int(os.environ.get("UPLOAD_JOB_CHUNK", 32))
+# Finished jobs kept for polling before the oldest are forgotten
+UPLOAD_JOB_HISTORY = int(os.environ.get("UPLOAD_JOB_HISTORY", 100))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, source, filename=None):
+        self.id = uuid.uuid4().hex
+        self.source = source        # path or spooled upload copy
+        self.filename = filename
+        self.status = "queued"
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+        self.rows_total = 0
+        self.categories_total = 0
+        self.categories_done = 0
+        self.patients = {}          # row index -> patient header
+        self.tests = {}             # row index -> {job position: test}
+        self.row_jobs = {}          # row index -> number of tests expected
+        self.cancel_event = threading.Event()
+        self.lock = threading.Lock()
+
+    def add_result(self, row_index, position, test):
+        with self.lock:
+            self.tests.setdefault(row_index, {})[position] = test
+            self.categories_done += 1
+
+    def snapshot(self):
+        with self.lock:
+            rows_done = sum(
+                1 for row, expected in self.row_jobs.items() if len(self.tests.get(row, {})) == expected
+            )
+            results = []
+            for row, header in self.patients.items():
+                tests = self.tests.get(row, {})
+                results.append({**header, "tests": [tests[p] for p in sorted(tests)]})
+            return {
+                "id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "progress": {
+                    "rows_total": self.rows_total,
+                    "rows_done": rows_done,
+                    "categories_total": self.categories_total,
+                    "categories_done": self.categories_done,
+                },
+                "results": results,
+            }
+
+
+def run_upload_job(job, reference_path):
+    # Same read_file -> flag_out_of_range -> prepare_data pipeline as /upload, one chunk
+    # of rows at a time, reporting per-test progress
+    means, rows = feature_means(job.source, filename=job.filename)
+    with job.lock:
+        job.rows_total = rows
+
+    for planned in plan_chunks(job.source, reference_path, means, filename=job.filename):
+        pending = planned.pending
+        with job.lock:
+            job.categories_total += len(pending)
+            job.patients.update(planned.headers)
+            for item in pending:
+                job.row_jobs[item.row_index] = job.row_jobs.get(item.row_index, 0) + 1
+
+        for position, text in planned.answered.items():
+            item = pending[position]
+            job.add_result(item.row_index, position, build_test_result(item.category, item.row_values, text))
+
+        requests = planned.requests
+        for start in range(0, len(requests), UPLOAD_JOB_CHUNK):
+            if job.cancel_event.is_set():
+                raise JobCancelled()
+            chunk = requests[start:start + UPLOAD_JOB_CHUNK]
+            # Through the shared worker, so job prompts are batched with (and never run
+            # alongside) the prompts of other uploads
+            texts = inference_worker.generate_threadsafe(chunk)
+            for request, text in zip(chunk, texts):
+                item = pending[request.position]
+                job.add_result(item.row_index, request.position, build_test_result(item.category, item.row_values, text))
+
+
+class JobManager:
+    """Bounded thread pool plus an in-memory job table; no external broker"""
+
+    def __init__(self, reference_path, max_workers=UPLOAD_JOB_WORKERS):
+        self.reference_path = reference_path
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, source, filename=None):
+        job = Job(source, filename)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._forget_old()
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        with job.lock:
+            if job.status == "queued":
+                job.status = "cancelled"
+                job.finished = time.time()
+        return job
+
+    def _run(self, job):
+        with job.lock:
+            if job.status == "cancelled":
+                self._release(job)
+                return
+            job.status = "running"
+        try:
+            run_upload_job(job, self.reference_path)
+            status, error = "done", None
+        except JobCancelled:
+            status, error = "cancelled", None
+        except Exception as e:
+            status, error = "failed", str(e)
+        with job.lock:
+            job.status = status
+            job.error = error
+            job.finished = time.time()
+            self._release(job)
+
+    @staticmethod
+    def _release(job):
+        # The upload itself is no longer needed once the job is finished
+        if hasattr(job.source, "close"):
+            job.source.close()
+        job.source = None
+
+    def _forget_old(self):
+        finished = sorted(
+            (job for job in self._jobs.values() if job.finished is not None),
+            key=lambda job: job.finished,
+        )
+        for job in finished[:max(0, len(finished) - UPLOAD_JOB_HISTORY)]:
+            del self._jobs[job.id]
+
+    def shutdown(self):
+        for job in list(self._jobs.values()):
+            job.cancel_event.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
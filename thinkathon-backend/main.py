@@ -2,7 +2,9 @@
 """Main File"""
 from fastapi import FastAPI
 from routes.auth_routes import router
-from routes.upload_csv_routes import upload_router
+from routes.upload_csv_routes import upload_router, job_manager
+from inference_worker import inference_worker
+from pdf_reports import shutdown_pool
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -21,6 +23,18 @@ app.add_middleware(
     allow_methods=["*"],    
     allow_headers=["*"],    
 )
+@app.on_event("startup")
+async def start_inference_worker():
+    """Start the micro-batching inference worker"""
+    await inference_worker.start()
+
+@app.on_event("shutdown")
+async def stop_inference_worker():
+    """Stop the inference worker, background jobs and PDF workers, failing any queued prompts"""
+    await inference_worker.stop()
+    job_manager.shutdown()
+    shutdown_pool()
+
 @app.get("/")
 async def home():
     """Home Page Endpoint"""
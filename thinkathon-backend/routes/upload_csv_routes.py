@@ -1,59 +1,81 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, APIRouter, Query
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 import pandas as pd
+import json
 import os
-import shutil
 import sys
 base_dir = os.path.expanduser("~/Utsav's/Thinkathon/Code/thinkathon-invincible")
 file_path = os.path.join(base_dir, "reference_excel.xlsx")
 scripts_path = os.path.join(base_dir, "scripts")
 sys.path.append(scripts_path)
-from cleanup_script import read_file, read_ref_file, flag_out_of_range
-from map_categories import map_columns_to_categories
-from prepare_ml_data import prepare_data
+from cleanup_script import read_file, flag_out_of_range
+from execution_plan import get_plan
+from prepare_ml_data import prepare_features
+from integrate_model_new import plan_recommendations, assemble_recommendations
+from chunked_pipeline import feature_means, plan_chunks, patient_results
+from inference_worker import inference_worker
+from job_queue import JobManager
+from upload_store import UploadTooLarge, check_size, spooled_copy, persist
+from upload_stream import upload_events
 
 upload_router = APIRouter()
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+job_manager = JobManager(file_path)
 
-@upload_router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    filename = os.path.join(UPLOAD_DIR, file.filename)
 
-    # Save file to disk
-    with open(filename, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+async def upload_buffer(file: UploadFile, copy=False):
+    """The upload's bytes as a rewound file object, size-checked and optionally persisted by content hash.
+
+    Parsers read the spooled buffer directly; copy=True returns a spooled
+    temporary copy for work that continues after the request's UploadFile is
+    closed. Copying, hashing and persisting run off the event loop.
+    """
+    try:
+        buffer = await run_in_threadpool(spooled_copy if copy else check_size, file.file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    await run_in_threadpool(persist, buffer, file.filename)
+    return buffer
+
+async def load_and_plan(file: UploadFile):
+    """Parse, flag and plan an upload; returns (patient header records, pending jobs, answered, model requests)"""
+    buffer = await upload_buffer(file)
 
-    # Read the uploaded file
+    # Read the uploaded file (parsing, flagging and planning are CPU-bound, so they run off the event loop)
     try:
-        df = read_file(filename)
-        if isinstance(df, str):
-            raise HTTPException(status_code=400, detail="PDF file returned text. Please upload a CSV or Excel file.")
+        df = await run_in_threadpool(read_file, buffer, file.filename)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading uploaded file: {e}")
 
-    # Read reference Excel
+    print(df)
+    # Category mapping and reference bounds for this header row (cached per column layout)
     try:
-        reference_sheets = read_ref_file(file_path)
+        plan = await run_in_threadpool(get_plan, df.columns.tolist(), file_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading reference file: {e}")
 
-    print(df)
-    # Map columns to categories
-    column_names = df.columns.tolist()
-    category_mapping = map_columns_to_categories(column_names)
-
     # Flag out-of-range values
-    df = flag_out_of_range(df, reference_sheets, category_mapping)
+    df = await run_in_threadpool(flag_out_of_range, df, plan.index, plan.category_mapping, plan=plan)
     
     excluded_cols = ['Name', 'Age', 'ReportDate']
     excluded_data = df[excluded_cols] if all(col in df.columns for col in excluded_cols) else pd.DataFrame()
     
     df = df.drop(columns=[col for col in excluded_cols if col in df.columns])
 
-    processed_data = prepare_data(df)
-    user_data = excluded_data.to_dict(orient="records")
-    user_info = user_data[0]
+    features, flags = await run_in_threadpool(prepare_features, df)
+    pending, answered, requests = await run_in_threadpool(plan_recommendations, features, flags, plan=plan)
+    return excluded_data.to_dict(orient="records"), pending, answered, requests
+
+
+@upload_router.post("/upload")
+async def upload_file(file: UploadFile = File(...)):
+    user_data, pending, answered, requests = await load_and_plan(file)
+
+    # Model prompts go through the shared worker, which batches them with other uploads
+    texts = await inference_worker.generate(requests)
+    answered.update((request.position, text) for request, text in zip(requests, texts))
+    processed_data = assemble_recommendations(pending, answered)
+    user_info = user_data[0] if user_data else {}
 
     # processed_data is a dict with 'tests' key
     final_output = {**user_info, **processed_data}
@@ -65,3 +87,82 @@ async def upload_file(file: UploadFile = File(...)):
     # # Convert to JSON-friendly format
     # result = processed_df.to_dict(orient="records")
     return JSONResponse(content={"data": final_output})
+
+
+@upload_router.post("/upload/stream")
+async def upload_file_stream(file: UploadFile = File(...), format: str = Query("ndjson", pattern="^(ndjson|sse)$")):
+    """Same pipeline as /upload, but each test is sent as soon as it is ready.
+
+    The first event is the patient header (Name, Age, ReportDate); every
+    following event is one {"name", "values", "recommendation", "status"} test.
+    Template-answered tests go out immediately, model ones as generation finishes.
+    """
+    user_data, pending, answered, requests = await load_and_plan(file)
+    user_info = user_data[0] if user_data else {}
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(upload_events(inference_worker, user_info, pending, answered, requests, format),
+                             media_type=media_type)
+
+
+@upload_router.post("/upload/patients")
+async def upload_file_patients(file: UploadFile = File(...)):
+    """Every patient in the file, one NDJSON line each, processed in fixed-size chunks.
+
+    Unlike /upload (first patient only), memory stays bounded by the chunk size:
+    a first pass computes whole-file means for imputation, the second flags,
+    plans and generates one chunk at a time.
+    """
+    buffer = await upload_buffer(file, copy=True)
+    try:
+        means, _ = await run_in_threadpool(feature_means, buffer, filename=file.filename)
+    except Exception as e:
+        buffer.close()
+        raise HTTPException(status_code=500, detail=f"Error reading uploaded file: {e}")
+
+    async def lines():
+        try:
+            chunks = plan_chunks(buffer, file_path, means, filename=file.filename)
+            while True:
+                planned = await run_in_threadpool(next, chunks, None)
+                if planned is None:
+                    return
+                texts = await inference_worker.generate(planned.requests)
+                answered = dict(planned.answered)
+                answered.update((request.position, text) for request, text in zip(planned.requests, texts))
+                for patient in patient_results(planned, answered):
+                    yield json.dumps(patient, default=str) + "\n"
+        finally:
+            buffer.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@upload_router.post("/upload/jobs", status_code=202)
+async def create_upload_job(file: UploadFile = File(...)):
+    """Queue a large upload for background processing; poll GET /upload/jobs/{id} for progress"""
+    # Jobs outlive the request, so each gets its own spooled copy of the upload
+    job = job_manager.submit(await upload_buffer(file, copy=True), file.filename)
+    return JSONResponse(status_code=202, content={"job_id": job.id, "status": job.status})
+
+
+@upload_router.get("/upload/jobs/{job_id}")
+async def get_upload_job(job_id: str):
+    """Job status, rows/categories done and the tests finished so far, one entry per patient"""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content=jsonable_snapshot(job))
+
+
+@upload_router.delete("/upload/jobs/{job_id}")
+async def cancel_upload_job(job_id: str):
+    """Cancel a queued or running job; tests already generated stay available"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JSONResponse(content={"job_id": job.id, "status": job.status})
+
+
+def jsonable_snapshot(job):
+    return json.loads(json.dumps(job.snapshot(), default=str))
@@ -0,0 +1,5 @@
+"""Shared test setup: the pipeline modules live in the repository's scripts folder"""
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "..", "scripts"))
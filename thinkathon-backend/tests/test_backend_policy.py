@@ -0,0 +1,75 @@
+# pylint: disable=import-error
+"""Test Cases for Backend Decoding Policies"""
+import decoding_policy
+import integrate_model_new
+from decoding_policy import DecodingPolicy
+from inference_backends import InferenceBackend, OnnxBackend
+
+
+class WordTokenizer:
+    """One token id per whitespace-separated word, then EOS"""
+
+    model_max_length = 512
+    eos_token_id = 1
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, max_length=None):
+        single = isinstance(texts, str)
+        ids = [[self.vocab.setdefault(word, len(self.vocab) + 2) for word in text.split()]
+               + ([self.eos_token_id] if add_special_tokens else []) for text in ([texts] if single else texts)]
+        return {"input_ids": ids[0] if single else ids}
+
+
+class GreedyBackend(InferenceBackend):
+    """Reports and runs greedy decoding with no adapter, like OnnxBackend"""
+
+    name = "greedy-only"
+    effective_policy = OnnxBackend.effective_policy
+
+    def __init__(self):
+        self.calls = []
+        self._tokenizer = WordTokenizer()
+
+    @property
+    def tokenizer(self):
+        return self._tokenizer
+
+    def generate(self, input_ids, max_length=150, num_beams=5, prefix_allowed_tokens_fn=None, adapter=None):
+        self.calls.append((num_beams, adapter))
+        return [f"text {len(ids)}" for ids in input_ids]
+
+
+def test_onnx_reports_greedy_without_adapter():
+    """Beam requests are reported as greedy and the adapter is dropped"""
+    backend = GreedyBackend()
+    beam = DecodingPolicy("beam5", 5, 48)
+    assert backend.effective_policy(beam, "lipid_profile") == (DecodingPolicy("greedy", 1, 48), None)
+    constrained = DecodingPolicy("beam5-constrained", 2, 48)
+    assert backend.effective_policy(constrained)[0].name == "greedy-constrained"
+
+
+def test_batch_caches_and_times_the_policy_that_ran(monkeypatch, tmp_path):
+    """Outputs are cached and timed under the backend's effective policy"""
+    backend = GreedyBackend()
+    monkeypatch.setattr(integrate_model_new, "load_backend", lambda: backend)
+    monkeypatch.setattr(integrate_model_new, "model_path", str(tmp_path / "model"))
+    monkeypatch.setattr(integrate_model_new, "adapters_path", str(tmp_path / "adapters"))
+    monkeypatch.setattr(integrate_model_new, "_recommendation_cache", None)
+    decoding_policy.reset_stats()
+
+    beam = DecodingPolicy("beam5", 5, 48)
+    texts = integrate_model_new.generate_recommendations_batch(["analyze: A: 1"], policies=[beam],
+                                                               constrained=False, adapters=["lipid_profile"])
+    assert texts == ["text 4"]
+    assert backend.calls == [(1, None)]
+    assert set(decoding_policy.policy_stats()) == {"greedy"}
+
+    cache = integrate_model_new.load_recommendation_cache()
+    assert cache.version.endswith("-greedy-only")
+    greedy = DecodingPolicy("greedy", 1, 48)
+    assert cache.get("analyze: A: 1", integrate_model_new.cache_variant(greedy)) == "text 4"
+    assert cache.get("analyze: A: 1", integrate_model_new.cache_variant(beam, "lipid_profile")) is None
+    decoding_policy.reset_stats()
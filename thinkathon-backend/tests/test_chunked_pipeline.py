@@ -0,0 +1,79 @@
+# pylint: disable=import-error
+"""Test Cases for the Chunked Pipeline"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from chunked_pipeline import PATIENT_COLUMNS, feature_means, plan_chunks, read_chunks
+from execution_plan import get_plan
+from integrate_model_new import plan_recommendations
+from prepare_ml_data import RunningMeans, prepare_features
+
+REFERENCE = os.path.join(os.path.dirname(__file__), "..", "..", "reference_excel.xlsx")
+
+REPORT = pd.DataFrame({
+    "Name": ["A", "B", "C", "D", "E"],
+    "Age": [30, 41, 52, 63, 74],
+    "Hemoglobin": [13.0, 9.5, np.nan, 15.0, 11.0],
+    # All-NaN in the first chunk of two rows
+    "Platelets": [np.nan, np.nan, 150.0, 420.0, 90.0],
+    "Glucose": ["99", "n/a", "140", "", "88"],
+})
+
+
+def write_report(tmp_path):
+    path = tmp_path / "report.csv"
+    REPORT.to_csv(path, index=False)
+    return str(path)
+
+
+def test_running_means_match_whole_frame():
+    """Chunk-by-chunk sums and counts give the whole frame's column means"""
+    features = REPORT.drop(columns=["Name"])
+    stats = RunningMeans()
+    for start in range(0, len(features), 2):
+        stats.update(features.iloc[start:start + 2])
+    expected = features.apply(pd.to_numeric, errors="coerce").mean()
+    pd.testing.assert_series_equal(stats.means()[expected.index], expected)
+    assert stats.rows == len(features)
+
+
+def test_chunked_imputation_matches_single_pass(tmp_path):
+    """Chunks imputed with whole-file means equal one prepare_features over the file"""
+    path = write_report(tmp_path)
+    means, rows = feature_means(path, chunksize=2)
+    assert rows == len(REPORT)
+
+    chunked = pd.concat([
+        prepare_features(chunk.drop(columns=[c for c in PATIENT_COLUMNS if c in chunk.columns]), means)[0]
+        for chunk in read_chunks(path, chunksize=2)
+    ])
+    whole = pd.read_csv(path)
+    single, _ = prepare_features(whole.drop(columns=[c for c in PATIENT_COLUMNS if c in whole.columns]))
+    pd.testing.assert_frame_equal(chunked, single, check_dtype=False)
+    assert not chunked.isna().any().any()
+
+
+def test_plan_chunks_matches_whole_file_plan(tmp_path):
+    """Every chunk's jobs together are the whole file's jobs, without loading a model"""
+    path = write_report(tmp_path)
+    means, _ = feature_means(path, chunksize=2)
+    chunked = [(job.row_index, job.category, job.prompt)
+               for planned in plan_chunks(path, REFERENCE, means, chunksize=2)
+               for job in planned.pending]
+
+    planned = list(plan_chunks(path, REFERENCE, means, chunksize=len(REPORT)))
+    assert len(planned) == 1
+    whole = [(job.row_index, job.category, job.prompt) for job in planned[0].pending]
+    assert chunked == whole
+    assert {request.adapter for p in planned for request in p.requests} <= {None}
+
+
+def test_plan_recommendations_needs_no_model():
+    """Planning every job for the model only reads adapter directories"""
+    features, flags = prepare_features(REPORT.drop(columns=["Name", "Age"]))
+    plan = get_plan(features.columns.tolist(), REFERENCE)
+    pending, answered, requests = plan_recommendations(features, flags, engine="model", plan=plan)
+    assert not answered
+    assert len(requests) == len(pending) > 0
@@ -0,0 +1,76 @@
+# pylint: disable=import-error
+"""Test Cases for Constrained Decoding"""
+from constrained_decoding import PhraseTrie, is_valid_output, template_sentences
+
+EOS, PAD, START = 1, 0, 0
+
+
+class WordTokenizer:
+    """One token id per word, enough to exercise the trie without a model"""
+
+    eos_token_id = EOS
+    pad_token_id = PAD
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, text, add_special_tokens=True):
+        ids = [self.vocab.setdefault(word, len(self.vocab) + 2) for word in text.split()]
+        return {"input_ids": ids + [EOS] if add_special_tokens else ids}
+
+
+SENTENCES = ["Hemoglobin is low.", "Hemoglobin is high.", "All normal."]
+
+
+def make_trie():
+    tokenizer = WordTokenizer()
+    return tokenizer, PhraseTrie(tokenizer, SENTENCES)
+
+
+def ids(tokenizer, text):
+    return [START] + tokenizer(text, add_special_tokens=False)["input_ids"]
+
+
+def test_start_allows_first_words_only():
+    """Decoding starts with the first token of some template sentence"""
+    tokenizer, trie = make_trie()
+    assert sorted(trie.allowed_tokens([START], {})) == sorted(tokenizer.vocab[w] for w in ("Hemoglobin", "All"))
+
+
+def test_branches_inside_a_sentence():
+    """After a shared prefix only the continuations of matching sentences are allowed"""
+    tokenizer, trie = make_trie()
+    allowed = trie.allowed_tokens(ids(tokenizer, "Hemoglobin is"), {})
+    assert sorted(allowed) == sorted([tokenizer.vocab["low."], tokenizer.vocab["high."]])
+
+
+def test_eos_or_next_sentence_after_a_full_sentence():
+    """A finished sentence may end the output or start another sentence"""
+    tokenizer, trie = make_trie()
+    allowed = trie.allowed_tokens(ids(tokenizer, "Hemoglobin is low."), {})
+    assert EOS in allowed
+    assert tokenizer.vocab["All"] in allowed
+
+
+def test_off_template_and_finished_outputs_only_pad():
+    """After EOS or an off-template token only padding is allowed"""
+    tokenizer, trie = make_trie()
+    assert trie.allowed_tokens(ids(tokenizer, "All normal.") + [EOS], {}) == [PAD]
+    assert trie.allowed_tokens(ids(tokenizer, "Hemoglobin normal."), {}) == [PAD]
+
+
+def test_prefix_fn_uses_a_fresh_memo():
+    """Each prefix_fn call gets its own memo and gives the same answers"""
+    tokenizer, trie = make_trie()
+    first, second = trie.prefix_fn(), trie.prefix_fn()
+    prefix = ids(tokenizer, "Hemoglobin")
+    assert first(0, prefix) == second(0, prefix) == [tokenizer.vocab["is"]]
+
+
+def test_template_sentences_and_validation():
+    """Outputs made of whole template sentences are valid, anything else is not"""
+    sentences = template_sentences({"CBC": {"Hemoglobin": (12, 17.5, "g/dL")}})
+    assert len(sentences) == 3
+    assert is_valid_output(" ".join(sentences[1:]), sentences)
+    assert not is_valid_output(sentences[1] + " extra", sentences)
+    assert not is_valid_output("", sentences)
@@ -0,0 +1,48 @@
+# pylint: disable=import-error
+"""Test Cases for the Execution Plan Cache"""
+import os
+
+import pandas as pd
+
+from execution_plan import clear_plans, get_plan, plan_cache_stats
+
+
+def write_workbook(path, high):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({"Parameter": ["Hemoglobin", "Platelets"], "Low": [12.0, 150.0], "High": [high, 450.0],
+                      "Unit": ["g/dL", "10^3/uL"]}).to_excel(writer, sheet_name="CBC", index=False)
+
+
+def test_plan_is_cached_per_header(tmp_path):
+    """The same header row hits the cache; a different header set misses"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    clear_plans()
+
+    plan = get_plan(["Name", "Hemoglobin", "Platelets"], path)
+    assert get_plan(["Name", "Hemoglobin", "Platelets"], path) is plan
+    other = get_plan(["Name", "Hemoglobin"], path)
+    assert other is not plan
+    assert plan_cache_stats() == {"plans": 2, "hits": 1, "misses": 2}
+
+    assert plan.flag_columns == ["Hemoglobin", "Platelets"]
+    assert plan.prompt_layout == [("CBC", ["Hemoglobin", "Platelets"])]
+    assert other.flag_columns == ["Hemoglobin"]
+    clear_plans()
+
+
+def test_changed_workbook_invalidates_plans(tmp_path):
+    """A workbook with new content gets new plans and its old ones are dropped"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    clear_plans()
+    old = get_plan(["Hemoglobin"], path)
+
+    write_workbook(path, 16.0)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10**9))
+    new = get_plan(["Hemoglobin"], path)
+    assert new is not old
+    assert new.high.tolist() == [16.0]
+    assert plan_cache_stats()["plans"] == 1
+    clear_plans()
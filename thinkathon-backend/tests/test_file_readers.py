@@ -0,0 +1,63 @@
+# pylint: disable=import-error
+"""Test Cases for Format Sniffing"""
+import io
+import os
+
+import pandas as pd
+import pytest
+
+from file_readers import read_table, read_table_chunks, sniff
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), "..", "..", "cbc_sample_report.pdf")
+FRAME = pd.DataFrame({"Hemoglobin": [13.5, 9.0], "Platelets": [250, 120]})
+
+
+def xlsx_bytes():
+    buffer = io.BytesIO()
+    FRAME.to_excel(buffer, index=False, engine="openpyxl")
+    return buffer.getvalue()
+
+
+@pytest.mark.parametrize("head,name", [
+    (b"PK\x03\x04rest", "xlsx"),
+    (b"\xd0\xcf\x11\xe0rest", "xls"),
+    (b"%PDF-1.7", "pdf"),
+    (b"PAR1rest", "parquet"),
+    (b"Hemoglobin,Platelets\n13.5,250\n", "csv"),
+])
+def test_sniff_picks_reader_by_magic_bytes(head, name):
+    """The reader comes from the first bytes, whatever the filename says"""
+    assert sniff(io.BytesIO(head), filename="report.csv").name == name
+
+
+@pytest.mark.parametrize("data", [b"", b"\x00\x01\x02binary", b"\x89PNG\r\n\x1a\n\x00\x00"])
+def test_unknown_formats_are_rejected(data):
+    """Empty and binary files no reader recognizes raise ValueError"""
+    with pytest.raises(ValueError, match="Unsupported"):
+        sniff(io.BytesIO(data))
+
+
+def test_xlsx_named_csv_is_read_as_excel():
+    """An Excel workbook uploaded with a .csv name is still parsed as Excel"""
+    df = read_table(io.BytesIO(xlsx_bytes()), filename="report.csv")
+    pd.testing.assert_frame_equal(df, FRAME)
+
+
+def test_csv_delimiter_is_sniffed():
+    """Semicolon-separated text is split on semicolons"""
+    df = read_table(io.BytesIO(b"Hemoglobin;Platelets\n13.5;250\n9.0;120\n"))
+    pd.testing.assert_frame_equal(df, FRAME)
+
+
+def test_pdf_is_read_as_one_report_row():
+    """A PDF lab report becomes one row of canonical parameters"""
+    df = read_table(SAMPLE_PDF)
+    assert len(df) == 1
+    assert "Hemoglobin" in df.columns
+
+
+def test_chunks_for_formats_without_streaming():
+    """Excel has no streaming reader, so it is read whole and sliced"""
+    chunks = list(read_table_chunks(io.BytesIO(xlsx_bytes()), chunksize=1))
+    assert [len(chunk) for chunk in chunks] == [1, 1]
+    pd.testing.assert_frame_equal(pd.concat(chunks), FRAME)
@@ -0,0 +1,75 @@
+# pylint: disable=import-error
+"""Test Cases for Range Flagging"""
+import numpy as np
+import pandas as pd
+
+from cleanup_script import flag_out_of_range
+from reference_index import ReferenceIndex
+
+CBC = {"CBC": ["Hemoglobin", "Platelets"]}
+
+
+def reference(rows):
+    return ReferenceIndex.from_frames({"CBC": pd.DataFrame(rows)})
+
+
+GENERAL = reference({
+    "Parameter": ["Hemoglobin", "Platelets"],
+    "Low": [12.0, 150.0],
+    "High": [17.5, 450.0],
+    "Unit": ["g/dL", "10^3/uL"],
+})
+
+# Hemoglobin has only sex specific rows, Platelets a general row and a child row
+DEMOGRAPHIC = reference({
+    "Parameter": ["Hemoglobin", "Hemoglobin", "Platelets", "Platelets"],
+    "Low": [12.0, 13.5, 150.0, 200.0],
+    "High": [15.5, 17.5, 450.0, 500.0],
+    "Sex": ["F", "M", None, None],
+    "Age Min": [None, None, None, 0],
+    "Age Max": [None, None, None, 12],
+})
+
+
+def flags(df, index):
+    out = flag_out_of_range(df, index, CBC)
+    return {col: out[f"{col}_Flag"].astype(str).tolist() for col in CBC["CBC"]}
+
+
+def test_flags_low_high_and_normal():
+    """Values are compared with the reference range of their parameter"""
+    df = pd.DataFrame({"Hemoglobin": [11.0, 14.0, 18.0], "Platelets": [200.0, 100.0, 500.0]})
+    assert flags(df, GENERAL) == {
+        "Hemoglobin": ["Low", "Normal", "High"],
+        "Platelets": ["Normal", "Low", "High"],
+    }
+
+
+def test_missing_and_non_numeric_values():
+    """Missing values count as Normal and non-numeric ones as Invalid"""
+    df = pd.DataFrame({"Hemoglobin": ["abc", None], "Platelets": [np.nan, "200"]})
+    assert flags(df, GENERAL) == {"Hemoglobin": ["Invalid", "Normal"], "Platelets": ["Normal", "Normal"]}
+
+
+def test_sex_specific_ranges():
+    """Each row uses the range for its Sex"""
+    df = pd.DataFrame({"Sex": ["F", "M"], "Age": [40, 40], "Hemoglobin": [13.0, 13.0], "Platelets": [200, 200]})
+    assert flags(df, DEMOGRAPHIC)["Hemoglobin"] == ["Normal", "Low"]
+
+
+def test_sex_only_range_applies_without_age():
+    """A sex-only range is used when the row has no Age"""
+    df = pd.DataFrame({"Sex": ["Female"], "Age": [np.nan], "Hemoglobin": [13.0], "Platelets": [200]})
+    assert flags(df, DEMOGRAPHIC)["Hemoglobin"] == ["Normal"]
+
+
+def test_sex_row_is_not_a_default():
+    """Without a Sex, a parameter with only sex specific rows is not flagged"""
+    df = pd.DataFrame({"Hemoglobin": [13.0, 16.0], "Platelets": [200, 200]})
+    assert flags(df, DEMOGRAPHIC)["Hemoglobin"] == ["Normal", "Normal"]
+
+
+def test_age_specific_ranges():
+    """Rows inside an age band use its range, the rest the general range"""
+    df = pd.DataFrame({"Age": [8, 40, np.nan], "Hemoglobin": [np.nan] * 3, "Platelets": [180, 180, 480]})
+    assert flags(df, DEMOGRAPHIC)["Platelets"] == ["Low", "Normal", "High"]
@@ -0,0 +1,111 @@
+# pylint: disable=import-error
+"""Test Cases for the Inference Worker"""
+import asyncio
+import threading
+from collections import namedtuple
+
+import pytest
+
+import inference_worker as worker_module
+from inference_worker import InferenceWorker
+
+Request = namedtuple("Request", ["prompt", "policy", "adapter"])
+
+
+def requests(n):
+    return [Request(f"analyze: A: {i}", None, None) for i in range(n)]
+
+
+def test_batches_concurrent_requests(monkeypatch):
+    """Requests submitted together are answered in order from one generate call"""
+    calls = []
+
+    def fake_batch(prompts, policies=None, adapters=None):
+        calls.append(list(prompts))
+        return [prompt.upper() for prompt in prompts]
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", fake_batch)
+
+    async def run():
+        worker = InferenceWorker(max_batch_size=8, max_wait_ms=10)
+        try:
+            return await worker.generate(requests(3))
+        finally:
+            await worker.stop()
+
+    assert asyncio.run(run()) == ["ANALYZE: A: 0", "ANALYZE: A: 1", "ANALYZE: A: 2"]
+    assert len(calls) == 1
+
+
+def test_stop_fails_the_in_flight_batch(monkeypatch):
+    """stop() resolves the futures of a batch that is still generating"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_batch(prompts, policies=None, adapters=None):
+        started.set()
+        release.wait(5)
+        return ["late"] * len(prompts)
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", slow_batch)
+
+    async def run():
+        worker = InferenceWorker(max_batch_size=8, max_wait_ms=1)
+        pending = asyncio.ensure_future(worker.generate(requests(2)))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        await worker.stop()
+        release.set()
+        with pytest.raises(RuntimeError, match="stopped"):
+            await asyncio.wait_for(pending, 1)
+
+    asyncio.run(run())
+
+
+def test_threadsafe_callers_are_released_on_stop(monkeypatch):
+    """A job thread waiting in generate_threadsafe fails instead of hanging at shutdown"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_batch(prompts, policies=None, adapters=None):
+        started.set()
+        release.wait(5)
+        return ["late"] * len(prompts)
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", slow_batch)
+
+    async def run():
+        worker = InferenceWorker(max_batch_size=8, max_wait_ms=1)
+        await worker.start()
+        loop = asyncio.get_running_loop()
+        job = loop.run_in_executor(None, worker.generate_threadsafe, requests(1), 5)
+        await loop.run_in_executor(None, started.wait, 5)
+        await worker.stop()
+        release.set()
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(job, 2)
+        with pytest.raises(RuntimeError, match="not running"):
+            worker.generate_threadsafe(requests(1))
+
+    asyncio.run(run())
+
+
+def test_threadsafe_wait_times_out(monkeypatch):
+    """generate_threadsafe gives up after its timeout"""
+    release = threading.Event()
+
+    def stuck_batch(prompts, policies=None, adapters=None):
+        release.wait(5)
+        return ["late"] * len(prompts)
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", stuck_batch)
+
+    async def run():
+        worker = InferenceWorker(max_batch_size=8, max_wait_ms=1)
+        await worker.start()
+        loop = asyncio.get_running_loop()
+        try:
+            with pytest.raises(RuntimeError, match="No recommendations"):
+                await loop.run_in_executor(None, worker.generate_threadsafe, requests(1), 0.1)
+        finally:
+            release.set()
+            await worker.stop()
+
+    asyncio.run(run())
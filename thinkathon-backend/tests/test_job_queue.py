@@ -0,0 +1,132 @@
+# pylint: disable=import-error
+"""Test Cases for the Upload Job Queue"""
+import asyncio
+import os
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+import inference_worker as worker_module
+import job_queue
+from inference_worker import InferenceWorker
+from job_queue import JobManager
+
+REFERENCE = os.path.join(os.path.dirname(__file__), "..", "..", "reference_excel.xlsx")
+
+REPORT = pd.DataFrame({
+    "Name": ["A", "B", "C"],
+    "Age": [30, 41, 52],
+    "Hemoglobin": [13.0, 9.5, 17.0],
+    "Platelets": [250000.0, 90000.0, 300000.0],
+    "Glucose": [99.0, 140.0, 88.0],
+})
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    """A started InferenceWorker on its own event loop thread, used by every job"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    running = InferenceWorker(max_batch_size=8, max_wait_ms=1)
+    asyncio.run_coroutine_threadsafe(running.start(), loop).result(5)
+    monkeypatch.setattr(job_queue, "inference_worker", running)
+    yield running
+    asyncio.run_coroutine_threadsafe(running.stop(), loop).result(5)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+    loop.close()
+
+
+def write_report(tmp_path):
+    path = tmp_path / "report.csv"
+    REPORT.to_csv(path, index=False)
+    return str(path)
+
+
+def wait_for(job, statuses=("done", "failed", "cancelled"), timeout=10):
+    deadline = time.monotonic() + timeout
+    while job.status not in statuses:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job.snapshot()
+
+
+def test_job_runs_to_done(tmp_path, monkeypatch, worker):
+    """A submitted upload is generated through the worker and reported per patient"""
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch",
+                        lambda prompts, policies=None, adapters=None: ["Recommended."] * len(prompts))
+    manager = JobManager(REFERENCE, max_workers=1)
+    try:
+        job = manager.submit(write_report(tmp_path), "report.csv")
+        snapshot = wait_for(job)
+    finally:
+        manager.shutdown()
+
+    assert snapshot["status"] == "done" and snapshot["error"] is None
+    progress = snapshot["progress"]
+    assert progress["rows_total"] == progress["rows_done"] == len(REPORT)
+    assert progress["categories_done"] == progress["categories_total"] > 0
+    assert [patient["Name"] for patient in snapshot["results"]] == list(REPORT["Name"])
+    assert all(patient["tests"] for patient in snapshot["results"])
+    assert job.source is None
+
+
+def test_generation_error_fails_the_job(tmp_path, monkeypatch, worker):
+    """An exception from generation marks the job failed with its message"""
+    def broken_batch(prompts, policies=None, adapters=None):
+        raise ValueError("model exploded")
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", broken_batch)
+    manager = JobManager(REFERENCE, max_workers=1)
+    try:
+        snapshot = wait_for(manager.submit(write_report(tmp_path), "report.csv"))
+    finally:
+        manager.shutdown()
+    assert snapshot["status"] == "failed"
+    assert "model exploded" in snapshot["error"]
+
+
+def test_unreadable_source_fails_the_job(tmp_path, worker):
+    """A source that cannot be read fails the job instead of the pool thread"""
+    manager = JobManager(REFERENCE, max_workers=1)
+    try:
+        snapshot = wait_for(manager.submit(str(tmp_path / "missing.csv"), "missing.csv"))
+    finally:
+        manager.shutdown()
+    assert snapshot["status"] == "failed" and snapshot["error"]
+
+
+def test_cancel_queued_and_running_jobs(tmp_path, monkeypatch, worker):
+    """cancel (DELETE /upload/jobs/{id}) stops a running job and skips a queued one"""
+    started, release = threading.Event(), threading.Event()
+
+    def slow_batch(prompts, policies=None, adapters=None):
+        started.set()
+        release.wait(5)
+        return ["Recommended."] * len(prompts)
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", slow_batch)
+    monkeypatch.setattr(job_queue, "UPLOAD_JOB_CHUNK", 1)
+    manager = JobManager(REFERENCE, max_workers=1)
+    try:
+        path = write_report(tmp_path)
+        running = manager.submit(path, "report.csv")
+        queued = manager.submit(path, "report.csv")
+        assert started.wait(5)
+
+        assert manager.cancel(queued.id).status == "cancelled"
+        manager.cancel(running.id)
+        release.set()
+        snapshot = wait_for(running)
+        wait_for(queued)
+    finally:
+        release.set()
+        manager.shutdown()
+
+    assert snapshot["status"] == "cancelled"
+    assert 0 < snapshot["progress"]["categories_done"] < snapshot["progress"]["categories_total"]
+    assert queued.snapshot()["progress"]["categories_done"] == 0
+    assert manager.cancel("no-such-job") is None
@@ -0,0 +1,56 @@
+# pylint: disable=import-error
+"""Test Cases for Header Resolution"""
+import pytest
+
+from map_categories import map_columns_to_categories, resolve_header
+
+CBC_HEADERS = {
+    "White Blood Cells": "White Blood Cells",
+    "Neutrophils (%)": "Neutrophils",
+    "Lymphs (Absolute)": "Lymphocytes",
+    "Monocytes(Absolute)": "Monocytes",
+    "HCT (Hematocrit)": "Hematocrit",
+    "RDW": "Red Cell Distribution Width",
+    "Immature Grans (Abs)": "Immature Granulocytes",
+    "Total WBC count": "White Blood Cells",
+    "Hemoglobn": "Hemoglobin",
+}
+
+# Headers that share words with an alias but name a different test
+OTHER_TESTS = [
+    "Hemoglobin A1c",
+    "Non-HDL Cholesterol",
+    "VLDL Cholesterol",
+    "Cholesterol/HDL Ratio",
+    "Urine Creatinine",
+    "Albumin/Creatinine Ratio",
+    "BUN/Creatinine Ratio",
+    "Platelet Distribution Width",
+    "Heart Rate Variability",
+    "C-Reactive Protein, Cardiac",
+    "Creatinine, Serum",
+    "eGFR If NonAfricn Am",
+    "eGFR If Africn Am",
+]
+
+
+@pytest.mark.parametrize("header,canonical", CBC_HEADERS.items())
+def test_resolves_cbc_headers(header, canonical):
+    """Aliases, qualifiers and typos resolve to the CBC parameter"""
+    assert resolve_header(header) == (canonical, "CBC")
+
+
+@pytest.mark.parametrize("header", OTHER_TESTS)
+def test_rejects_headers_with_extra_words(header):
+    """A header with words the alias does not cover is not that parameter"""
+    assert resolve_header(header) is None
+
+
+def test_map_columns_keeps_other_tests_uncategorized():
+    """Columns of other tests stay out of the CBC, Lipid and Organ Function prompts"""
+    mapping = map_columns_to_categories(["Hemoglobin", "Hemoglobin A1c", "Creatinine", "BUN/Creatinine Ratio", "Age"])
+    assert mapping == {
+        "CBC": ["Hemoglobin"],
+        "Organ Function Tests": ["Creatinine"],
+        "Uncategorized": ["Hemoglobin A1c", "BUN/Creatinine Ratio", "Age"],
+    }
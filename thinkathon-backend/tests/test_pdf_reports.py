@@ -0,0 +1,62 @@
+# pylint: disable=import-error
+"""Test Cases for PDF Lab Reports"""
+import os
+
+import pytest
+
+import pdf_reports
+from pdf_reports import extract_pages, page_ranges, parse_lines
+
+SAMPLE = os.path.join(os.path.dirname(__file__), "..", "..", "cbc_sample_report.pdf")
+
+
+def test_parse_lines_reads_results_and_age():
+    """Result lines, values on the next line and the printed age are read"""
+    lines = [
+        "Patient: Jane Doe   Age : 42 Years",
+        "Hemoglobin (Hb) 12.5 Low 13.0 - 17.0 g/dL",
+        "Platelet Count",
+        "150.00 Normal 150 - 410 10^3/uL",
+        "Page 1 of 2",
+    ]
+    results, age = parse_lines(lines)
+    assert age == 42
+    assert results["Hemoglobin"] == (12.5, "g/dL")
+    assert results["Platelets"][0] == 150.0
+
+
+def test_parse_lines_keeps_first_value():
+    """A parameter printed twice keeps its first value"""
+    results, age = parse_lines(["Hemoglobin 12.5 g/dL", "Hemoglobin 99 g/dL"])
+    assert results == {"Hemoglobin": (12.5, "g/dL")}
+    assert age is None
+
+
+@pytest.mark.parametrize("count,workers,expected", [
+    (0, 4, []),
+    (1, 4, [(0, 1)]),
+    (2, 4, [(0, 1), (1, 2)]),
+    (10, 4, [(0, 3), (3, 6), (6, 9), (9, 10)]),
+    (10, 1, [(0, 10)]),
+])
+def test_page_ranges_cover_every_page_once(count, workers, expected):
+    """Pages are split into at most `workers` contiguous ranges"""
+    assert page_ranges(count, workers) == expected
+
+
+def test_pool_extraction_matches_sequential(monkeypatch):
+    """The shared pool returns the same text as reading in this process, and is reused"""
+    with open(SAMPLE, "rb") as f:
+        data = f.read()
+    sequential = extract_pages(data)
+
+    monkeypatch.setattr(pdf_reports, "PDF_WORKERS", 2)
+    monkeypatch.setattr(pdf_reports, "PDF_PARALLEL_MIN_PAGES", 1)
+    try:
+        assert extract_pages(data) == sequential
+        pool = pdf_reports.get_pool()
+        assert extract_pages(data) == sequential
+        assert pdf_reports.get_pool() is pool
+    finally:
+        pdf_reports.shutdown_pool()
+    assert pdf_reports._pool is None
@@ -0,0 +1,48 @@
+# pylint: disable=import-error
+"""Test Cases for Columnar Feature Preparation"""
+import numpy as np
+import pandas as pd
+
+from flag_codes import FLAG_LABELS, HIGH, INVALID, LOW, NORMAL, UNKNOWN
+from prepare_ml_data import prepare_features
+
+REPORT = pd.DataFrame({
+    "Hemoglobin": [13.5, np.nan, 9.0, 15.25],
+    "Platelets": ["250", "n/a", None, "410"],
+    "Glucose": [99, 140, 88, 101],
+    "Notes": ["x", "y", None, "z"],
+    "Empty": [np.nan] * 4,
+    "Hemoglobin_Flag": pd.Categorical(["Normal", "Normal", "Low", "High"], categories=FLAG_LABELS),
+    "Platelets_Flag": ["Normal", "Invalid", "", None],
+})
+
+
+def baseline_features(df):
+    # prepare_data before the fused pass: drop flags, coerce, fill with column means
+    features = df.drop(columns=[col for col in df.columns if col.endswith("_Flag")])
+    features = features.apply(pd.to_numeric, errors="coerce")
+    return features.fillna(features.mean())
+
+
+def test_features_match_baseline_coerce_and_fillna():
+    """The fused pass gives the same numbers as coerce + fillna(mean)"""
+    features, _ = prepare_features(REPORT.copy())
+    pd.testing.assert_frame_equal(features, baseline_features(REPORT), check_dtype=False)
+    assert (features.dtypes == np.float64).all()
+
+
+def test_flags_are_int8_codes():
+    """Categorical and string flag columns become the same int8 codes"""
+    _, flags = prepare_features(REPORT.copy())
+    assert flags["Hemoglobin_Flag"].tolist() == [NORMAL, NORMAL, LOW, HIGH]
+    assert flags["Platelets_Flag"].tolist() == [NORMAL, INVALID, NORMAL, UNKNOWN]
+    assert (flags.dtypes == np.int8).all()
+
+
+def test_means_override_per_frame_means():
+    """Given means (e.g. whole-file ones) are used for imputation"""
+    features, _ = prepare_features(REPORT.drop(columns=["Hemoglobin_Flag", "Platelets_Flag"]),
+                                   means={"Hemoglobin": 1.0, "Platelets": 2.0})
+    assert features["Hemoglobin"].tolist() == [13.5, 1.0, 9.0, 15.25]
+    assert features["Platelets"].tolist() == [250.0, 2.0, 2.0, 410.0]
+    assert features["Glucose"].tolist() == [99.0, 140.0, 88.0, 101.0]
@@ -0,0 +1,105 @@
+# pylint: disable=import-error
+"""Test Cases for the Prompt Encoder"""
+import numpy as np
+
+from prompt_encoder import PromptEncoder, pad_batch, prompt_encoder, release_encoder
+
+PROMPTS = [
+    "analyze: White Blood Cells: 7695.25; HCT (Hematocrit): 43.35; Glucose: 99",
+    "analyze: Hemoglobin: 12.0 g/dL",
+    "analyze: Hemoglobin: 13.5; Platelets: 250",
+    "not a lab prompt",
+]
+
+
+class WordTokenizer:
+    """One token id per whitespace-separated word, then EOS (splits like T5)"""
+
+    model_max_length = 512
+    eos_token_id = 1
+    pad_token_id = 0
+
+    def __init__(self):
+        self.vocab = {}
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, max_length=None):
+        single = isinstance(texts, str)
+        ids = [self.encode_words(text.split(), add_special_tokens, truncation, max_length)
+               for text in ([texts] if single else texts)]
+        return {"input_ids": ids[0] if single else ids}
+
+    def encode_words(self, words, add_special_tokens, truncation, max_length):
+        ids = [self.vocab.setdefault(word, len(self.vocab) + 2) for word in words]
+        if truncation:
+            ids = ids[:(max_length or self.model_max_length) - 1]
+        return ids + ([self.eos_token_id] if add_special_tokens else [])
+
+
+def test_release_drops_the_encoder():
+    """A released tokenizer gets a fresh encoder with an empty fragment cache"""
+    tokenizer = WordTokenizer()
+    encoder = prompt_encoder(tokenizer)
+    encoder.encode(["analyze: Hemoglobin: 12"])
+    assert prompt_encoder(tokenizer) is encoder
+
+    release_encoder(tokenizer)
+    fresh = prompt_encoder(tokenizer)
+    assert fresh is not encoder
+    assert not fresh._fragments and not fresh._values
+    release_encoder()
+
+
+class PairTokenizer(WordTokenizer):
+    """Joins every two words into one token, so fragments do not tokenize independently"""
+
+    def __call__(self, texts, add_special_tokens=True, truncation=False, max_length=None):
+        single = isinstance(texts, str)
+        ids = []
+        for text in ([texts] if single else texts):
+            words = text.split()
+            pairs = [" ".join(words[i:i + 2]) for i in range(0, len(words), 2)]
+            ids.append(self.encode_words(pairs, add_special_tokens, truncation, max_length))
+        return {"input_ids": ids[0] if single else ids}
+
+
+def test_split_separates_fixed_text_and_values():
+    """Fixed fragments end at the parameter's colon; values carry the separator"""
+    assert PromptEncoder.split("analyze: Hemoglobin: 12.0 g/dL; HCT (Hematocrit): 43.35") == (
+        ["analyze: Hemoglobin:", "HCT (Hematocrit):"], ["12.0 g/dL;", "43.35"])
+    assert PromptEncoder.split("Hemoglobin: 12") is None
+    assert PromptEncoder.split("analyze: Hemoglobin 12") is None
+
+
+def test_fragments_concatenate_to_full_prompt_ids():
+    """Cached fragment ids joined together equal tokenizing each whole prompt"""
+    tokenizer = WordTokenizer()
+    encoder = PromptEncoder(tokenizer)
+    assert encoder.exact
+    for _ in range(2):
+        assert encoder.encode(PROMPTS) == tokenizer(PROMPTS, truncation=True)["input_ids"]
+
+
+def test_truncation_keeps_room_for_eos():
+    """Long prompts are cut like tokenizer(..., truncation=True, max_length=...)"""
+    tokenizer = WordTokenizer()
+    encoder = PromptEncoder(tokenizer, max_length=6)
+    assert encoder.exact
+    ids = encoder.encode([PROMPTS[0]])[0]
+    assert len(ids) == 6 and ids[-1] == WordTokenizer.eos_token_id
+    assert ids == tokenizer(PROMPTS[0], truncation=True, max_length=6)["input_ids"]
+
+
+def test_non_splitting_tokenizer_encodes_whole_prompts():
+    """A tokenizer that merges across words fails the self-check and gets whole prompts"""
+    tokenizer = PairTokenizer()
+    encoder = PromptEncoder(tokenizer)
+    assert not encoder.exact
+    assert encoder.encode(PROMPTS) == tokenizer(PROMPTS, truncation=True)["input_ids"]
+
+
+def test_pad_batch_right_pads_with_mask():
+    """Rows are right-padded to the longest one with a matching attention mask"""
+    ids, mask = pad_batch([[5, 6, 1], [7, 1]], pad_id=0)
+    assert ids.tolist() == [[5, 6, 1], [7, 1, 0]]
+    assert mask.tolist() == [[1, 1, 1], [1, 1, 0]]
+    assert ids.dtype == mask.dtype == np.int64
@@ -0,0 +1,39 @@
+# pylint: disable=import-error
+"""Test Cases for the Recommendation Cache"""
+from recommendation_cache import RecommendationCache, canonical_prompt
+
+
+def test_canonical_prompt_sorts_parameters():
+    """Parameter order does not change the canonical prompt"""
+    assert canonical_prompt("analyze: B: 2; A: 1", "sorted") == canonical_prompt("analyze: A: 1; B: 2", "sorted")
+    assert canonical_prompt("analyze: B: 2; A: 1", "input") == "analyze: B: 2; A: 1"
+
+
+def test_canonical_prompt_keeps_exact_values():
+    """Trailing zeros are dropped but no digits are rounded away by default"""
+    assert canonical_prompt("analyze: Hemoglobin: 12.250 g/dL") == "analyze: Hemoglobin: 12.25 g/dL"
+    assert canonical_prompt("analyze: Hemoglobin: 12.0") == "analyze: Hemoglobin: 12"
+    assert canonical_prompt("analyze: Hemoglobin: 11.996") != canonical_prompt("analyze: Hemoglobin: 12.0")
+
+
+def test_canonical_prompt_rounds_when_asked():
+    """decimals rounds numeric values and keeps units and non-numeric values"""
+    assert canonical_prompt("analyze: Neutrophils: 56.2201 %", decimals=2) == "analyze: Neutrophils: 56.22 %"
+    assert canonical_prompt("analyze: Result: positive", decimals=2) == "analyze: Result: positive"
+
+
+def test_key_separates_variant_and_version():
+    """The same prompt keys differently per decoding variant and adapter version"""
+    cache = RecommendationCache("v1", db_path="")
+    prompt = "analyze: Hemoglobin: 12; Platelets: 250"
+    assert cache.key(prompt, "beam5") == cache.key("analyze: Platelets: 250; Hemoglobin: 12.0", "beam5")
+    assert cache.key(prompt, "beam5") != cache.key(prompt, "greedy")
+    assert cache.key(prompt, "beam5") != RecommendationCache("v2", db_path="").key(prompt, "beam5")
+
+
+def test_get_after_put():
+    """A stored recommendation is returned for the same prompt and variant only"""
+    cache = RecommendationCache("v1", db_path="")
+    cache.put("analyze: A: 1", "text", "beam5")
+    assert cache.get("analyze: A: 1", "beam5") == "text"
+    assert cache.get("analyze: A: 1", "greedy") is None
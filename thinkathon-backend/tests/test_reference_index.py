@@ -0,0 +1,78 @@
+# pylint: disable=import-error
+"""Test Cases for the Compiled Reference Index"""
+import os
+
+import pandas as pd
+import pytest
+
+import reference_index
+from reference_index import ReferenceIndex, cache_path_for, load_reference_index
+
+
+def write_workbook(path, high):
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        pd.DataFrame({"Parameter": ["Hemoglobin"], "Low": [12.0], "High": [high], "Unit": ["g/dL"]}) \
+            .to_excel(writer, sheet_name="CBC", index=False)
+
+
+def bump_mtime(path, seconds):
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + seconds * 10**9))
+
+
+def test_index_is_compiled_once_and_cached(tmp_path):
+    """The first load writes the .npz next to the workbook; later loads reuse the index"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    index = load_reference_index(path)
+    assert os.path.exists(cache_path_for(path))
+    assert index.sheets() == {"CBC": {"Hemoglobin": (12.0, 17.5, "g/dL")}}
+    assert load_reference_index(path) is index
+
+
+def test_changed_workbook_rebuilds_the_index(tmp_path):
+    """New content with a new mtime is recompiled and the .npz is rewritten"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    first = load_reference_index(path)
+
+    write_workbook(path, 16.0)
+    bump_mtime(path, 5)
+    second = load_reference_index(path)
+    assert second is not first
+    assert second.sheets()["CBC"]["Hemoglobin"][1] == 16.0
+    assert ReferenceIndex.load(cache_path_for(path)).source_hash == second.source_hash != first.source_hash
+
+
+def test_touched_workbook_reuses_the_npz(tmp_path, monkeypatch):
+    """A new mtime with the same content loads the cached .npz instead of the workbook"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    first = load_reference_index(path)
+
+    def no_workbook(*args, **kwargs):
+        raise AssertionError("workbook should not be re-read")
+
+    monkeypatch.setattr(reference_index.ReferenceIndex, "from_workbook", no_workbook)
+    bump_mtime(path, 5)
+    second = load_reference_index(path)
+    assert second is not first
+    assert second.source_hash == first.source_hash
+    assert second.sheets() == first.sheets()
+
+
+def test_unreadable_cache_is_rebuilt(tmp_path):
+    """A corrupt .npz is ignored and replaced"""
+    path = str(tmp_path / "reference.xlsx")
+    write_workbook(path, 17.5)
+    with open(cache_path_for(path), "wb") as f:
+        f.write(b"not an npz")
+    index = load_reference_index(path)
+    assert index.sheets()["CBC"]["Hemoglobin"] == (12.0, 17.5, "g/dL")
+    assert ReferenceIndex.load(cache_path_for(path)).source_hash == index.source_hash
+
+
+def test_missing_workbook_raises(tmp_path):
+    """A missing workbook is an error, not an empty index"""
+    with pytest.raises(FileNotFoundError):
+        load_reference_index(str(tmp_path / "missing.xlsx"))
@@ -0,0 +1,28 @@
+# pylint: disable=import-error
+"""Test Cases for Synthetic Training Data"""
+import numpy as np
+
+import synthetic_data
+from synthetic_data import HIGH, LOW, NORMAL, draw_values, generate_sheet
+
+PARAMS = {"Hemoglobin": (12.0, 17.5, "g/dL"), "Estimated CHD Risk": (np.nan, np.nan, ""), "CRP": (0.0, 3.0, "mg/L")}
+
+
+def test_labels_follow_the_draw():
+    """Missing bounds are always Normal; out-of-range draws are Low/High even at a zero bound"""
+    low = np.array([12.0, np.nan, 0.0])
+    high = np.array([17.5, np.nan, 3.0])
+    values, status, _ = draw_values(low, high, 5000, np.random.default_rng(0))
+    assert set(np.unique(status[:, 1])) == {NORMAL}
+    assert (values[status[:, 2] == LOW, 2] == 0).all()
+    assert (status[:, 2] == LOW).any()
+    assert ((status[:, 0] == HIGH) == (values[:, 0] > 17.5)).all()
+
+
+def test_object_fallback_matches_string_dtype(monkeypatch):
+    """NumPy 1.x object arrays render the same examples as StringDType"""
+    expected = [a.tolist() for a in generate_sheet(PARAMS, "Cardiac", 200, np.random.default_rng(3))]
+    monkeypatch.setattr(synthetic_data, "STRING", object)
+    fallback = [a.tolist() for a in generate_sheet(PARAMS, "Cardiac", 200, np.random.default_rng(3))]
+    assert fallback == expected
+    assert "All Cardiac parameters are within normal ranges. Maintain a healthy lifestyle." in expected[1]
@@ -0,0 +1,72 @@
+# pylint: disable=import-error
+"""Test Cases for Template Recommendations"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from cleanup_script import flag_out_of_range
+from execution_plan import get_plan
+from flag_codes import HIGH, INVALID, LOW, NORMAL
+from integrate_model_new import plan_recommendations
+from prepare_ml_data import prepare_features
+from template_engine import HIGH_TEMPLATE, LOW_TEMPLATE, NORMAL_TEMPLATE, render_category
+
+REFERENCE = os.path.join(os.path.dirname(__file__), "..", "..", "reference_excel.xlsx")
+
+COLUMNS = ["Hemoglobin", "Platelets"]
+
+
+def render(values, flags):
+    df = pd.DataFrame(values, columns=COLUMNS)
+    flags = pd.DataFrame(np.array(flags, dtype=np.int8), columns=[f"{col}_Flag" for col in COLUMNS])
+    return render_category(df, flags, "CBC", COLUMNS)
+
+
+def test_flagged_parameters_get_one_sentence_each():
+    """Low and High flags render their template sentences in column order"""
+    texts, covered = render([[9.0, 500.0]], [[LOW, HIGH]])
+    assert texts[0] == (LOW_TEMPLATE.format(param="Hemoglobin") + " "
+                        + HIGH_TEMPLATE.format(param="Platelets"))
+    assert covered[0]
+
+
+def test_all_normal_renders_category_sentence():
+    """A row with no Low/High flag gets the category's normal sentence"""
+    texts, covered = render([[14.0, 250.0]], [[NORMAL, NORMAL]])
+    assert texts[0] == NORMAL_TEMPLATE.format(category="CBC")
+    assert covered[0]
+
+
+def test_invalid_flag_needs_the_model():
+    """A value flagged Invalid is not covered by the templates"""
+    _, covered = render([[14.0, 250.0], [14.0, 250.0]], [[NORMAL, INVALID], [NORMAL, NORMAL]])
+    assert covered.tolist() == [False, True]
+
+
+def test_missing_value_is_skipped():
+    """A missing value adds no sentence and does not need a flag"""
+    texts, covered = render([[9.0, np.nan]], [[LOW, INVALID]])
+    assert texts[0] == LOW_TEMPLATE.format(param="Hemoglobin")
+    assert covered[0]
+
+
+def test_missing_flag_column_needs_the_model():
+    """A parameter with a value but no flag column is not covered"""
+    df = pd.DataFrame({"Hemoglobin": [14.0], "Platelets": [250.0]})
+    flags = pd.DataFrame({"Hemoglobin_Flag": np.array([NORMAL], dtype=np.int8)})
+    _, covered = render_category(df, flags, "CBC", COLUMNS)
+    assert not covered[0]
+
+
+def test_templates_are_opt_in():
+    """Without RECOMMENDATION_ENGINE every job goes to the model; "hybrid" opts into templates"""
+    df = pd.DataFrame({"Hemoglobin": [9.0, 14.0], "Platelets": [250.0, 250.0]})
+    plan = get_plan(df.columns.tolist(), REFERENCE)
+    df = flag_out_of_range(df, plan.index, plan.category_mapping, plan=plan)
+    features, flags = prepare_features(df)
+    pending, answered, requests = plan_recommendations(features, flags, plan=plan)
+    assert not answered and len(requests) == len(pending)
+
+    _, answered, requests = plan_recommendations(features, flags, engine="hybrid", plan=plan)
+    assert len(answered) == len(pending) and not requests
@@ -0,0 +1,83 @@
+# pylint: disable=import-error
+"""Test Cases for the Upload Store"""
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+import upload_store
+from upload_store import UploadTooLarge, check_size, cleanup_expired, persist, spooled_copy
+
+REPORT = b"Name,Age,Hemoglobin\nA,30,13.0\nB,41,9.5\n"
+
+
+def test_spooled_copy_keeps_content_and_rewinds():
+    """The copy holds the whole upload and both files are left at position 0"""
+    upload = io.BytesIO(REPORT)
+    upload.seek(5)
+    copy = spooled_copy(upload)
+    try:
+        assert copy.read() == REPORT
+        assert upload.tell() == 0
+    finally:
+        copy.close()
+
+
+def test_spooled_copy_moves_large_uploads_to_disk(monkeypatch):
+    """Copies over UPLOAD_SPOOL_BYTES roll over to a temp file with the same bytes"""
+    monkeypatch.setattr(upload_store, "UPLOAD_SPOOL_BYTES", 16)
+    copy = spooled_copy(io.BytesIO(REPORT))
+    try:
+        assert copy._rolled  # pylint: disable=protected-access
+        assert copy.read() == REPORT
+    finally:
+        copy.close()
+
+
+def test_oversized_uploads_are_rejected():
+    """Uploads over the limit raise UploadTooLarge before anything is copied"""
+    with pytest.raises(UploadTooLarge):
+        spooled_copy(io.BytesIO(REPORT), max_bytes=len(REPORT) - 1)
+    assert check_size(io.BytesIO(REPORT), max_bytes=len(REPORT)).tell() == 0
+
+
+def test_persist_is_disabled_by_default(tmp_path):
+    """Without UPLOAD_PERSIST nothing is written"""
+    assert persist(io.BytesIO(REPORT), "report.csv", upload_dir=str(tmp_path / "uploads")) is None
+    assert not (tmp_path / "uploads").exists()
+
+
+def test_identical_uploads_share_one_file(tmp_path, monkeypatch):
+    """Spooled copies with the same bytes persist to one <sha256><ext> file"""
+    monkeypatch.setattr(upload_store, "UPLOAD_PERSIST", True)
+    upload_dir = str(tmp_path)
+    first = spooled_copy(io.BytesIO(REPORT))
+    second = spooled_copy(io.BytesIO(REPORT))
+    try:
+        path = persist(first, "Report.CSV", upload_dir=upload_dir)
+        assert persist(second, "other name.csv", upload_dir=upload_dir) == path
+        assert first.read() == second.read() == REPORT
+    finally:
+        first.close()
+        second.close()
+
+    assert os.path.basename(path) == hashlib.sha256(REPORT).hexdigest() + ".csv"
+    assert os.listdir(upload_dir) == [os.path.basename(path)]
+    with open(path, "rb") as f:
+        assert f.read() == REPORT
+
+    other = persist(io.BytesIO(REPORT + b"C,52,17.0\n"), "report.csv", upload_dir=upload_dir)
+    assert other != path and len(os.listdir(upload_dir)) == 2
+
+
+def test_cleanup_removes_only_expired_uploads(tmp_path):
+    """Files older than the TTL are removed; recent ones stay"""
+    old, new = tmp_path / "old.csv", tmp_path / "new.csv"
+    old.write_bytes(REPORT)
+    new.write_bytes(REPORT)
+    stale = time.time() - 3600
+    os.utime(old, (stale, stale))
+    assert cleanup_expired(str(tmp_path), ttl_seconds=60) == 1
+    assert os.listdir(tmp_path) == ["new.csv"]
@@ -0,0 +1,127 @@
+# pylint: disable=import-error
+"""Test Cases for the Upload Stream Events"""
+import asyncio
+import json
+import os
+import threading
+
+import pandas as pd
+import pytest
+
+import inference_worker as worker_module
+from cleanup_script import flag_out_of_range
+from execution_plan import get_plan
+from inference_worker import InferenceWorker
+from integrate_model_new import plan_recommendations
+from prepare_ml_data import prepare_features
+from upload_stream import stream_event, upload_events
+
+REFERENCE = os.path.join(os.path.dirname(__file__), "..", "..", "reference_excel.xlsx")
+PATIENT = {"Name": "A", "Age": 30, "ReportDate": "2024-01-02"}
+
+
+def planned_upload():
+    """(pending, answered, requests) for one patient, the first job answered without the model"""
+    df = pd.DataFrame({"Hemoglobin": [9.0], "Platelets": [250000.0], "Glucose": [99.0]})
+    plan = get_plan(df.columns.tolist(), REFERENCE)
+    df = flag_out_of_range(df, plan.index, plan.category_mapping, plan=plan)
+    pending, _, requests = plan_recommendations(*prepare_features(df), engine="model", plan=plan)
+    assert len(requests) >= 2
+    return pending, {requests[0].position: "From the template."}, requests[1:]
+
+
+def collect(worker, fmt):
+    async def run():
+        pending, answered, requests = planned_upload()
+        events = upload_events(worker, PATIENT, pending, answered, requests, fmt)
+        try:
+            return [event async for event in events], pending
+        finally:
+            await worker.stop()
+
+    return asyncio.run(run())
+
+
+def test_ndjson_lines_are_typed_objects():
+    """Each NDJSON event is one line holding a JSON object with its type"""
+    line = stream_event("test", {"name": "CBC", "note": "a\nb"}, "ndjson")
+    assert line.endswith("\n") and line.count("\n") == 1
+    assert json.loads(line) == {"type": "test", "name": "CBC", "note": "a\nb"}
+
+
+def test_sse_events_carry_kind_and_data():
+    """SSE events are "event:" plus one "data:" line, ended by a blank line"""
+    event = stream_event("patient", PATIENT, "sse")
+    kind, data, *rest = event.split("\n")
+    assert kind == "event: patient"
+    assert json.loads(data[len("data: "):]) == PATIENT
+    assert rest == ["", ""]
+
+
+def test_stream_sends_patient_then_every_test(monkeypatch):
+    """Header first, the answered test next, then one event per generated test"""
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch",
+                        lambda prompts, policies=None, adapters=None: ["Generated."] * len(prompts))
+    lines, pending = collect(InferenceWorker(max_batch_size=8, max_wait_ms=1), "ndjson")
+    events = [json.loads(line) for line in lines]
+
+    assert events[0] == {"type": "patient", **PATIENT}
+    tests = events[1:]
+    assert len(tests) == len(pending) and all(event["type"] == "test" for event in tests)
+    assert tests[0]["recommendation"] == "From the template."
+    assert {event["recommendation"] for event in tests[1:]} == {"Generated."}
+    assert sorted(event["name"] for event in tests) == sorted(job.category for job in pending)
+
+
+def test_generation_errors_become_test_events(monkeypatch):
+    """A failed batch is reported per test; the SSE stream still covers every test"""
+    def broken_batch(prompts, policies=None, adapters=None):
+        raise ValueError("model exploded")
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", broken_batch)
+    events, pending = collect(InferenceWorker(max_batch_size=8, max_wait_ms=1), "sse")
+
+    assert events[0].startswith("event: patient\n")
+    assert len(events) == 1 + len(pending)
+    failed = [json.loads(event.split("\n")[1][len("data: "):]) for event in events[2:]]
+    assert all(test["recommendation"] == "Error generating recommendation: model exploded" for test in failed)
+
+
+def test_closing_the_stream_cancels_waiting_prompts(monkeypatch):
+    """A client that disconnects leaves no futures waiting on the worker"""
+    release = threading.Event()
+
+    def slow_batch(prompts, policies=None, adapters=None):
+        release.wait(5)
+        return ["Late."] * len(prompts)
+
+    monkeypatch.setattr(worker_module, "generate_recommendations_batch", slow_batch)
+    worker = InferenceWorker(max_batch_size=1, max_wait_ms=1)
+    submitted = []
+    original_submit = worker.submit
+
+    def submit(request):
+        future = original_submit(request)
+        submitted.append(future)
+        return future
+
+    monkeypatch.setattr(worker, "submit", submit)
+
+    async def run():
+        pending, answered, requests = planned_upload()
+        events = upload_events(worker, PATIENT, pending, answered, requests, "ndjson")
+        try:
+            assert json.loads(await events.__anext__())["type"] == "patient"
+            assert json.loads(await events.__anext__())["recommendation"] == "From the template."
+            waiting = asyncio.ensure_future(events.__anext__())
+            await asyncio.sleep(0.05)
+            # What the server does when the client goes away mid-stream
+            waiting.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiting
+            assert submitted and all(future.cancelled() for future in submitted)
+        finally:
+            release.set()
+            await worker.stop()
+
+    asyncio.run(run())
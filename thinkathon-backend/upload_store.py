@@ -0,0 +1,88 @@
+"""Upload size limits and optional content-addressed persistence"""
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+import uuid
+
+# Uploads larger than this are rejected before parsing
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 50 * 1024 * 1024))
+# Keep a copy of each upload on disk (named by content hash, never by client filename)
+UPLOAD_PERSIST = os.environ.get("UPLOAD_PERSIST", "0") == "1"
+UPLOAD_DIR = os.environ.get("UPLOAD_DIR", "uploads")
+UPLOAD_TTL_SECONDS = int(os.environ.get("UPLOAD_TTL_SECONDS", 24 * 3600))
+# Copies of uploads that outlive their request stay in memory up to this size, then move to a temp file
+UPLOAD_SPOOL_BYTES = int(os.environ.get("UPLOAD_SPOOL_BYTES", 1024 * 1024))
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def upload_size(fileobj):
+    fileobj.seek(0, os.SEEK_END)
+    size = fileobj.tell()
+    fileobj.seek(0)
+    return size
+
+
+def check_size(fileobj, max_bytes=UPLOAD_MAX_BYTES):
+    # Rewinds `fileobj` and returns it, or raises UploadTooLarge
+    size = upload_size(fileobj)
+    if size > max_bytes:
+        raise UploadTooLarge(f"Upload is {size} bytes; the limit is {max_bytes} bytes.")
+    return fileobj
+
+
+def spooled_copy(fileobj, max_bytes=UPLOAD_MAX_BYTES):
+    # For work that outlives the request (jobs, streamed responses), whose UploadFile gets closed.
+    # Copied block by block; memory use is capped at UPLOAD_SPOOL_BYTES. Close it when done.
+    check_size(fileobj, max_bytes)
+    copy = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+    shutil.copyfileobj(fileobj, copy, 1024 * 1024)
+    copy.seek(0)
+    fileobj.seek(0)
+    return copy
+
+
+def content_hash(fileobj):
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for block in iter(lambda: fileobj.read(1024 * 1024), b""):
+        digest.update(block)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+def cleanup_expired(upload_dir=UPLOAD_DIR, ttl_seconds=UPLOAD_TTL_SECONDS):
+    cutoff = time.time() - ttl_seconds
+    removed = 0
+    for name in os.listdir(upload_dir):
+        path = os.path.join(upload_dir, name)
+        try:
+            if os.path.isfile(path) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError as e:
+            print(f"Could not remove expired upload '{path}': {e}")
+    return removed
+
+
+def persist(fileobj, filename, upload_dir=UPLOAD_DIR):
+    # Stored as <sha256><ext>; identical uploads share one file. Returns the path, or None when disabled.
+    if not UPLOAD_PERSIST:
+        return None
+    os.makedirs(upload_dir, exist_ok=True)
+    cleanup_expired(upload_dir)
+    ext = os.path.splitext(filename or "")[1].lower()
+    path = os.path.join(upload_dir, content_hash(fileobj) + ext)
+    if os.path.exists(path):
+        os.utime(path)
+    else:
+        partial = f"{path}.{uuid.uuid4().hex}.part"
+        with open(partial, "wb") as buffer:
+            shutil.copyfileobj(fileobj, buffer)
+        os.replace(partial, path)
+        fileobj.seek(0)
+    return path
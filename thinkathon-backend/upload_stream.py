@@ -0,0 +1,46 @@
+"""Event framing for /upload/stream (NDJSON lines or server-sent events)"""
+import asyncio
+import json
+
+from integrate_model_new import build_test_result
+
+
+def stream_event(kind, payload, fmt):
+    """One NDJSON line or server-sent event"""
+    data = json.dumps(payload, default=str)
+    if fmt == "sse":
+        return f"event: {kind}\ndata: {data}\n\n"
+    return json.dumps({"type": kind, **payload}, default=str) + "\n"
+
+
+async def upload_events(worker, user_info, pending, answered, requests, fmt):
+    """The patient header, then one event per test as soon as it is ready.
+
+    Template-answered tests go out immediately, model ones in the order the
+    worker finishes them; a failed generation is reported in the test's
+    recommendation rather than ending the stream.
+    """
+    yield stream_event("patient", user_info, fmt)
+    for position, text in answered.items():
+        job = pending[position]
+        yield stream_event("test", build_test_result(job.category, job.row_values, text), fmt)
+
+    if not requests:
+        return
+    await worker.start()
+    futures = {worker.submit(request): request for request in requests}
+    waiting = set(futures)
+    try:
+        while waiting:
+            done, waiting = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                job = pending[futures[future].position]
+                if future.exception() is not None:
+                    text = f"Error generating recommendation: {future.exception()}"
+                else:
+                    text = future.result()
+                yield stream_event("test", build_test_result(job.category, job.row_values, text), fmt)
+    finally:
+        # Client disconnected: prompts not generated yet are dropped by the worker
+        for future in waiting:
+            future.cancel()